@@ -1,24 +1,24 @@
 #!/usr/bin/env python3
 import sqlite3
-import json
 import datetime as dt
 from collections import Counter, defaultdict
 import matplotlib.pyplot as plt
 import os
+from item_store import ensure_schema, load_raw
+from taxonomy import load_names
 
 # Connect to the database
 DB = sqlite3.connect("dme.db")
+ensure_schema(DB)
 c = DB.cursor()
 
 def analyze_posts_by_year():
     """Count posts per year and show trend"""
-    c.execute("SELECT raw FROM items WHERE type='posts'")
+    c.execute("SELECT date FROM items WHERE type='posts'")
     posts = c.fetchall()
     
     years = []
-    for post in posts:
-        data = json.loads(post[0])
-        date = data.get('date', '')
+    for (date,) in posts:
         if date:
             year = date.split('-')[0]
             years.append(year)
@@ -53,29 +53,28 @@ def analyze_categories():
     
     categories = []
     for post in posts:
-        data = json.loads(post[0])
+        data = load_raw(post[0])
         cats = data.get('categories', [])
         categories.extend(cats)
     
     cat_counts = Counter(categories)
+    names = load_names(DB)["categories"]
     
     print("\n=== Top Categories ===")
-    print("ID\tCount")
+    print("ID\tCount\tName")
     for cat_id, count in cat_counts.most_common(10):
-        print(f"{cat_id}\t{count}")
+        print(f"{cat_id}\t{count}\t{names.get(cat_id, '?')}")
     
-    print("\nTo map category IDs to names:")
-    print("curl -s \"https://dmeacademy.com/wp-json/wp/v2/categories?per_page=20\" | jq '.[] | {id, name}'")
+    if not names:
+        print("\nNo category names stored yet; run dme_sync.py to fetch them.")
 
 def analyze_recent_posts():
     """Analyze most recent posts"""
     c.execute("""
-        SELECT json_extract(raw, '$.date'), 
-               json_extract(raw, '$.title.rendered'), 
-               json_extract(raw, '$.link')
+        SELECT date, title, link
         FROM items 
         WHERE type='posts' 
-        ORDER BY json_extract(raw, '$.date') DESC 
+        ORDER BY date DESC 
         LIMIT 10
     """)
     recent_posts = c.fetchall()
@@ -87,7 +86,7 @@ def analyze_recent_posts():
 
 def word_frequency():
     """Analyze word frequency in post titles"""
-    c.execute("SELECT json_extract(raw, '$.title.rendered') FROM items WHERE type='posts'")
+    c.execute("SELECT title FROM items WHERE type='posts'")
     titles = c.fetchall()
     
     words = []
@@ -116,7 +115,7 @@ def print_summary():
     c.execute("SELECT type, COUNT(*) FROM items GROUP BY type")
     types = c.fetchall()
     
-    c.execute("SELECT MIN(json_extract(raw, '$.date')), MAX(json_extract(raw, '$.date')) FROM items WHERE type='posts'")
+    c.execute("SELECT MIN(date), MAX(date) FROM items WHERE type='posts'")
     date_range = c.fetchone()
     
     print("\n=== Database Summary ===")
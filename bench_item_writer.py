@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-record SELECT + commit vs. the batched ItemWriter.
+
+Writes a synthetic load of WordPress-like records into a fresh SQLite file
+with both approaches and prints records/s for each.
+
+Usage:
+    python bench_item_writer.py [--items 10000] [--page-size 100]
+"""
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from item_store import ItemWriter, configure, ensure_schema
+
+# The per-record baseline writes the original uncompressed layout
+LEGACY_SCHEMA = """CREATE TABLE IF NOT EXISTS items
+                   (type TEXT, id INTEGER, hash TEXT,
+                    raw JSON, updated TEXT,
+                    PRIMARY KEY(type,id))"""
+
+def synthetic_records(n):
+    for i in range(n):
+        rec = {
+            "id": i,
+            "title": {"rendered": f"Synthetic post {i}"},
+            "content": {"rendered": "<p>" + ("lorem ipsum " * 200) + "</p>"},
+            "link": f"https://dmeacademy.com/synthetic-{i}/",
+            "date": "2024-01-01T00:00:00",
+        }
+        yield i, hashlib.sha256(json.dumps(rec, sort_keys=True).encode()).hexdigest(), rec
+
+def legacy_write(db, records):
+    """The original dme_sync loop: one SELECT and one commit per record."""
+    c = db.cursor()
+    for hid, hsh, rec in records:
+        c.execute("SELECT hash FROM items WHERE type=? AND id=?", ("posts", hid))
+        row = c.fetchone()
+        if not row:
+            c.execute("INSERT OR REPLACE INTO items VALUES (?,?,?,?,?)",
+                      ("posts", hid, hsh, json.dumps(rec), dt.date.today().isoformat()))
+        elif row[0] != hsh:
+            c.execute("UPDATE items SET hash=?, raw=?, updated=? WHERE type=? AND id=?",
+                      (hsh, json.dumps(rec), dt.date.today().isoformat(), "posts", hid))
+        db.commit()
+
+def batched_write(db, records, page_size):
+    writer = ItemWriter(db)
+    for start in range(0, len(records), page_size):
+        writer.write_page("posts", records[start:start + page_size])
+
+def run(label, fn, records, tune=False):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        if tune:
+            ensure_schema(configure(db))
+        else:
+            db.execute(LEGACY_SCHEMA)
+            db.commit()
+        start = time.perf_counter()
+        fn(db)
+        elapsed = time.perf_counter() - start
+        db.close()
+    print(f"{label:<28} {len(records) / elapsed:>10,.0f} records/s  ({elapsed:.2f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the items table writer")
+    parser.add_argument("--items", type=int, default=10000, help="Number of synthetic records")
+    parser.add_argument("--page-size", type=int, default=100, help="Records per transaction")
+    args = parser.parse_args()
+
+    records = list(synthetic_records(args.items))
+    print(f"Writing {len(records)} records, {args.page_size} per page")
+    run("per-record commit", lambda db: legacy_write(db, records), records)
+    run("ItemWriter (WAL, batched)", lambda db: batched_write(db, records, args.page_size),
+        records, tune=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+# A block is boilerplate when it appears in at least this share of items,
+# and in at least BOILERPLATE_MIN_ITEMS of them
+BOILERPLATE_SHARE = float(os.getenv("DME_BOILERPLATE_SHARE", "0.2"))
+BOILERPLATE_MIN_ITEMS = int(os.getenv("DME_BOILERPLATE_MIN_ITEMS", "5"))
+
+# Heading and list markers written by text_extract.extract_text
+MARKER_RE = re.compile(r"^\s*(?:#{1,6}|-|\d+\.)\s+")
+HEADING_RE = re.compile(r"(#{1,6}) ")
+SPACE_RE = re.compile(r"\s+")
+
+def boilerplate_path(kb_path):
+    """Where the boilerplate found in a KB is recorded, next to the KB file."""
+    return os.path.splitext(kb_path)[0] + ".boilerplate.json"
+
+def fingerprint(line):
+    """Hash of a text block (a line of extracted text), or None for a blank one.
+
+    Case, spacing and heading/list markers don't count, so the same CTA
+    matches whether it was written as a heading, a list item or a paragraph.
+    """
+    block = SPACE_RE.sub(" ", MARKER_RE.sub("", line)).strip().lower()
+    if not block:
+        return None
+    return hashlib.blake2b(block.encode(), digest_size=8).hexdigest()
+
+def find_boilerplate(texts, share=BOILERPLATE_SHARE, min_items=BOILERPLATE_MIN_ITEMS):
+    """Blocks repeated across many items' text, in one pass over ``texts``.
+
+    Returns:
+        Report dict: ``items`` seen, the thresholds used, and ``blocks``,
+        one {fingerprint, text, items, share} per boilerplate block, most
+        widespread first
+    """
+    counts = Counter()
+    examples = {}  # only for blocks that reached min_items, to keep memory small
+    total = 0
+    for text in texts:
+        total += 1
+        seen = {}
+        for line in (text or "").splitlines():
+            fp = fingerprint(line)
+            if fp and fp not in seen:
+                seen[fp] = line
+        counts.update(seen.keys())
+        for fp, line in seen.items():
+            if fp not in examples and counts[fp] >= min_items:
+                examples[fp] = line.strip()
+
+    threshold = max(min_items, share * total)
+    blocks = [{"fingerprint": fp, "text": examples[fp], "items": n,
+               "share": round(n / total, 3)}
+              for fp, n in counts.most_common() if n >= threshold]
+    return {"items": total, "share": share, "min_items": min_items, "blocks": blocks}
+
+def strip_boilerplate(text, fingerprints):
+    """Text without its boilerplate blocks, or the headings they leave empty.
+
+    A heading is dropped when the blocks under it were all boilerplate,
+    i.e. it is followed by nothing, or by a heading of the same or a
+    higher level.
+    """
+    if not text or not fingerprints:
+        return text
+    lines = [line for line in text.splitlines() if fingerprint(line) not in fingerprints]
+    if len(lines) == len(text.splitlines()):
+        return text
+
+    kept = []
+    after = None  # level of the next kept line: 7 for content, None at the end
+    for line in reversed(lines):
+        heading = HEADING_RE.match(line)
+        if not heading:
+            kept.append(line)
+            after = 7
+            continue
+        level = len(heading.group(1))
+        if after is not None and after > level:
+            kept.append(line)
+            after = level
+    return "\n".join(reversed(kept))
+
+def write_boilerplate(path, report):
+    """Write a find_boilerplate report as JSON, atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+def load_boilerplate(path):
+    """Fingerprints of the boilerplate blocks recorded at ``path`` (empty if none)."""
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {block["fingerprint"] for block in json.load(f)["blocks"]}
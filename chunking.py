@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import re
+
+# Chunk size and overlap between consecutive chunks of a section, in tokens
+CHUNK_TOKENS = int(os.getenv("DME_CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP = int(os.getenv("DME_CHUNK_OVERLAP", "50"))
+# Most tokens the embeddings endpoint accepts in one input
+MAX_INPUT_TOKENS = 8191
+# Encoding used by the text-embedding-3 models
+ENCODING = "cl100k_base"
+
+# A heading line as written by text_extract.extract_text
+HEADING_RE = re.compile(r"#{1,6} ")
+# Without tiktoken: roughly one token per word piece of up to four characters
+# or per punctuation mark, which overestimates English text a little
+APPROX_TOKEN_RE = re.compile(r"\s*(?:\w{1,4}|[^\w\s])")
+
+_encoding = None
+
+def _encoder():
+    """The tiktoken encoding, or None when tiktoken isn't installed."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(ENCODING)
+        except ImportError:
+            _encoding = False
+    return _encoding or None
+
+def _pieces(text):
+    """Text split into one string per token; joining them gives back the text."""
+    enc = _encoder()
+    if enc:
+        return [enc.decode_single_token_bytes(t).decode("utf-8", "replace") for t in enc.encode(text)]
+    return APPROX_TOKEN_RE.findall(text)
+
+def count_tokens(text):
+    """Number of tokens in text."""
+    enc = _encoder()
+    if enc:
+        return len(enc.encode(text))
+    return len(APPROX_TOKEN_RE.findall(text))
+
+def truncate_tokens(text, max_tokens=MAX_INPUT_TOKENS):
+    """The first ``max_tokens`` tokens of text."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return "".join(_pieces(text)[:max_tokens])
+
+def tail_tokens(text, n):
+    """The last ``n`` tokens of text, starting at a word where possible."""
+    if n <= 0:
+        return ""
+    pieces = _pieces(text)
+    tail = pieces[-n:]
+    # Drop a partial word at the start
+    while len(tail) > 1 and not tail[0][:1].isspace() and len(tail) < len(pieces):
+        tail = tail[1:]
+    return "".join(tail).strip()
+
+def split_tokens(text, size):
+    """Text cut into consecutive pieces of at most ``size`` tokens."""
+    pieces = _pieces(text)
+    return ["".join(pieces[i:i + size]).strip() for i in range(0, len(pieces), size)]
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Split extracted text into overlapping chunks of at most ``max_tokens``.
+
+    Text is packed a line at a time, so paragraphs, list items and table
+    rows stay whole unless a single one is longer than a chunk. A heading
+    (``## ...``) starts a new chunk once the current one is at least a
+    quarter full; small sections are kept together rather than embedded
+    as scraps. When a section spills into another chunk, that chunk
+    repeats the section's heading and the last ``overlap`` tokens of the
+    one before.
+    """
+    chunks = []
+    section, section_size = None, 0  # heading of the section being chunked
+    body, size = [], 0  # lines of the chunk being built, and their tokens
+
+    def close():
+        if body:
+            chunks.append("\n".join(body))
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        n = count_tokens(line)
+        if HEADING_RE.match(line):
+            # A section too small to stand alone so far joins the chunk
+            if size >= max_tokens // 4:
+                close()
+                body, size = [], 0
+            body.append(line)
+            size += n
+            section, section_size = line, n
+            continue
+        room = max(1, max_tokens - section_size)
+        # Leave space for the overlap when a long line has to be cut
+        for piece in ([line] if n <= room else split_tokens(line, max(1, room - overlap))):
+            n = count_tokens(piece)
+            if body and size + n > max_tokens:
+                carry = tail_tokens("\n".join(body), min(overlap, room - n))
+                close()
+                body = [part for part in (section, carry) if part]
+                size = section_size + count_tokens(carry)
+            body.append(piece)
+            size += n
+    close()
+    return chunks
+
+def chunk_hash(text):
+    """Short blake2b hex digest of a chunk's embedding input."""
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+def embedding_input(title, text):
+    """What gets embedded for a chunk: the item's title, then the chunk."""
+    return f"Title: {title}\n\nContent: {text}"
+
+def chunk_item(item, text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Chunks of a KB entry's text, each with a stable id and its embedding input.
+
+    Ids are ``<type>-<original_id>-<index>-<hash>``: unchanged chunks of an
+    edited page keep their ids, and a chunk whose text (or the page title)
+    changed gets a new one.
+    """
+    key = f"{item.get('type', 'item')}-{item.get('original_id', item.get('id'))}"
+    title = item.get("title", "")
+    chunks = []
+    for index, chunk in enumerate(chunk_text(text, max_tokens, overlap) or [""]):
+        text_input = embedding_input(title, chunk)
+        chunks.append({
+            "id": f"{key}-{index}-{chunk_hash(text_input)}",
+            "index": index,
+            "text": chunk,
+            "input": text_input,
+        })
+    return chunks
+
+def best_per_item(matches, top_k):
+    """The ``top_k`` best matches with at most one chunk per item.
+
+    ``matches`` are query matches, best first, whose metadata carries the
+    ``item_id`` the chunk came from; matches without one stand alone.
+    """
+    results, items = [], set()
+    for match in matches:
+        item = (match["metadata"] or {}).get("item_id") or match["id"]
+        if item in items:
+            continue
+        items.add(item)
+        results.append(match)
+        if len(results) == top_k:
+            break
+    return results
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import re
+from typing import Any, Dict, Optional
+
+# Fields that decide whether an item changed, per content type. Anything
+# else (modified timestamps, _links, SEO blobs) can move without the content
+# we index moving with it.
+HASH_FIELDS = {
+    "posts": ["title", "content", "excerpt", "link", "slug", "status", "date",
+              "author", "categories", "tags", "sports"],
+    "pages": ["title", "content", "excerpt", "link", "slug", "status", "date",
+              "author", "parent"],
+    "events": ["title", "description", "excerpt", "url", "slug", "date",
+               "all_day", "start_date", "end_date", "timezone",
+               "cost", "cost_details", "website", "categories", "tags",
+               "venue", "organizer", "extracted_pricing"],
+}
+# For types without rules, hash everything but these
+VOLATILE_FIELDS = {"modified", "modified_gmt", "modified_utc", "_links", "guid",
+                   "yoast_head", "yoast_head_json"}
+
+# blake2b with a 16-byte digest: 32 hex characters, much faster than sha256
+DIGEST_SIZE = 16
+HASH_LENGTH = DIGEST_SIZE * 2
+
+# Per-request noise in rendered HTML
+NONCE_ATTR_RE = re.compile(r'\s(?:data-)?(?:wp-)?nonce=(["\']).*?\1', re.I)
+NONCE_JSON_RE = re.compile(r'("_?(?:wp)?nonce"\s*:\s*")[^"]*"', re.I)
+# Responsive image variants are regenerated freely; the src stays
+SRCSET_RE = re.compile(r'\s(?:data-)?(?:srcset|sizes)=(["\']).*?\1', re.I)
+# Cache-busting query parameters on asset URLs (?ver=6.4.2, &_wpnonce=...)
+CACHE_BUST_RE = re.compile(r'([?&](?:ver|_wpnonce|nonce)=)[^&"\'\s<>]*', re.I)
+BETWEEN_TAGS_RE = re.compile(r">\s+<")
+WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_html(text: str) -> str:
+    """Strip nonces, srcset variants and cache-busters, and collapse whitespace."""
+    if "<" in text or "=" in text:
+        text = NONCE_ATTR_RE.sub("", text)
+        text = NONCE_JSON_RE.sub(r'\1"', text)
+        text = SRCSET_RE.sub("", text)
+        text = CACHE_BUST_RE.sub(r"\1", text)
+        text = BETWEEN_TAGS_RE.sub("><", text)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_html(value)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+def hashed_fields(rec: Dict[str, Any], kind: Optional[str] = None) -> Dict[str, Any]:
+    """The part of a record that counts for ``kind``."""
+    fields = HASH_FIELDS.get(kind)
+    if fields is None:
+        return {k: v for k, v in rec.items() if k not in VOLATILE_FIELDS}
+    return {k: rec[k] for k in fields if k in rec}
+
+def canonical(rec: Dict[str, Any], kind: Optional[str] = None) -> bytes:
+    """Stable byte form of a record: counted fields only, normalized, sorted keys."""
+    return json.dumps(_normalize(hashed_fields(rec, kind)), sort_keys=True,
+                      separators=(",", ":"), ensure_ascii=False).encode()
+
+def content_hash(rec: Dict[str, Any], kind: Optional[str] = None) -> str:
+    """blake2b hex digest of ``canonical(rec, kind)``."""
+    return hashlib.blake2b(canonical(rec, kind), digest_size=DIGEST_SIZE).hexdigest()
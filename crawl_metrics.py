@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import datetime as dt
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+# How many of the slowest requests to list in the report
+SLOWEST = 20
+
+def route_of(url: str) -> str:
+    """Group a URL for reporting: the REST route, or the first path segment for site pages."""
+    path = urlparse(url).path
+    if "/wp-json/" in path:
+        route = path.split("/wp-json/", 1)[1].rstrip("/")
+        return re.sub(r"/\d+$", "/{id}", route)
+    segment = path.strip("/").split("/", 1)[0]
+    return f"/{segment}/" if segment else "/"
+
+class CrawlMetrics:
+    """Collects timing, volume and outcome numbers for one crawl.
+
+    ``observe_request`` is meant to be registered as an ``HttpClient``
+    observer; ``count`` and ``kind_started``/``kind_finished`` are called
+    by the sync. ``report()`` turns it all into a JSON-friendly dict, which
+    can be written as-is or as a Prometheus text file.
+    """
+
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id
+        self.started = dt.datetime.now()
+        self.t0 = time.monotonic()
+        self.lock = threading.Lock()
+        self.requests = []
+        self.items: Dict[str, Counter] = defaultdict(Counter)
+        self.kind_times: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+    def observe_request(self, url: str, status: Optional[int], seconds: float, nbytes: int):
+        with self.lock:
+            self.requests.append({"url": url, "route": route_of(url), "status": status,
+                                  "seconds": round(seconds, 4), "bytes": nbytes})
+
+    def count(self, kind: str, outcome: str, n: int = 1):
+        """Tally items by outcome: new, updated, unchanged or removed."""
+        if n:
+            with self.lock:
+                self.items[kind][outcome] += n
+
+    def kind_started(self, kind: str):
+        with self.lock:
+            self.kind_times[kind]["start"] = time.monotonic()
+
+    def kind_finished(self, kind: str):
+        with self.lock:
+            self.kind_times[kind]["end"] = time.monotonic()
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            requests = list(self.requests)
+            wall = time.monotonic() - self.t0
+
+            kinds = {}
+            for kind in sorted(set(self.items) | set(self.kind_times)):
+                counts = self.items[kind]
+                times = self.kind_times[kind]
+                seconds = times.get("end", time.monotonic()) - times.get("start", self.t0)
+                records = counts["new"] + counts["updated"] + counts["unchanged"]
+                kinds[kind] = {
+                    "new": counts["new"],
+                    "updated": counts["updated"],
+                    "unchanged": counts["unchanged"],
+                    "removed": counts["removed"],
+                    "records": records,
+                    "seconds": round(seconds, 3),
+                    "records_per_s": round(records / seconds, 1) if seconds > 0 else 0.0,
+                }
+
+        routes = {}
+        for req in requests:
+            route = routes.setdefault(req["route"], {"requests": 0, "bytes": 0, "seconds": 0.0,
+                                                     "max_seconds": 0.0, "statuses": Counter()})
+            route["requests"] += 1
+            route["bytes"] += req["bytes"]
+            route["seconds"] += req["seconds"]
+            route["max_seconds"] = max(route["max_seconds"], req["seconds"])
+            route["statuses"][str(req["status"])] += 1
+        for route in routes.values():
+            route["avg_seconds"] = round(route["seconds"] / route["requests"], 4)
+            route["seconds"] = round(route["seconds"], 3)
+            route["statuses"] = dict(route["statuses"])
+
+        return {
+            "run_id": self.run_id,
+            "started": self.started.isoformat(),
+            "wall_seconds": round(wall, 3),
+            "requests": len(requests),
+            "bytes": sum(req["bytes"] for req in requests),
+            "kinds": kinds,
+            "routes": routes,
+            "slowest": sorted(requests, key=lambda req: req["seconds"], reverse=True)[:SLOWEST],
+        }
+
+    def write_json(self, path: str, include_requests: bool = True) -> Dict[str, Any]:
+        """Write the run report as JSON (optionally with every request) and return it."""
+        report = self.report()
+        if include_requests:
+            with self.lock:
+                report["all_requests"] = list(self.requests)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def write_prometheus(self, path: str):
+        """Write the report in Prometheus text exposition format (for node_exporter's textfile collector)."""
+        report = self.report()
+        lines = [
+            "# HELP dme_sync_wall_seconds Wall time of the last sync run.",
+            "# TYPE dme_sync_wall_seconds gauge",
+            f"dme_sync_wall_seconds {report['wall_seconds']}",
+            "# HELP dme_sync_items Items processed by the last sync run, by kind and outcome.",
+            "# TYPE dme_sync_items gauge",
+        ]
+        for kind, stats in report["kinds"].items():
+            for outcome in ("new", "updated", "unchanged", "removed"):
+                lines.append(f'dme_sync_items{{kind="{kind}",outcome="{outcome}"}} {stats[outcome]}')
+        lines += ["# HELP dme_sync_records_per_second Records processed per second, by kind.",
+                  "# TYPE dme_sync_records_per_second gauge"]
+        for kind, stats in report["kinds"].items():
+            lines.append(f'dme_sync_records_per_second{{kind="{kind}"}} {stats["records_per_s"]}')
+        lines += ["# HELP dme_sync_requests HTTP requests made by the last sync run, by route.",
+                  "# TYPE dme_sync_requests gauge"]
+        for route, stats in report["routes"].items():
+            lines.append(f'dme_sync_requests{{route="{route}"}} {stats["requests"]}')
+        lines += ["# HELP dme_sync_request_bytes Response bytes downloaded, by route.",
+                  "# TYPE dme_sync_request_bytes gauge"]
+        for route, stats in report["routes"].items():
+            lines.append(f'dme_sync_request_bytes{{route="{route}"}} {stats["bytes"]}')
+        lines += ["# HELP dme_sync_request_seconds_avg Average request latency, by route.",
+                  "# TYPE dme_sync_request_seconds_avg gauge"]
+        for route, stats in report["routes"].items():
+            lines.append(f'dme_sync_request_seconds_avg{{route="{route}"}} {stats["avg_seconds"]}')
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Write then rename so a scraper never sees a half-written file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
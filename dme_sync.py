@@ -1,204 +1,648 @@
 # file: dme_sync.py
-import json, sqlite3, hashlib, requests, datetime as dt
+import json, sqlite3, hashlib, datetime as dt
+import os, sys, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 import re
+from content_hash import content_hash
+from crawl_metrics import CrawlMetrics
+from http_client import FetchError, HttpClient
+from item_store import ItemWriter, configure, ensure_schema, load_raw, prune_changes
+from sync_runs import CRAWLED, DONE, SyncRun, prune_runs
+from taxonomy import TAXONOMIES, TERM_FIELDS, store_terms
 
 BASE   = "https://dmeacademy.com/wp-json"
 TABLES = {"posts": "wp/v2/posts",
           "pages": "wp/v2/pages"}
           # Removing events since it needs special handling: "events": "tribe/events/v1/events"
+PER_PAGE = 100
+# Error code of a page request past the last page
+END_OF_PAGES = "rest_post_invalid_page_number"
+# The fields we actually use from each route. Posts and pages are asked for
+# only these via _fields=, which drops _links, yoast_head, guid and the like;
+# the events API nests its records, so events are trimmed after fetching.
+# Either way, only these fields are stored and fed to digest().
+FIELDS = {
+    "wp/v2/posts": ["id", "date", "modified", "modified_gmt", "slug", "status",
+                    "link", "title", "content", "excerpt", "author",
+                    "categories", "tags", "sports"],
+    "wp/v2/pages": ["id", "date", "modified", "modified_gmt", "slug", "status",
+                    "link", "title", "content", "excerpt", "author", "parent"],
+    "tribe/events/v1/events": ["id", "date", "modified_utc", "slug", "url",
+                               "title", "description", "excerpt",
+                               "all_day", "start_date", "end_date", "timezone",
+                               "cost", "cost_details", "website",
+                               "categories", "tags", "venue", "organizer"],
+}
+# Max requests in flight against dmeacademy.com at any one time
+MAX_CONCURRENCY = int(os.getenv("DME_SYNC_CONCURRENCY", "4"))
+# "incremental" only fetches items modified since the last run
+INCREMENTAL = os.getenv("DME_SYNC_MODE", "full").lower() == "incremental"
+# Pick up an interrupted run (younger than DME_SYNC_RESUME_HOURS) where it stopped
+RESUME = os.getenv("DME_SYNC_RESUME", "true").lower() == "true"
+RESUME_MAX_AGE = dt.timedelta(hours=float(os.getenv("DME_SYNC_RESUME_HOURS", "12")))
+# modified_after is interpreted in the site's timezone, so look back a day
+# past the stored mark; digest() filters out anything we already have.
+HIGH_WATER_OVERLAP = dt.timedelta(days=1)
+# Where the run report goes; DME_SYNC_PROMETHEUS optionally names a
+# node_exporter textfile to write the same numbers to
+REPORT_PATH = os.getenv("DME_SYNC_REPORT", "sync_report.json")
+PROMETHEUS_PATH = os.getenv("DME_SYNC_PROMETHEUS")
+
+# Shared state for a run, set up by setup(). Kinds are crawled on worker
+# threads, so the connection is shared and every statement against it runs
+# under DB_LOCK.
+DB = None
+DB_LOCK = threading.Lock()
+WRITER = None
+METRICS = None
+HTTP = None
+FETCH_POOL = None
+PRICING_POOL = None
+
+def open_db(path="dme.db"):
+    """Open the sync database, usable from the crawl's worker threads."""
+    return configure(sqlite3.connect(path, check_same_thread=False))
+
+def setup(db=None, http=None):
+    """Prepare the schema, writer, HTTP client and pools for a run.
+
+    ``db`` and ``http`` let a caller (see pipeline.py) share its own
+    connection and client; by default dme.db and a new client are used.
+    """
+    global DB, WRITER, METRICS, HTTP, FETCH_POOL, PRICING_POOL
+    DB = db or open_db()
+    with DB_LOCK:
+        # Compressed raw JSON plus extracted columns; converts older databases in place
+        ensure_schema(DB)
+        # Newest modified_gmt seen per content type
+        DB.execute("""CREATE TABLE IF NOT EXISTS sync_state
+                      (type TEXT PRIMARY KEY, high_water TEXT, updated TEXT)""")
+        # Validators for conditional page requests, plus what the page held
+        DB.execute("""CREATE TABLE IF NOT EXISTS http_cache
+                      (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,
+                       total_pages INTEGER, ids JSON)""")
+        # Pricing scraped from event pages, keyed by URL and the page's validators
+        DB.execute("""CREATE TABLE IF NOT EXISTS event_pricing
+                      (url TEXT PRIMARY KEY, etag TEXT, content_hash TEXT,
+                       pricing JSON, checked TEXT)""")
+        DB.commit()
+    WRITER = ItemWriter(DB, DB_LOCK)
+
+    # One keep-alive session for the whole crawl; its per-host throttle caps
+    # requests in flight and backs off when the site slows down.
+    METRICS = CrawlMetrics()
+    HTTP = http or HttpClient(max_per_host=MAX_CONCURRENCY)
+    HTTP.observers.append(METRICS.observe_request)
+    FETCH_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="fetch")
+    # Event pages are fetched and parsed off the events thread
+    PRICING_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="pricing")
 
-DB = sqlite3.connect("dme.db")
-c  = DB.cursor()
-c.execute("""CREATE TABLE IF NOT EXISTS items
-             (type TEXT, id INTEGER, hash TEXT,
-              raw JSON, updated TEXT,
-              PRIMARY KEY(type,id))""")
-DB.commit()
 # ---------- sync logic ----------
 
-def grab(url):
+class Unchanged:
+    """Stand-in for a page the server answered with 304 Not Modified.
+
+    Holds the ids the page listed when it was last fetched, so callers can
+    still count them as seen without re-processing the records.
+    """
+
+    def __init__(self, ids, total_pages=None):
+        self.ids = ids
+        self.total_pages = total_pages
+
+def error_code(response):
+    """The ``code`` of a WordPress REST error body, if there is one."""
     try:
-        r = requests.get(url, timeout=15, headers={"User-Agent": "DME-KB-Sync"})
-        r.raise_for_status()
-        return r.json()
-    except requests.exceptions.HTTPError as e:
-        # If we hit a pagination error, just return empty to exit the loop
-        if "page=" in url and e.response.status_code in [400, 404]:
-            emit(f"[INFO] Reached end of pagination for {url}")
-            return []
-        # Re-raise other errors
-        emit(f"[ERROR] {str(e)}")
-        return []
-    except Exception as e:
-        emit(f"[ERROR] {str(e)}")
-        return []
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("code") if isinstance(body, dict) else None
+
+def grab_page(url, conditional=False):
+    """Fetch url as JSON, returning (data, headers).
+
+    WordPress's 400 for a page past the last comes back as ``[]`` (end of
+    pages); any other failure raises ``FetchError`` so callers never mistake
+    a flaky page or a rejected request for the end of the listing.
+
+    With ``conditional`` the stored ETag/Last-Modified for url are sent, and
+    a 304 comes back as an ``Unchanged`` page instead of data.
+    """
+    headers = {}
+    cached = None
+    if conditional:
+        with DB_LOCK:
+            cached = DB.execute("""SELECT etag, last_modified, total_pages, ids
+                                   FROM http_cache WHERE url=?""", (url,)).fetchone()
+        if cached:
+            if cached[0]:
+                headers["If-None-Match"] = cached[0]
+            if cached[1]:
+                headers["If-Modified-Since"] = cached[1]
+    r = HTTP.get(url, headers=headers)
+    if r.status_code == 304 and cached:
+        return Unchanged(json.loads(cached[3] or "[]"), cached[2]), r.headers
+    # WordPress answers a page past the end with 400 rest_post_invalid_page_number.
+    # Any other 4xx (a rejected parameter, a missing route) is a failure: taking
+    # it for the end of the listing would make every stored item look removed.
+    if r.status_code == 400 and error_code(r) == END_OF_PAGES:
+        emit(f"[INFO] Reached end of pagination for {url}")
+        return [], {}
+    if not r.ok:
+        raise FetchError(url, r.status_code)
+    try:
+        return r.json(), r.headers
+    except ValueError as e:
+        raise FetchError(url, r.status_code, e)
+
+def remember_page(url, headers, total, ids):
+    """Store a page's validators so the next run can ask for it conditionally."""
+    etag, modified = headers.get("ETag"), headers.get("Last-Modified")
+    if not (etag or modified):
+        return
+    with DB_LOCK:
+        DB.execute("INSERT OR REPLACE INTO http_cache VALUES (?,?,?,?,?)",
+                   (url, etag, modified, total, json.dumps(ids)))
+        DB.commit()
+
+def wp_total_pages(data, headers):
+    return headers.get("X-WP-TotalPages")
+
+def tribe_total_pages(data, headers):
+    return data.get("total_pages") or headers.get("X-TEC-TotalPages")
+
+def crawl(route, total_pages=wp_total_pages, has_more=bool,
+          records=lambda data: data, params="", conditional=False, start=1):
+    """Yield ``(page number, data)`` for every page of a paginated route, in order.
+
+    The first page fetched (``start``, for resumed crawls) tells us how many
+    pages there are; the rest are then fetched concurrently on FETCH_POOL.
+    Routes that don't report a total are walked one page at a time until
+    ``has_more`` says to stop. Iteration ends at the first empty page
+    either way.
 
-def digest(obj):  # produce a stable content hash
-    return hashlib.sha256(
-        json.dumps(obj, sort_keys=True).encode()
-    ).hexdigest()
+    With ``conditional`` pages may come back as ``Unchanged``. A page's
+    validators are only stored once the caller has finished with it, so a
+    crash mid-page never leaves us skipping records we didn't write.
+    """
+    url = f"{BASE}/{route}?per_page={PER_PAGE}{params}&page={{}}"
+    fetch = lambda page: grab_page(url.format(page), conditional)
+    total = None
+
+    def pages():
+        nonlocal total
+        data, headers = fetch(start)
+        if data:
+            # Known before the first page is handed out, so it is stored
+            # with that page's validators
+            if isinstance(data, Unchanged):
+                total = data.total_pages
+            else:
+                total = total_pages(data, headers)
+            try:
+                total = int(total or 0)
+            except (TypeError, ValueError):
+                total = 0
+        yield start, data, headers
+        if not data:
+            return
+
+        if total:
+            rest = range(start + 1, total + 1)
+            for page, (data, headers) in zip(rest, FETCH_POOL.map(fetch, rest)):
+                yield page, data, headers
+                if not data:
+                    return
+        else:
+            page = start
+            while isinstance(data, Unchanged) or has_more(data):
+                page += 1
+                data, headers = fetch(page)
+                yield page, data, headers
+                if not data:
+                    return
+    for page, data, headers in pages():
+        if not data:
+            return
+        yield page, data
+        if conditional and not isinstance(data, Unchanged):
+            remember_page(url.format(page), headers, total,
+                          [rec["id"] for rec in records(data)])
+
+def project(rec, route):
+    """Keep only the declared FIELDS of a record."""
+    return {k: rec[k] for k in FIELDS[route] if k in rec}
+
+def fields_param(route):
+    return "&_fields=" + ",".join(FIELDS[route])
+
+def high_water(kind):
+    with DB_LOCK:
+        row = DB.execute("SELECT high_water FROM sync_state WHERE type=?",
+                         (kind,)).fetchone()
+    return row[0] if row else None
+
+def save_high_water(kind, mark):
+    if not mark:
+        return
+    with DB_LOCK:
+        DB.execute("INSERT OR REPLACE INTO sync_state VALUES (?,?,?)",
+                   (kind, mark, dt.datetime.now().isoformat()))
+        DB.commit()
+
+def modified_after_param(mark):
+    since = dt.datetime.fromisoformat(mark) - HIGH_WATER_OVERLAP
+    return f"&modified_after={since.strftime('%Y-%m-%dT%H:%M:%S')}"
+
+def digest(obj, kind=None):  # produce a stable content hash
+    return content_hash(obj, kind)
+
+# Everything emit() reports goes to each of these; append a callable taking
+# the message (e.g. a Slack/Discord webhook poster) to forward it elsewhere.
+SINKS = [print]
 
 def emit(msg):
-    # for now just print; swap in Slack/Discord webhook later
-    print(msg)
+    for sink in SINKS:
+        sink(msg)
+
+# Price/option lines on event pages, one alternative per kind of line.
+# Matches are grouped back by alternative so the output keeps the order the
+# separate per-pattern searches used to produce.
+PRICING_RE = re.compile(r"""
+    (?P<boarder>3-Week\s*\|\s*Boarder:\s*\$\d[\d,]*)
+  | (?P<commuter>3-Week\s*\|\s*Commuter:\s*\$\d[\d,]*)
+  | (?P<range>Price\s*\$[\d,]+–\$[\d,]+)
+  | (?P<cost>costs?\s*\$\d[\d,]+)
+""", re.VERBOSE)
+PRICING_GROUPS = ["boarder", "commuter", "range", "cost"]
+
+def find_pricing(text):
+    found = {group: [] for group in PRICING_GROUPS}
+    for m in PRICING_RE.finditer(text):
+        found[m.lastgroup].append(m.group())
+    return [line for group in PRICING_GROUPS for line in found[group]]
 
 def extract_event_pricing(event_url):
+    """Scrape price/option lines from an event page, skipping unchanged pages.
+
+    The page is requested with the ETag from the last run; a 304, or a body
+    whose hash matches the last one we parsed, returns the cached pricing
+    without touching BeautifulSoup.
+    """
+    with DB_LOCK:
+        cached = DB.execute("""SELECT etag, content_hash, pricing FROM event_pricing
+                               WHERE url=?""", (event_url,)).fetchone()
+    cached_pricing = json.loads(cached[2]) if cached else []
     try:
-        resp = requests.get(event_url, timeout=10)
-        soup = BeautifulSoup(resp.text, "html.parser")
-        text = soup.get_text(separator="\n")
-        pricing = []
-        # Find all price/option lines
-        pricing += re.findall(r"3-Week\s*\|\s*Boarder:\s*\$\d[\d,]*", text)
-        pricing += re.findall(r"3-Week\s*\|\s*Commuter:\s*\$\d[\d,]*", text)
-        pricing += re.findall(r"Price\s*\$[\d,]+–\$[\d,]+", text)
-        pricing += re.findall(r"costs?\s*\$\d[\d,]+", text)
+        headers = {"If-None-Match": cached[0]} if cached and cached[0] else None
+        resp = HTTP.get(event_url, headers=headers, timeout=10)
+        if resp.status_code == 304 and cached:
+            return cached_pricing
+        resp.raise_for_status()
+
+        body_hash = hashlib.sha256(resp.content).hexdigest()
+        etag = resp.headers.get("ETag")
+        if cached and cached[1] == body_hash:
+            pricing = cached_pricing
+        else:
+            soup = BeautifulSoup(resp.text, "html.parser")
+            pricing = find_pricing(soup.get_text(separator="\n"))
+
+        if not cached or cached[0] != etag or cached[1] != body_hash:
+            with DB_LOCK:
+                DB.execute("INSERT OR REPLACE INTO event_pricing VALUES (?,?,?,?,?)",
+                           (event_url, etag, body_hash, json.dumps(pricing),
+                            dt.date.today().isoformat()))
+                DB.commit()
         return pricing
     except Exception as e:
+        # Keep what we knew rather than wiping an event's pricing
+        return cached_pricing
+
+def item_title(rec):
+    title = rec.get("title", "")
+    return title.get("rendered", "") if isinstance(title, dict) else title
+
+def store_page(kind, page, seen):
+    """Write one page of (id, hash, rec) tuples and report what changed."""
+    seen.update(hid for hid, _, _ in page)
+    new, updated = WRITER.write_page(kind, page)
+    METRICS.count(kind, "new", len(new))
+    METRICS.count(kind, "updated", len(updated))
+    METRICS.count(kind, "unchanged", len(page) - len(new) - len(updated))
+    for rec in new:
+        emit(f"[NEW {kind}] {item_title(rec)}")
+    for rec in updated:
+        emit(f"[UPDATED {kind}] id {rec['id']}")
+
+def stored_records(kind, ids):
+    """The stored records of ``kind`` with the given ids (missing ones are skipped)."""
+    if not ids:
         return []
+    with DB_LOCK:
+        rows = DB.execute(f"""SELECT raw FROM items WHERE type=? AND id IN ({",".join("?" * len(ids))})
+                              ORDER BY id""", (kind, *ids)).fetchall()
+    return [load_raw(raw) for (raw,) in rows]
+
+def still_listed(route, ids):
+    """Which of ids the API still returns."""
+    found = set()
+    for start in range(0, len(ids), PER_PAGE):
+        batch = ids[start:start + PER_PAGE]
+        if route.startswith("wp/v2/"):
+            url = (f"{BASE}/{route}?per_page={PER_PAGE}&_fields=id"
+                   f"&include={','.join(map(str, batch))}")
+            r = HTTP.get(url)
+            if not r.ok:
+                raise FetchError(url, r.status_code)
+            found.update(rec["id"] for rec in r.json())
+        else:
+            for item_id in batch:
+                r = HTTP.get(f"{BASE}/{route}/{item_id}")
+                if r.ok:
+                    found.add(item_id)
+                elif r.status_code not in (404, 410):
+                    raise FetchError(r.url, r.status_code)
+    return found
 
-def sync_one(kind, route):
-    page = 1
-    seen = set()
+def remove_unseen(kind, route, seen, recheck=False):
+    """Delete stored items the crawl didn't see and return their ids.
+
+    A resumed crawl can miss items that shifted onto pages it had already
+    done before the interruption, so with ``recheck`` the candidates are
+    confirmed against the API first.
+    """
+    if recheck:
+        candidates = WRITER.missing(kind, seen)
+        if candidates:
+            seen = seen | still_listed(route, candidates)
+    removed = WRITER.remove_missing(kind, seen)
+    METRICS.count(kind, "removed", len(removed))
+    for old_id in removed:
+        emit(f"[REMOVED {kind}] id {old_id}")
+    return removed
+
+def sync_one(kind, route, run):
+    status, last_page = run.state(kind)
+    if status == DONE:
+        emit(f"[INFO] {kind} already finished in run {run.run_id}, skipping")
+        return []
+    seen = run.seen(kind)
+    mark = high_water(kind) if INCREMENTAL else None
+    newest = mark
     
     try:
-        while True:
-            data = grab(f"{BASE}/{route}?per_page=100&page={page}")
-            if not data:
-                break
-            
-            for rec in data:
-                try:
-                    hid  = rec["id"]
-                    hsh  = digest(rec)
-                    seen.add(hid)
-
-                    c.execute("SELECT hash FROM items WHERE type=? AND id=?",
-                            (kind, hid))
-                    row = c.fetchone()
-
-                    if not row:                         # — new item —
-                        emit(f"[NEW {kind}] {rec.get('title',{}).get('rendered','')}")
-                        c.execute("""INSERT OR REPLACE INTO items
-                                VALUES (?,?,?,?,?)""",
-                                (kind, hid, hsh, json.dumps(rec),
-                                dt.date.today().isoformat()))
-                    elif row[0] != hsh:                 # — changed item —
-                        emit(f"[UPDATED {kind}] id {hid}")
-                        c.execute("""UPDATE items SET hash=?, raw=?, updated=?
-                                    WHERE type=? AND id=?""",
-                                (hsh, json.dumps(rec),
-                                dt.date.today().isoformat(), kind, hid))
-                    # Commit after each record to save progress
-                    DB.commit()
-                except Exception as e:
-                    emit(f"[ERROR processing record] {str(e)}")
-                    continue
-            
-            page += 1
-
-        # removals
-        c.execute("SELECT id FROM items WHERE type=?", (kind,))
-        for (old_id,) in c.fetchall():
-            if old_id not in seen:
-                emit(f"[REMOVED {kind}] id {old_id}")
-                c.execute("DELETE FROM items WHERE type=? AND id=?",
-                        (kind, old_id))
-        
-        # Final commit for any removals
-        DB.commit()
+        if status != CRAWLED:
+            if last_page:
+                emit(f"[INFO] Resuming {kind} after page {last_page}")
+            params = fields_param(route) + (modified_after_param(mark) if mark else "")
+            for page_no, data in crawl(route, params=params, start=last_page + 1):
+                page = []
+                for rec in data:
+                    try:
+                        # Projected server-side already; this guards against hosts ignoring _fields
+                        rec = project(rec, route)
+                        page.append((rec["id"], digest(rec, kind), rec))
+                        newest = max(newest or "", rec.get("modified_gmt") or "")
+                    except Exception as e:
+                        emit(f"[ERROR processing record] {str(e)}")
+                        continue
+                # One transaction per page keeps progress without an fsync per record
+                store_page(kind, page, seen)
+                run.page_done(kind, page_no, [hid for hid, _, _ in page])
+
+            if mark:
+                # Only modified items were listed above, so take the set of ids
+                # that still exist from a cheap id-only listing instead.
+                listed = set()
+                for _, data in crawl(route, params="&_fields=id", conditional=True):
+                    if isinstance(data, Unchanged):
+                        listed.update(data.ids)
+                    else:
+                        listed.update(rec["id"] for rec in data)
+                seen |= listed
+                run.page_done(kind, None, listed)
+            run.set_status(kind, CRAWLED)
+
+        # removals, only once every page has been seen
+        removed = remove_unseen(kind, route, seen, recheck=status is not None)
+        run.set_status(kind, DONE)
+        save_high_water(kind, newest)
+        return removed
     except Exception as e:
+        # A failed fetch ends this kind without the removals pass, since
+        # we can't know which items we never got to see. The checkpoint
+        # lets the next run pick up from the last stored page.
         emit(f"[ERROR in sync_one] {str(e)}")
         # Ensure we commit any changes so far
-        DB.commit()
+        with DB_LOCK:
+            DB.commit()
+        return []
 
-def sync_events():
+def sync_events(run):
     """Sync events which have a different structure"""
     kind = "events"
     route = "tribe/events/v1/events"
-    page = 1
-    seen = set()
+    status, last_page = run.state(kind)
+    if status == DONE:
+        emit(f"[INFO] {kind} already finished in run {run.run_id}, skipping")
+        return []
+    seen = run.seen(kind)
     
     try:
-        while True:
-            data = grab(f"{BASE}/{route}?per_page=100&page={page}")
-            if not data or "events" not in data:
-                break
-            
-            # Events endpoint returns data differently - events are in a nested array
-            for rec in data.get("events", []):
-                try:
-                    # Events have different structure
-                    hid = rec["id"]
-                    hsh = digest(rec)
-                    seen.add(hid)
-
-                    # --- ADDED: Extract pricing/options from event page ---
-                    event_url = rec.get("url") or rec.get("link")
-                    if event_url:
-                        rec["extracted_pricing"] = extract_event_pricing(event_url)
-                    # --- END ADDED ---
-
-                    c.execute("SELECT hash FROM items WHERE type=? AND id=?",
-                              (kind, hid))
-                    row = c.fetchone()
-
-                    if not row:  # — new item —
-                        emit(f"[NEW {kind}] {rec.get('title', '')}")
-                        c.execute("""INSERT OR REPLACE INTO items
-                                    VALUES (?,?,?,?,?)""",
-                                 (kind, hid, hsh, json.dumps(rec),
-                                  dt.date.today().isoformat()))
-                    elif row[0] != hsh:  # — changed item —
-                        emit(f"[UPDATED {kind}] id {hid}")
-                        c.execute("""UPDATE items SET hash=?, raw=?, updated=?
-                                    WHERE type=? AND id=?""",
-                                 (hsh, json.dumps(rec),
-                                  dt.date.today().isoformat(), kind, hid))
-                    # Commit after each record to save progress
-                    DB.commit()
-                except Exception as e:
-                    emit(f"[ERROR processing event] {str(e)}")
-                    continue
-            
-            # The events API might use a different pagination method
-            if data.get("next_page", False):
-                page += 1
-            else:
-                break
-
-        # removals
-        c.execute("SELECT id FROM items WHERE type=?", (kind,))
-        for (old_id,) in c.fetchall():
-            if old_id not in seen:
-                emit(f"[REMOVED {kind}] id {old_id}")
-                c.execute("DELETE FROM items WHERE type=? AND id=?",
-                         (kind, old_id))
-        
-        # Final commit for any removals
-        DB.commit()
+        if status != CRAWLED:
+            if last_page:
+                emit(f"[INFO] Resuming {kind} after page {last_page}")
+            # The events API paginates via total_pages/next_page in the body.
+            # It has no modified_after filter, so incremental runs rely on
+            # conditional requests to skip listing pages that haven't changed.
+            for page_no, data in crawl(route, total_pages=tribe_total_pages,
+                                       has_more=lambda d: d.get("next_page", False),
+                                       records=lambda d: d.get("events", []),
+                                       conditional=INCREMENTAL, start=last_page + 1):
+                if isinstance(data, Unchanged):
+                    # The listing is as it was, but an event page's pricing may
+                    # not be: re-check the stored events, a 304 each if unchanged
+                    seen.update(data.ids)
+                    events = stored_records(kind, data.ids)
+                else:
+                    if "events" not in data:
+                        break
+
+                    # Events endpoint returns data differently - events are in a nested array
+                    events = []
+                    for rec in data.get("events", []):
+                        try:
+                            # Events have different structure
+                            events.append(project(rec, route))
+                        except Exception as e:
+                            emit(f"[ERROR processing event] {str(e)}")
+                            continue
+
+                # --- ADDED: Extract pricing/options from event pages ---
+                with_urls = [rec for rec in events if rec.get("url") or rec.get("link")]
+                urls = [rec.get("url") or rec.get("link") for rec in with_urls]
+                for rec, pricing in zip(with_urls, PRICING_POOL.map(extract_event_pricing, urls)):
+                    rec["extracted_pricing"] = pricing
+                # --- END ADDED ---
+
+                # Hashed only now, so a pricing change counts as an update
+                page = []
+                for rec in events:
+                    try:
+                        page.append((rec["id"], digest(rec, kind), rec))
+                    except Exception as e:
+                        emit(f"[ERROR processing event] {str(e)}")
+
+                store_page(kind, page, seen)
+                ids = data.ids if isinstance(data, Unchanged) else [hid for hid, _, _ in page]
+                run.page_done(kind, page_no, ids)
+            run.set_status(kind, CRAWLED)
+
+        # removals, only once every page has been seen
+        removed = remove_unseen(kind, route, seen, recheck=status is not None)
+        run.set_status(kind, DONE)
+        return removed
     except Exception as e:
         emit(f"[ERROR in sync_events] {str(e)}")
         # Ensure we commit any changes so far
-        DB.commit()
+        with DB_LOCK:
+            DB.commit()
+        return []
 
-# ---------- run all ----------
-try:
-    # Sync standard content types
-    for kind, route in TABLES.items():
-        emit(f"[INFO] Starting sync for {kind}")
-        sync_one(kind, route)
+def sync_terms():
+    """Refresh the categories/tags/sports/users lookup tables.
+
+    Listings are requested conditionally, so on most runs every page is a
+    304 and nothing is rewritten. Each page's terms are stored before the
+    crawl moves on and saves its validators, so a page that later comes
+    back 304 never hides terms that weren't written. Removals only happen
+    once the whole listing was seen; a taxonomy that fails to fetch keeps
+    the names it had.
+    """
+    params = "&_fields=" + ",".join(TERM_FIELDS)
+    for taxonomy, route in TAXONOMIES.items():
+        try:
+            changed, listed = 0, set()
+            for _, data in crawl(route, params=params, conditional=True):
+                if isinstance(data, Unchanged):
+                    listed.update(data.ids)
+                    continue
+                terms = []
+                for rec in data:
+                    rec = {k: rec[k] for k in TERM_FIELDS if k in rec}
+                    terms.append((rec["id"], digest(rec), rec))
+                    listed.add(rec["id"])
+                with DB_LOCK:
+                    changed += store_terms(DB, taxonomy, terms)[0]
+            with DB_LOCK:
+                removed = store_terms(DB, taxonomy, [], listed)[1]
+            if changed or removed:
+                emit(f"[INFO] {taxonomy}: {changed} names added or changed, {removed} removed")
+        except Exception as e:
+            emit(f"[ERROR syncing {taxonomy}] {str(e)}")
+
+def run_kind(kind, fn, *args):
+    emit(f"[INFO] Starting sync for {kind}")
+    METRICS.kind_started(kind)
+    try:
+        return fn(*args)
+    finally:
+        METRICS.kind_finished(kind)
         emit(f"[INFO] Completed sync for {kind}")
-    
-    # Try to sync events
-    emit(f"[INFO] Starting sync for events")
-    sync_events()
-    emit(f"[INFO] Completed sync for events")
-    
-    emit("[INFO] All syncs completed successfully")
-except Exception as e:
-    emit(f"[CRITICAL ERROR] {str(e)}")
-finally:
-    # Always commit at the end
-    DB.commit()
\ No newline at end of file
+
+def sync_all():
+    """Crawl posts, pages and events at the same time.
+
+    Each kind gets its own thread; their page fetches share FETCH_POOL and
+    HTTP, so the per-host concurrency cap holds across all of them.
+    Progress is checkpointed in sync_runs so an interrupted run resumes.
+
+    Returns:
+        Tuple of (run status, {kind: ids removed from the items table});
+        the status is "failed" unless every kind finished
+    """
+    run = SyncRun(DB, DB_LOCK, resume=RESUME, max_age=RESUME_MAX_AGE)
+    emit(f"[INFO] {'Resuming' if run.resumed else 'Starting'} sync run {run.run_id}")
+    METRICS.run_id = run.run_id
+    # Every write lands in the changes feed tagged with this run
+    WRITER.run_id = run.run_id
+    with DB_LOCK:
+        prune_changes(DB)
+
+    jobs = [(kind, sync_one, kind, route, run) for kind, route in TABLES.items()]
+    jobs.append(("events", sync_events, run))
+
+    with ThreadPoolExecutor(max_workers=len(jobs) + 1, thread_name_prefix="sync") as pool:
+        # Lookup tables are small and not part of the run's checkpoints
+        terms = pool.submit(sync_terms)
+        futures = {pool.submit(run_kind, *job): job[0] for job in jobs}
+        removed = {futures[fut]: fut.result() for fut in as_completed(futures)}
+        terms.result()
+
+    status = run.finish((kind for kind, *_ in jobs), report=summary())
+    emit(f"[INFO] Sync run {run.run_id} {status}")
+    # Every run adds a report row to the committed dme.db; keep the recent ones
+    with DB_LOCK:
+        prune_runs(DB)
+    return status, removed
+
+def summary():
+    """The run report without per-request detail, small enough to keep in sync_runs."""
+    report = METRICS.report()
+    # The slowest requests are in sync_report.json
+    report.pop("slowest", None)
+    report["http"] = HTTP.stats()
+    return report
+
+def write_report():
+    report = METRICS.write_json(REPORT_PATH)
+    if PROMETHEUS_PATH:
+        METRICS.write_prometheus(PROMETHEUS_PATH)
+    for kind, stats in report["kinds"].items():
+        emit(f"[INFO] {kind}: {stats['new']} new, {stats['updated']} updated, "
+             f"{stats['unchanged']} unchanged, {stats['removed']} removed "
+             f"({stats['records_per_s']:.0f} records/s)")
+    emit(f"[INFO] {report['requests']} requests, {report['bytes'] / 1e6:.1f} MB "
+         f"in {report['wall_seconds']:.1f}s; report written to {REPORT_PATH}")
+
+# ---------- run all ----------
+
+def run(db=None, http=None):
+    """Run a full sync and return (run status, {kind: removed ids}).
+
+    A connection passed in is committed but left open for the caller;
+    one opened here is closed, which checkpoints the WAL back into dme.db.
+    """
+    setup(db, http)
+    status, removed = "failed", {}
+    try:
+        status, removed = sync_all()
+        if status == "completed":
+            emit("[INFO] All syncs completed successfully")
+    except Exception as e:
+        emit(f"[CRITICAL ERROR] {str(e)}")
+    finally:
+        for host, counters in HTTP.stats().items():
+            emit(f"[INFO] HTTP {host}: {counters['requests']} requests, "
+                 f"{counters['retries']} retries, {counters['failures']} failures, "
+                 f"avg {counters['avg_seconds']:.2f}s")
+        try:
+            write_report()
+        except OSError as e:
+            emit(f"[ERROR writing run report] {str(e)}")
+        HTTP.observers.remove(METRICS.observe_request)
+        # Always commit at the end
+        with DB_LOCK:
+            DB.commit()
+            if db is None:
+                DB.close()
+        FETCH_POOL.shutdown()
+        PRICING_POOL.shutdown()
+    return status, removed
+
+if __name__ == "__main__":
+    # Non-zero so the workflow doesn't build the KB from a failed run
+    status, _ = run()
+    sys.exit(0 if status == "completed" else 1)
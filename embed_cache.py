@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+# Where embeddings are kept between runs, and how many of them
+CACHE_PATH = os.getenv("DME_EMBED_CACHE", "embed_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("DME_EMBED_CACHE_MAX", "50000"))
+# Share of max_entries left after an eviction, so one doesn't follow every insert
+EVICT_TO = 0.9
+
+def text_key(text):
+    """sha256 of the exact text that was embedded."""
+    return hashlib.sha256(text.encode()).digest()
+
+class EmbeddingCache:
+    """Embeddings stored in SQLite by (model, dimensions, sha256 of the input).
+
+    Vectors are stored as float32, which is the precision the API returns
+    them in. Past ``max_entries`` the least recently used are evicted.
+    ``hits`` and ``misses`` count lookups since the cache was opened.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS embeddings
+                           (model TEXT, dims INTEGER, sha256 BLOB, vector BLOB, used REAL,
+                            PRIMARY KEY(model, dims, sha256)) WITHOUT ROWID""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings(used)")
+        self.db.commit()
+        self.size = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, dims, texts):
+        """Cached vector, or None, for each text."""
+        keys = [text_key(text) for text in texts]
+        with self.lock:
+            found = {}
+            # Bounded IN lists, well under SQLite's variable limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self.db.execute(
+                    f"""SELECT sha256, vector FROM embeddings WHERE model=? AND dims=?
+                        AND sha256 IN ({','.join('?' * len(part))})""", (model, dims, *part))
+                found.update((bytes(key), vector) for key, vector in rows)
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE embeddings SET used=? WHERE model=? AND dims=? AND sha256=?",
+                                    [(now, model, dims, key) for key in found])
+                self.db.commit()
+            self.hits += sum(key in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+        return [array("f", found[key]).tolist() if key in found else None for key in keys]
+
+    def put_many(self, model, dims, texts, vectors):
+        """Store vectors for texts (None vectors are skipped), evicting if over the limit."""
+        now = time.time()
+        rows = [(model, dims, text_key(text), array("f", vector).tobytes(), now)
+                for text, vector in zip(texts, vectors) if vector is not None]
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany("INSERT OR IGNORE INTO embeddings VALUES (?,?,?,?,?)", rows)
+            self.size += self.db.total_changes - before
+            if self.size > self.max_entries:
+                self._evict(self.size - int(self.max_entries * EVICT_TO))
+            self.db.commit()
+
+    def _evict(self, count):
+        self.db.execute("""DELETE FROM embeddings WHERE (model, dims, sha256) IN
+                           (SELECT model, dims, sha256 FROM embeddings ORDER BY used LIMIT ?)""",
+                        (count,))
+        self.size -= count
+
+    def stats(self):
+        """Hit/miss counts since opening, and the number of stored vectors."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "entries": self.size,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+    def close(self):
+        self.db.close()
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
-import json
 import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import openai
 import pinecone
 import hashlib
 from tqdm import tqdm
-import re
 from dotenv import load_dotenv
-import html
+from boilerplate import boilerplate_path, load_boilerplate, strip_boilerplate
+from chunking import chunk_item
+from embed_cache import EmbeddingCache
+from embedder import Embedder
+from pacing import RatePacer
+from index_manifest import IndexManifest, delete_stale, purge_legacy, reconcile, vector_hash
+from kb_update import KB_PATH, read_kb
+from parallel import ordered_map
+from taxonomy import term_ids
+from text_extract import extract_text
 
 # Load environment variables
 load_dotenv()
@@ -26,92 +35,186 @@ TYPESENSE_PROTOCOL = os.getenv("TYPESENSE_PROTOCOL", "http")
 TYPESENSE_COLLECTION = os.getenv("TYPESENSE_COLLECTION", "dme-kb")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 EMBEDDING_DIMENSION = 1536  # Dimension for text-embedding-3-small
+# Chunks gathered into one embedding job, sent in as few requests as the API limits allow
+EMBED_BATCH_SIZE = int(os.getenv("DME_EMBED_BATCH", "256"))
+# Embedding jobs and Pinecone/Typesense upserts running at once
+EMBED_CONCURRENCY = int(os.getenv("DME_EMBED_CONCURRENCY", "4"))
+UPSERT_CONCURRENCY = int(os.getenv("DME_UPSERT_CONCURRENCY", "4"))
+# Typesense documents per bulk import request
+TYPESENSE_IMPORT_BATCH = int(os.getenv("DME_TYPESENSE_BATCH", "500"))
+# "reindex" builds a new collection and swaps the alias to it; "incremental"
+# upserts changed documents into the live one
+TYPESENSE_MODE = os.getenv("DME_TYPESENSE_MODE", "reindex")
+# Starting rate limits for OpenAI; adjusted from its x-ratelimit-* headers
+OPENAI_RPM = int(os.getenv("DME_OPENAI_RPM", "3000"))
+OPENAI_TPM = int(os.getenv("DME_OPENAI_TPM", "1000000"))
 
 # Flag to determine if Typesense is available
 USE_TYPESENSE = TYPESENSE_API_KEY is not None and TYPESENSE_API_KEY.strip() != ""
 
-# Initialize OpenAI client
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is required")
-openai.api_key = OPENAI_API_KEY
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Clients are created on first use, so importing this module (e.g. from
+# pipeline.py) needs no keys, and a process only ever makes one of each.
+_clients = {}
 
-# Initialize Pinecone
-if not PINECONE_API_KEY:
-    raise ValueError("PINECONE_API_KEY environment variable is required")
+def get_openai():
+    """The shared OpenAI client."""
+    if "openai" not in _clients:
+        if not OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY environment variable is required")
+        openai.api_key = OPENAI_API_KEY
+        _clients["openai"] = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return _clients["openai"]
 
-# Use the new Pinecone initialization
-pc = pinecone.Pinecone(api_key=PINECONE_API_KEY)
-print(f"Pinecone client initialized successfully with environment: {PINECONE_ENVIRONMENT}")
+def get_pinecone():
+    """The shared Pinecone client."""
+    if "pinecone" not in _clients:
+        if not PINECONE_API_KEY:
+            raise ValueError("PINECONE_API_KEY environment variable is required")
+        # Use the new Pinecone initialization
+        _clients["pinecone"] = pinecone.Pinecone(api_key=PINECONE_API_KEY)
+        print(f"Pinecone client initialized successfully with environment: {PINECONE_ENVIRONMENT}")
+    return _clients["pinecone"]
 
-# Initialize Typesense only if API key is available
-typesense_client = None
-if USE_TYPESENSE:
-    try:
-        import typesense
-        typesense_client = typesense.Client({
-            'api_key': TYPESENSE_API_KEY,
-            'nodes': [{
-                'host': TYPESENSE_HOST,
-                'port': TYPESENSE_PORT,
-                'protocol': TYPESENSE_PROTOCOL
-            }],
-            'connection_timeout_seconds': 10
-        })
-        print("Typesense client initialized successfully.")
-    except ImportError:
-        print("Typesense package not installed. Skipping Typesense integration.")
-        USE_TYPESENSE = False
-    except Exception as e:
-        print(f"Error initializing Typesense client: {e}")
-        USE_TYPESENSE = False
-else:
-    print("TYPESENSE_API_KEY not provided. Skipping Typesense integration.")
-
-def clean_html(html_text):
-    """Remove HTML tags and decode entities"""
-    # Remove HTML tags
-    text = re.sub(r'<[^>]*>', ' ', html_text)
-    # Decode HTML entities
-    text = html.unescape(text)
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-def create_typesense_collection():
-    """Create or recreate the Typesense collection"""
-    if not USE_TYPESENSE:
-        return
-    
-    # Check if collection exists and delete it
-    try:
-        typesense_client.collections[TYPESENSE_COLLECTION].delete()
-        print(f"Deleted existing Typesense collection: {TYPESENSE_COLLECTION}")
-    except Exception:
-        print(f"No existing collection to delete: {TYPESENSE_COLLECTION}")
+def get_embed_cache():
+    """The shared embedding cache (see embed_cache.py)."""
+    if "embed_cache" not in _clients:
+        _clients["embed_cache"] = EmbeddingCache()
+    return _clients["embed_cache"]
+
+def get_manifest():
+    """The shared manifest of what the Pinecone index holds (see index_manifest.py)."""
+    if "manifest" not in _clients:
+        _clients["manifest"] = IndexManifest(PINECONE_INDEX_NAME)
+    return _clients["manifest"]
+
+def index_vector_count(pinecone_index):
+    """Number of vectors in the index, per its stats."""
+    return pinecone_index.describe_index_stats().total_vector_count
+
+def get_pacer():
+    """The shared OpenAI rate pacer (see pacing.py)."""
+    if "pacer" not in _clients:
+        _clients["pacer"] = RatePacer(OPENAI_RPM, OPENAI_TPM)
+    return _clients["pacer"]
 
+def get_embedder():
+    """A batching, rate-paced embedder that checks the embedding cache first."""
+    return Embedder(get_openai(), EMBEDDING_MODEL, EMBEDDING_DIMENSION,
+                    cache=get_embed_cache(), pacer=get_pacer())
+
+def get_typesense():
+    """The shared Typesense client, or None if Typesense isn't configured."""
+    global USE_TYPESENSE
+    if "typesense" not in _clients:
+        _clients["typesense"] = None
+        if USE_TYPESENSE:
+            try:
+                import typesense
+                _clients["typesense"] = typesense.Client({
+                    'api_key': TYPESENSE_API_KEY,
+                    'nodes': [{
+                        'host': TYPESENSE_HOST,
+                        'port': TYPESENSE_PORT,
+                        'protocol': TYPESENSE_PROTOCOL
+                    }],
+                    'connection_timeout_seconds': 10
+                })
+                print("Typesense client initialized successfully.")
+            except ImportError:
+                print("Typesense package not installed. Skipping Typesense integration.")
+                USE_TYPESENSE = False
+            except Exception as e:
+                print(f"Error initializing Typesense client: {e}")
+                USE_TYPESENSE = False
+        else:
+            print("TYPESENSE_API_KEY not provided. Skipping Typesense integration.")
+    return _clients["typesense"]
+
+def create_typesense_collection(name):
+    """Create an empty Typesense collection with the KB schema"""
+    typesense_client = get_typesense()
+    
     # Create collection
     collection_schema = {
-        'name': TYPESENSE_COLLECTION,
+        'name': name,
         'fields': [
             {'name': 'id', 'type': 'string'},
+            {'name': 'item_id', 'type': 'string', 'optional': True},
             {'name': 'original_id', 'type': 'int32'},
             {'name': 'type', 'type': 'string', 'facet': True},
+            {'name': 'chunk_index', 'type': 'int32', 'optional': True},
             {'name': 'title', 'type': 'string'},
             {'name': 'clean_content', 'type': 'string'},
             {'name': 'url', 'type': 'string'},
             {'name': 'date', 'type': 'string', 'facet': True},
             {'name': 'categories', 'type': 'int32[]', 'facet': True},
             {'name': 'sports', 'type': 'int32[]', 'facet': True},
+            {'name': 'category_names', 'type': 'string[]', 'facet': True, 'optional': True},
+            {'name': 'tag_names', 'type': 'string[]', 'facet': True, 'optional': True},
+            {'name': 'sport_names', 'type': 'string[]', 'facet': True, 'optional': True},
+            {'name': 'author', 'type': 'string', 'facet': True, 'optional': True},
             {'name': 'embedding', 'type': 'float[]', 'num_dim': EMBEDDING_DIMENSION},
         ]
     }
     
     typesense_client.collections.create(collection_schema)
-    print(f"Created Typesense collection: {TYPESENSE_COLLECTION}")
+    print(f"Created Typesense collection: {name}")
+
+def typesense_live_collection():
+    """The collection the TYPESENSE_COLLECTION alias points at, or None"""
+    try:
+        return get_typesense().aliases[TYPESENSE_COLLECTION].retrieve()["collection_name"]
+    except Exception:
+        return None
+
+def start_typesense_reindex():
+    """Create the collection a reindex fills, dropping ones left by failed runs"""
+    typesense_client = get_typesense()
+    live = typesense_live_collection()
+    prefix = f"{TYPESENSE_COLLECTION}_"
+    for collection in typesense_client.collections.retrieve():
+        if collection["name"].startswith(prefix) and collection["name"] != live:
+            typesense_client.collections[collection["name"]].delete()
+            print(f"Deleted unfinished Typesense collection: {collection['name']}")
+    name = f"{prefix}{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    create_typesense_collection(name)
+    return name
+
+def finish_typesense_reindex(name):
+    """Point the alias at a fully imported collection, then drop the old one"""
+    typesense_client = get_typesense()
+    old = typesense_live_collection()
+    if old is None:
+        # A collection from before aliases has the alias's name and would shadow it
+        try:
+            typesense_client.collections[TYPESENSE_COLLECTION].delete()
+            print(f"Deleted pre-alias Typesense collection: {TYPESENSE_COLLECTION}")
+        except Exception:
+            pass
+    typesense_client.aliases.upsert(TYPESENSE_COLLECTION, {"collection_name": name})
+    print(f"Typesense alias {TYPESENSE_COLLECTION} now points at {name}")
+    if old and old != name:
+        typesense_client.collections[old].delete()
+        print(f"Deleted previous Typesense collection: {old}")
+
+def import_typesense_documents(collection, documents):
+    """Upsert documents in one bulk JSONL import; returns the ids of those that failed"""
+    results = get_typesense().collections[collection].documents.import_(documents, {"action": "upsert"})
+    # One result per document, in order
+    failed = [(document["id"], result) for document, result in zip(documents, results)
+              if not result.get("success")]
+    if failed:
+        print(f"Typesense rejected {len(failed)} documents, e.g. {failed[0][1].get('error')}")
+    return [doc_id for doc_id, _ in failed]
+
+def delete_typesense_documents(ids):
+    """Delete documents from the live collection by id"""
+    id_list = ",".join(f"`{doc_id}`" for doc_id in ids)
+    get_typesense().collections[TYPESENSE_COLLECTION].documents.delete({"filter_by": f"id:[{id_list}]"})
 
 def ensure_pinecone_index():
     """Ensure Pinecone index exists"""
+    pc = get_pinecone()
     # List all indexes
     index_list = pc.list_indexes()
     print(f"Available Pinecone indexes: {index_list}")
@@ -139,119 +242,274 @@ def ensure_pinecone_index():
     # Connect to index
     return pc.Index(PINECONE_INDEX_NAME)
 
-def get_embedding(text, model=EMBEDDING_MODEL):
-    """Get embedding for text using OpenAI API"""
-    # Truncate text if it's too long (OpenAI has token limits)
-    if len(text) > 25000:
-        text = text[:25000]
-    
+def get_embedding(text):
+    """Get embedding for text, from the cache or the OpenAI API"""
     try:
-        response = client.embeddings.create(
-            input=text,
-            model=model
-        )
-        return response.data[0].embedding
+        embedding = get_embedder().embed([text])[0]
+        if embedding is None:
+            raise ValueError("input rejected by the embedding model")
+        return embedding
     except Exception as e:
         print(f"Error getting embedding: {e}")
         # Return a zero vector in case of error
         return [0.0] * EMBEDDING_DIMENSION
 
-def process_kb_items():
-    """Process KB items, create embeddings, and upsert to Pinecone and Typesense"""
+# Fingerprints of site-wide boilerplate blocks in a worker, set once by _init_worker
+_boilerplate = set()
+
+def _init_worker(boilerplate):
+    global _boilerplate
+    _boilerplate = boilerplate
+
+def chunk_kb_item(item):
+    """An item with its chunks, boilerplate stripped (run in a worker process)
+
+    The text is the one extracted at sync time; entries from a KB built
+    before that still have their HTML parsed here.
+    """
+    text = item["text"] if "text" in item else extract_text(item.get("content", ""))
+    return item, chunk_item(item, strip_boilerplate(text, _boilerplate))
+
+def vector_metadata(item, chunk):
+    """Pinecone metadata for one chunk of a KB entry"""
+    return {
+        "item_id": item["id"],
+        "original_id": item["original_id"],
+        "type": item["type"],
+        "chunk_index": chunk["index"],
+        "title": item.get("title", ""),
+        "text": chunk["text"],
+        "url": item.get("url", ""),
+        "date": item.get("date", ""),
+        "category_names": item.get("category_names", []),
+        "tag_names": item.get("tag_names", []),
+        "sport_names": item.get("sport_names", []),
+        "author": item.get("author", ""),
+    }
+
+def typesense_document(item, chunk, embedding):
+    """Typesense document for one chunk of a KB entry"""
+    return {
+        "id": chunk["id"],
+        "item_id": item["id"],
+        "original_id": item["original_id"],
+        "type": item["type"],
+        "chunk_index": chunk["index"],
+        "title": item.get("title", ""),
+        "clean_content": chunk["text"],
+        "url": item.get("url", ""),
+        "date": item.get("date", ""),
+        # Events carry their terms as objects; the schema wants ids
+        "categories": term_ids(item.get("categories")),
+        "sports": term_ids(item.get("sports")),
+        "category_names": item.get("category_names", []),
+        "tag_names": item.get("tag_names", []),
+        "sport_names": item.get("sport_names", []),
+        "author": item.get("author", ""),
+        "embedding": embedding
+    }
+
+def load_kb_items(path=KB_PATH):
+    """Lazily read the KB written by kb_update.py, one entry at a time"""
+    print(f"Reading KB items from {path}")
+    return read_kb(path)
+
+def process_kb_items(kb_items=None, boilerplate=None, delete_stale_vectors=True,
+                     typesense_mode=TYPESENSE_MODE):
+    """Process KB items, create embeddings, and upsert to Pinecone and Typesense
+
+    ``kb_items`` can be any iterable of KB entries, such as the reader
+    ``kb_update.update_kb`` returns; by default master_kb.jsonl is read.
+    ``boilerplate`` is a set of block fingerprints to strip from the text
+    before embedding; by default the ones kb_update found in the KB.
+
+    Only vectors that are new or changed since the last run (according to
+    the index manifest) are upserted to Pinecone. Vectors the manifest has
+    but ``kb_items`` no longer produces are deleted, so ``kb_items`` must
+    be the whole KB unless ``delete_stale_vectors`` is False.
+
+    ``typesense_mode`` "reindex" fills a new Typesense collection with
+    every chunk and only then moves the alias searches use onto it, so the
+    live collection is never empty or partial. "incremental" upserts the
+    chunks that changed for Pinecone into the live collection and deletes
+    the stale ones; it falls back to a reindex if there is no live
+    collection yet.
+    """
     print(f"[{datetime.now()}] Starting embedding and upsert process...")
     
-    # Load KB items
-    with open("master_kb.json", "r") as f:
-        kb_items = json.load(f)
-    
-    print(f"Loaded {len(kb_items)} items from master_kb.json")
+    if kb_items is None:
+        kb_items = load_kb_items()
+    if boilerplate is None:
+        boilerplate = load_boilerplate(boilerplate_path(KB_PATH))
+    print(f"Stripping {len(boilerplate)} boilerplate blocks before embedding")
     
     # Ensure Pinecone index exists
     pinecone_index = ensure_pinecone_index()
+    manifest = get_manifest()
+    if not len(manifest) and index_vector_count(pinecone_index):
+        # No record of what's in the index (first run, or the file was lost)
+        print(f"Rebuilding the index manifest from {PINECONE_INDEX_NAME}...")
+        print(f"Found {reconcile(pinecone_index, manifest)} vectors")
+    if manifest.get_state("legacy_purged") is None:
+        # Once per index: whole-page vectors from before chunking
+        purged = purge_legacy(pinecone_index)
+        print(f"Deleted {purged} whole-page vectors left from before chunking")
+        manifest.set_state("legacy_purged", str(purged))
+    known = manifest.hashes()
     
-    # Create Typesense collection if enabled
-    if USE_TYPESENSE:
-        create_typesense_collection()
+    # Pick the Typesense collection to write to, if enabled
+    typesense_client = get_typesense()
+    reindex = False
+    if typesense_client:
+        typesense_target = typesense_live_collection()
+        if typesense_mode != "incremental" or typesense_target is None:
+            reindex = True
+            typesense_target = start_typesense_reindex()
+        print(f"Typesense: {'reindexing into' if reindex else 'updating'} {typesense_target}")
     
     # Process items in batches
     batch_size = 100
     pinecone_vectors = []
     typesense_documents = []
+    counts = {"upserted": 0, "unchanged": 0, "skipped": 0, "deleted": 0}
+    typesense_failed = []  # ids of chunks Typesense didn't take
     
-    for i, item in enumerate(tqdm(kb_items, desc="Processing items")):
-        # Extract and clean text for embedding
-        title = item.get("title", "")
-        content = item.get("content", "")
-        
-        # Clean HTML from content
-        clean_content = clean_html(content)
-        
-        # Create text for embedding
-        text_for_embedding = f"Title: {title}\n\nContent: {clean_content}"
-        
-        # Get embedding
-        embedding = get_embedding(text_for_embedding)
-        
-        # Prepare Pinecone vector
-        pinecone_vector = {
-            "id": item["id"],
-            "values": embedding,
-            "metadata": {
-                "original_id": item["original_id"],
-                "type": item["type"],
-                "title": title,
-                "url": item.get("url", ""),
-                "date": item.get("date", ""),
-            }
-        }
-        pinecone_vectors.append(pinecone_vector)
-        
-        # Prepare Typesense document if enabled
-        if USE_TYPESENSE:
-            typesense_document = {
-                "id": item["id"],
-                "original_id": item["original_id"],
-                "type": item["type"],
-                "title": title,
-                "clean_content": clean_content[:65000],  # Typesense may have size limits
-                "url": item.get("url", ""),
-                "date": item.get("date", ""),
-                "categories": item.get("categories", []),
-                "sports": item.get("sports", []),
-                "embedding": embedding
-            }
-            typesense_documents.append(typesense_document)
-        
-        # Upsert in batches
-        if len(pinecone_vectors) >= batch_size or i == len(kb_items) - 1:
-            # Upsert to Pinecone
-            try:
-                pinecone_index.upsert(vectors=pinecone_vectors)
-                print(f"Upserted {len(pinecone_vectors)} vectors to Pinecone")
-            except Exception as e:
-                print(f"Error upserting to Pinecone: {e}")
-            
-            # Upsert to Typesense if enabled
-            if USE_TYPESENSE and typesense_documents:
-                try:
-                    # Import documents in chunks to avoid payload size issues
-                    chunk_size = 20
-                    for j in range(0, len(typesense_documents), chunk_size):
-                        chunk = typesense_documents[j:j+chunk_size]
-                        typesense_client.collections[TYPESENSE_COLLECTION].documents.import_(chunk)
-                    print(f"Upserted {len(typesense_documents)} documents to Typesense")
-                except Exception as e:
-                    print(f"Error upserting to Typesense: {e}")
-            
-            # Clear batches
-            pinecone_vectors = []
-            typesense_documents = []
-            
-            # Small delay to avoid rate limits
-            time.sleep(0.5)
+    # Embedding requests and upserts run on their own threads, so the next
+    # batches are embedded while earlier ones are being upserted. Both
+    # queues are bounded; SQLite (the manifest) is only touched here.
+    embedder = get_embedder()
+    embed_pool = ThreadPoolExecutor(EMBED_CONCURRENCY, thread_name_prefix="embed")
+    upsert_pool = ThreadPoolExecutor(UPSERT_CONCURRENCY, thread_name_prefix="upsert")
+    embedding = deque()  # futures of (batch, embeddings), oldest first
+    upserting = deque()  # futures of (vectors that made it into Pinecone, ids of failed documents)
+    pending = []  # (item, chunk, metadata, changed) waiting to be embedded
+    
+    def embed(batch):
+        try:
+            return batch, embedder.embed([chunk["input"] for _, chunk, _, _ in batch])
+        except Exception as e:
+            print(f"Error getting embeddings: {e}")
+            return batch, [None] * len(batch)
+    
+    def upsert_pinecone(vectors):
+        try:
+            pinecone_index.upsert(vectors=vectors)
+            print(f"Upserted {len(vectors)} vectors to Pinecone")
+            return vectors, []
+        except Exception as e:
+            print(f"Error upserting to Pinecone: {e}")
+            return [], []
+    
+    def upsert_typesense(documents):
+        try:
+            failed = import_typesense_documents(typesense_target, documents)
+            print(f"Upserted {len(documents) - len(failed)} documents to Typesense")
+            return [], failed
+        except Exception as e:
+            print(f"Error upserting to Typesense: {e}")
+            return [], [document["id"] for document in documents]
+    
+    def collect_upserts(wait=False):
+        while upserting and (wait or upserting[0].done() or len(upserting) > UPSERT_CONCURRENCY * 2):
+            vectors, failed = upserting.popleft().result()
+            # Only what is known to have arrived goes into the manifest
+            manifest.record(vectors)
+            counts["upserted"] += len(vectors)
+            typesense_failed.extend(failed)
     
+    def flush(final=False):
+        if pinecone_vectors and (final or len(pinecone_vectors) >= batch_size):
+            upserting.append(upsert_pool.submit(upsert_pinecone, list(pinecone_vectors)))
+            pinecone_vectors.clear()
+        if typesense_documents and (final or len(typesense_documents) >= TYPESENSE_IMPORT_BATCH):
+            upserting.append(upsert_pool.submit(upsert_typesense, list(typesense_documents)))
+            typesense_documents.clear()
+        collect_upserts()
+    
+    def collect_embeddings(wait=False):
+        while embedding and (wait or embedding[0].done() or len(embedding) > EMBED_CONCURRENCY * 2):
+            batch, embeddings = embedding.popleft().result()
+            for (item, chunk, metadata, changed), vector in zip(batch, embeddings):
+                if vector is None:
+                    counts["skipped"] += 1
+                    continue
+                if changed:
+                    pinecone_vectors.append({"id": chunk["id"], "values": vector, "metadata": metadata})
+                if typesense_client and (changed or reindex):
+                    typesense_documents.append(typesense_document(item, chunk, vector))
+                
+                # Upsert in batches
+                flush()
+    
+    # Items are split into chunks on a process pool, a few items ahead of
+    # the embedding calls; every chunk becomes its own vector, and chunks
+    # are embedded many per request
+    start = time.perf_counter()
+    seen = set()
+    try:
+        chunked = ordered_map(chunk_kb_item, kb_items, initializer=_init_worker, initargs=(boilerplate,))
+        for item, chunks in tqdm(chunked, desc="Processing items"):
+            for chunk in chunks:
+                metadata = vector_metadata(item, chunk)
+                seen.add(chunk["id"])
+                changed = known.get(chunk["id"]) != vector_hash(metadata)
+                if not changed:
+                    counts["unchanged"] += 1
+                # A Typesense reindex needs every chunk, changed or not
+                if changed or reindex:
+                    pending.append((item, chunk, metadata, changed))
+            if len(pending) >= EMBED_BATCH_SIZE:
+                embedding.append(embed_pool.submit(embed, list(pending)))
+                pending.clear()
+                collect_embeddings()
+        if pending:
+            embedding.append(embed_pool.submit(embed, list(pending)))
+        collect_embeddings(wait=True)
+        flush(final=True)
+        collect_upserts(wait=True)
+    finally:
+        embed_pool.shutdown(cancel_futures=True)
+        upsert_pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start
+    
+    if reindex:
+        # Searches only move over to a complete collection: every chunk
+        # embedded and imported
+        if typesense_failed or counts["skipped"] or not seen:
+            print(f"Typesense reindex incomplete ({len(typesense_failed)} documents failed, "
+                  f"{counts['skipped']} chunks not embedded, {len(seen)} chunks); "
+                  f"keeping {typesense_live_collection()}")
+            typesense_client.collections[typesense_target].delete()
+        else:
+            finish_typesense_reindex(typesense_target)
+    elif typesense_failed:
+        # Forgotten chunks count as changed next run, so Typesense gets
+        # them again (and Pinecone, harmlessly, too)
+        manifest.forget(typesense_failed)
+        print(f"{len(typesense_failed)} Typesense documents failed; they will be retried next run")
+    
+    # Vectors of removed items, and of chunks that changed id; a reindexed
+    # Typesense collection never had them
+    if delete_stale_vectors and seen:
+        on_batch = delete_typesense_documents if typesense_client and not reindex else None
+        counts["deleted"] = delete_stale(pinecone_index, manifest, seen, on_batch=on_batch)
+    
+    print(f"Embedded {embedder.tokens} tokens in {embedder.requests} requests "
+          f"({embedder.tokens / elapsed:,.0f} tokens/s, {embedder.pacer.waited:.1f}s waiting on rate limits)")
+    stats = get_embed_cache().stats()
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} stored")
+    print(f"Pinecone: {counts['upserted']} upserted ({counts['upserted'] / elapsed:,.1f} vectors/s), "
+          f"{counts['unchanged']} unchanged, {counts['deleted']} deleted")
+    if counts["skipped"]:
+        print(f"Skipped {counts['skipped']} chunks that could not be embedded")
     print(f"[{datetime.now()}] Embedding and upsert process complete!")
 
+def reconcile_manifest():
+    """Rebuild the index manifest from what Pinecone actually holds"""
+    pinecone_index = get_pinecone().Index(PINECONE_INDEX_NAME)
+    found = reconcile(pinecone_index, get_manifest())
+    print(f"Index manifest rebuilt: {found} vectors in {PINECONE_INDEX_NAME}")
+
 def test_search(query, limit=5):
     """Test search functionality"""
     print(f"\nTesting search for: '{query}'")
@@ -260,7 +518,7 @@ def test_search(query, limit=5):
     query_embedding = get_embedding(query)
     
     # Search Pinecone
-    pinecone_index = pc.Index(PINECONE_INDEX_NAME)
+    pinecone_index = get_pinecone().Index(PINECONE_INDEX_NAME)
     pinecone_results = pinecone_index.query(
         vector=query_embedding,
         top_k=limit,
@@ -276,7 +534,8 @@ def test_search(query, limit=5):
         print()
     
     # Search Typesense if enabled
-    if USE_TYPESENSE:
+    typesense_client = get_typesense()
+    if typesense_client:
         try:
             search_parameters = {
                 'q': query,
@@ -300,10 +559,17 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description="Embed KB items and upsert to Pinecone and Typesense")
     parser.add_argument("--test", help="Test search with the given query")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Rebuild the local index manifest from Pinecone and exit")
+    parser.add_argument("--typesense-mode", choices=["reindex", "incremental"], default=TYPESENSE_MODE,
+                        help="Rebuild Typesense into a new collection and swap the alias (default), "
+                             "or only upsert changed documents into the live one")
     
     args = parser.parse_args()
     
     if args.test:
         test_search(args.test)
+    elif args.reconcile:
+        reconcile_manifest()
     else:
-        process_kb_items() 
\ No newline at end of file
+        process_kb_items(typesense_mode=args.typesense_mode) 
\ No newline at end of file
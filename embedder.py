@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import threading
+
+import openai
+
+from chunking import MAX_INPUT_TOKENS, count_tokens, truncate_tokens
+
+# Per-request limits of the OpenAI embeddings endpoint
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300_000
+
+class Embedder:
+    """Embeds many texts per request to the embeddings endpoint.
+
+    ``embed`` packs texts into as few requests as the per-request input
+    and token limits allow and hands the vectors back in input order. If
+    a request is rejected (a 400, e.g. one input the model won't take),
+    the batch is split in half and retried, down to the single input at
+    fault, which gets None instead of a vector. Other errors propagate;
+    the OpenAI client has already retried them.
+
+    With an ``embed_cache.EmbeddingCache``, texts already embedded with
+    this model and ``dimension`` are served from it, and only the rest are
+    sent; each batch is stored as soon as it comes back.
+
+    With a ``pacing.RatePacer``, each request first waits for room in its
+    requests/tokens per minute, and the rate-limit headers of the response
+    are fed back to it. ``embed`` can be called from several threads.
+    """
+
+    def __init__(self, client, model, dimension=None, cache=None, pacer=None,
+                 max_inputs=MAX_BATCH_INPUTS, max_tokens=MAX_BATCH_TOKENS):
+        self.client = client
+        self.model = model
+        self.dimension = dimension
+        self.cache = cache
+        self.pacer = pacer
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.requests = 0
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    def batches(self, texts):
+        """Split texts into lists of (position, text, tokens) that fit in one request."""
+        batch, size = [], 0
+        for position, text in enumerate(texts):
+            text = truncate_tokens(text or " ", MAX_INPUT_TOKENS)
+            n = count_tokens(text)
+            if batch and (len(batch) >= self.max_inputs or size + n > self.max_tokens):
+                yield batch
+                batch, size = [], 0
+            batch.append((position, text, n))
+            size += n
+        if batch:
+            yield batch
+
+    def embed(self, texts):
+        """One vector (or None, if rejected) per text, in order."""
+        if self.cache is not None:
+            vectors = self.cache.get_many(self.model, self.dimension, texts)
+        else:
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for batch in self.batches([texts[i] for i in missing]):
+            results = self._embed_batch(batch)
+            for (position, _, _), vector in zip(batch, results):
+                vectors[missing[position]] = vector
+            if self.cache is not None:
+                self.cache.put_many(self.model, self.dimension,
+                                    [texts[missing[position]] for position, _, _ in batch], results)
+        return vectors
+
+    def _create(self, batch):
+        texts = [text for _, text, _ in batch]
+        if self.pacer is None:
+            return self.client.embeddings.create(input=texts, model=self.model)
+        self.pacer.acquire(sum(n for _, _, n in batch))
+        raw = self.client.embeddings.with_raw_response.create(input=texts, model=self.model)
+        self.pacer.observe(raw.headers)
+        return raw.parse()
+
+    def _embed_batch(self, batch):
+        try:
+            response = self._create(batch)
+        except openai.BadRequestError as e:
+            if len(batch) == 1:
+                print(f"Embedding rejected for input {batch[0][0]}: {e}")
+                return [None]
+            middle = len(batch) // 2
+            return self._embed_batch(batch[:middle]) + self._embed_batch(batch[middle:])
+        with self.lock:
+            self.requests += 1
+            self.tokens += sum(n for _, _, n in batch)
+        return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    """A request failed for good: retries exhausted or the connection never succeeded."""
+
+    def __init__(self, url: str, status: Optional[int] = None, cause: Optional[Exception] = None):
+        self.url = url
+        self.status = status
+        self.cause = cause
+        reason = f"status {status}" if status else str(cause)
+        super().__init__(f"Failed to fetch {url}: {reason}")
+
+class HostThrottle:
+    """Caps concurrent requests to one host and backs off when it slows down.
+
+    Every response feeds its latency and status back through ``record()``.
+    A 429/503 or a response slower than ``slow_after`` seconds doubles the
+    delay applied before each new request; fast responses halve it again.
+    """
+
+    def __init__(self, max_concurrency: int = 4, slow_after: float = 5.0, max_delay: float = 30.0):
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.slow_after = slow_after
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.slots.acquire()
+        with self.lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+        return self
+
+    def __exit__(self, *exc):
+        self.slots.release()
+        return False
+
+    def record(self, elapsed: float, status: Optional[int] = None):
+        with self.lock:
+            if status in (429, 503) or elapsed > self.slow_after:
+                self.delay = min(self.max_delay, max(0.5, self.delay * 2))
+                logger.warning(f"Host slowing down ({elapsed:.1f}s, status {status}), "
+                               f"delaying requests by {self.delay:.1f}s")
+            elif self.delay:
+                self.delay = self.delay / 2 if self.delay > 0.1 else 0.0
+
+class HttpClient:
+    """Shared keep-alive HTTP client for the crawler.
+
+    One ``requests.Session`` with a connection pool sized to the per-host
+    concurrency cap, so requests reuse TCP/TLS connections instead of
+    handshaking every time. Requests that fail with a 429/5xx or a
+    connection error are retried with jittered exponential backoff,
+    honoring ``Retry-After``; when retries run out ``FetchError`` is raised.
+    Any other response, including 4xx, is returned for the caller to judge.
+
+    Each attempt is reported to ``observers``, callables taking
+    ``(url, status, seconds, bytes)``; status is None for connection errors.
+    """
+
+    def __init__(self, max_per_host: int = 4, max_retries: int = 4,
+                 backoff_base: float = 0.5, max_backoff: float = 30.0,
+                 user_agent: str = "DME-KB-Sync",
+                 observers: Optional[List[Callable[[str, Optional[int], float, int], None]]] = None):
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+        self.lock = threading.Lock()
+        self.throttles: Dict[str, HostThrottle] = {}
+        self.counters: Dict[str, Dict[str, float]] = {}
+        self.observers = list(observers or [])
+
+    def _host(self, host: str) -> HostThrottle:
+        with self.lock:
+            if host not in self.throttles:
+                self.throttles[host] = HostThrottle(self.max_per_host)
+                self.counters[host] = {"requests": 0, "retries": 0, "failures": 0,
+                                       "errors": 0, "seconds": 0.0}
+            return self.throttles[host]
+
+    def _count(self, host: str, elapsed: float, ok: bool):
+        with self.lock:
+            counters = self.counters[host]
+            counters["requests"] += 1
+            counters["seconds"] += elapsed
+            if not ok:
+                counters["errors"] += 1
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Full-jitter exponential backoff, stretched to any Retry-After."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                try:
+                    wait = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    wait = 0.0
+            delay = max(delay, min(self.max_backoff, wait))
+        return delay
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 15) -> requests.Response:
+        """
+        GET a URL through the shared session.
+
+        Raises:
+            FetchError: if every attempt failed with a connection error or a
+                retryable status
+        """
+        host = urlparse(url).netloc
+        throttle = self._host(host)
+        response, error = None, None
+
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            with throttle:
+                start = time.monotonic()
+                try:
+                    response = self.session.get(url, headers=headers, timeout=timeout)
+                except requests.RequestException as e:
+                    error = e
+                elapsed = time.monotonic() - start
+                status = response.status_code if response is not None else None
+                throttle.record(elapsed, status)
+
+            ok = response is not None and response.status_code not in RETRY_STATUSES
+            self._count(host, elapsed, ok)
+            nbytes = len(response.content) if response is not None else 0
+            for observe in self.observers:
+                observe(url, status, elapsed, nbytes)
+            if ok:
+                return response
+            if attempt == self.max_retries:
+                break
+
+            delay = self._backoff(attempt, response)
+            with self.lock:
+                self.counters[host]["retries"] += 1
+            logger.warning(f"Retrying {url} in {delay:.1f}s "
+                           f"(attempt {attempt + 1}, {status or error})")
+            time.sleep(delay)
+
+        with self.lock:
+            self.counters[host]["failures"] += 1
+        raise FetchError(url, response.status_code if response is not None else None, error)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-host request counters, with average latency in seconds."""
+        with self.lock:
+            return {
+                host: dict(counters, avg_seconds=(counters["seconds"] / counters["requests"]
+                                                  if counters["requests"] else 0.0))
+                for host, counters in self.counters.items()
+            }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import datetime as dt
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+# Local record of what is in the Pinecone index
+MANIFEST_PATH = os.getenv("DME_INDEX_MANIFEST", "index_manifest.db")
+# Pinecone's limits for one delete, and a fetch that stays under its payload size
+DELETE_BATCH = 1000
+FETCH_BATCH = 100
+# Ids of the vectors embed_upsert writes, <type>-<original_id>-<chunk index>-<hash>.
+# Anything else in the index (e.g. main.py /ingest vectors) isn't the KB's to
+# track or delete.
+KB_VECTOR_ID_RE = re.compile(r"[a-z_]+-\d+-\d+-[0-9a-f]+")
+
+# Ids of the whole-page vectors embed_upsert wrote before items were chunked
+LEGACY_VECTOR_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+def is_kb_vector(vector_id):
+    return KB_VECTOR_ID_RE.fullmatch(vector_id) is not None
+
+def is_legacy_kb_vector(metadata):
+    """Whether metadata is that of a pre-chunking KB vector.
+
+    Those carry the item's original_id but no chunk_index or item_id; old
+    /ingest vectors have no original_id.
+    """
+    return "original_id" in metadata and "chunk_index" not in metadata and "item_id" not in metadata
+
+def _plain(value):
+    # Pinecone hands numbers back as floats; 12.0 has to hash like 12
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+def vector_hash(metadata):
+    """Hash of a vector's metadata, which includes its title and text.
+
+    The embedded input is made from the title and text, so this changes
+    whenever the vector's values or anything searchable about it would.
+    It can also be recomputed from what the index returns.
+    """
+    plain = {key: _plain(value) for key, value in metadata.items()}
+    return hashlib.blake2b(json.dumps(plain, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+class IndexManifest:
+    """Vector id -> hash, type and original id of what one index holds."""
+
+    def __init__(self, index_name, path=MANIFEST_PATH):
+        self.index_name = index_name
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS vectors
+                           (index_name TEXT, id TEXT, hash TEXT, type TEXT, original_id INTEGER,
+                            updated TEXT, PRIMARY KEY(index_name, id)) WITHOUT ROWID""")
+        # One-off migrations that have run against the index
+        self.db.execute("""CREATE TABLE IF NOT EXISTS state
+                           (index_name TEXT, key TEXT, value TEXT, PRIMARY KEY(index_name, key))""")
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM vectors WHERE index_name=?",
+                               (self.index_name,)).fetchone()[0]
+
+    def hashes(self):
+        """{vector id: hash} of everything recorded for the index."""
+        return dict(self.db.execute("SELECT id, hash FROM vectors WHERE index_name=?",
+                                    (self.index_name,)))
+
+    def record(self, vectors):
+        """Note vectors (dicts with id and metadata) as now being in the index."""
+        now = dt.datetime.now().isoformat()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?,?,?,?,?,?)",
+                [(self.index_name, v["id"], vector_hash(v["metadata"]), v["metadata"].get("type"),
+                  _plain(v["metadata"].get("original_id")), now) for v in vectors])
+
+    def forget(self, ids):
+        with self.db:
+            self.db.executemany("DELETE FROM vectors WHERE index_name=? AND id=?",
+                                [(self.index_name, vector_id) for vector_id in ids])
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM vectors WHERE index_name=?", (self.index_name,))
+
+    def get_state(self, key):
+        row = self.db.execute("SELECT value FROM state WHERE index_name=? AND key=?",
+                              (self.index_name, key)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO state VALUES (?,?,?)",
+                            (self.index_name, key, value))
+
+    def close(self):
+        self.db.close()
+
+def reconcile(index, manifest):
+    """Rebuild the manifest from the index itself, via list and fetch.
+
+    Only KB vectors (see ``is_kb_vector``) are recorded.
+
+    Returns:
+        Number of KB vectors found
+    """
+    manifest.clear()
+    found = 0
+    for ids in index.list():
+        ids = [vector_id for vector_id in ids if is_kb_vector(vector_id)]
+        for i in range(0, len(ids), FETCH_BATCH):
+            response = index.fetch(ids=ids[i:i + FETCH_BATCH])
+            manifest.record([{"id": vector_id, "metadata": dict(vector.metadata or {})}
+                             for vector_id, vector in response.vectors.items()])
+            found += len(response.vectors)
+    return found
+
+def delete_stale(index, manifest, keep, on_batch=None):
+    """Delete KB vectors the manifest has but ``keep`` doesn't, in batches.
+
+    ``on_batch(ids)``, if given, is called with each batch deleted, e.g. to
+    delete the same ids elsewhere.
+
+    Returns:
+        Number of vectors deleted
+    """
+    stale = [vector_id for vector_id in manifest.hashes()
+             if vector_id not in keep and is_kb_vector(vector_id)]
+    for i in range(0, len(stale), DELETE_BATCH):
+        batch = stale[i:i + DELETE_BATCH]
+        index.delete(ids=batch)
+        if on_batch:
+            on_batch(batch)
+        manifest.forget(batch)
+    return len(stale)
+
+def purge_legacy(index):
+    """Delete the whole-page vectors written before KB items were chunked.
+
+    They have none of the chunk ids the manifest tracks, so nothing else
+    ever removes them, and they would show up in searches next to the
+    chunks of the same page.
+
+    Returns:
+        Number of vectors deleted
+    """
+    legacy = []
+    for ids in index.list():
+        ids = [vector_id for vector_id in ids if LEGACY_VECTOR_ID_RE.fullmatch(vector_id)]
+        for i in range(0, len(ids), FETCH_BATCH):
+            response = index.fetch(ids=ids[i:i + FETCH_BATCH])
+            legacy += [vector_id for vector_id, vector in response.vectors.items()
+                       if is_legacy_kb_vector(dict(vector.metadata or {}))]
+    for i in range(0, len(legacy), DELETE_BATCH):
+        index.delete(ids=legacy[i:i + DELETE_BATCH])
+    return len(legacy)
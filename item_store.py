@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from content_hash import HASH_LENGTH, content_hash
+from text_extract import TEXT_VERSION, extract_text
+
+# Pragmas for the sync database. WAL lets readers keep going while a page is
+# being written, and synchronous=NORMAL only fsyncs at checkpoints, which is
+# still crash-safe at transaction granularity in WAL mode.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,  # negative = KiB, so ~20 MB of page cache
+    "temp_store": "MEMORY",
+}
+
+# DELETE ... RETURNING needs SQLite 3.35+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Change feed operations
+INSERT, UPDATE, DELETE = "insert", "update", "delete"
+
+# Columns pulled out of the raw record so readers don't have to decode it.
+# ``raw`` itself is stored as zlib-compressed JSON.
+EXTRACTED_COLUMNS = ["title", "date", "modified", "link", "text"]
+ITEM_COLUMNS = ["type", "id", "hash", "raw", "updated"] + EXTRACTED_COLUMNS
+INDEXES = {
+    "idx_items_title": "type, title",
+    "idx_items_date": "type, date",
+    "idx_items_modified": "type, modified",
+    "idx_items_link": "link",
+    "idx_items_hash": "hash",
+}
+
+def configure(db: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the sync pragmas to a connection and return it."""
+    for name, value in PRAGMAS.items():
+        db.execute(f"PRAGMA {name}={value}")
+    return db
+
+def pack_raw(rec: dict) -> bytes:
+    """Serialize a record for the ``raw`` column."""
+    return zlib.compress(json.dumps(rec, separators=(",", ":")).encode(), 6)
+
+def load_raw(value: Any) -> dict:
+    """Decode a ``raw`` column value, compressed or legacy plain-JSON text."""
+    if isinstance(value, (bytes, memoryview)):
+        return json.loads(zlib.decompress(value))
+    return json.loads(value)
+
+def _rendered(value: Any) -> str:
+    if isinstance(value, dict):
+        return value.get("rendered", "")
+    return value or ""
+
+def item_text(rec: dict) -> str:
+    """Visible text of a posts/pages (content) or events (description) record."""
+    return extract_text(_rendered(rec.get("content")) or rec.get("description") or "")
+
+def extract_columns(rec: dict) -> Tuple[str, str, str, str, str]:
+    """Title, date, modified, link and extracted text for a posts/pages/events record."""
+    return (
+        _rendered(rec.get("title")),
+        rec.get("date") or "",
+        rec.get("modified_gmt") or rec.get("modified_utc") or rec.get("modified") or "",
+        rec.get("link") or rec.get("url") or "",
+        item_text(rec),
+    )
+
+def ensure_schema(db: sqlite3.Connection):
+    """
+    Create the items table, or bring an older one up to the compact layout.
+
+    Databases written before the extracted columns existed get them added,
+    and any rows whose ``raw`` is still plain JSON text are compressed and
+    have their columns filled in. Hashes from an older hashing scheme are
+    recomputed, so the switch doesn't report every item as updated, and
+    ``text`` is re-extracted when ``TEXT_VERSION`` has moved on.
+    """
+    db.execute("""CREATE TABLE IF NOT EXISTS items
+                  (type TEXT, id INTEGER, hash TEXT,
+                   raw BLOB, updated TEXT,
+                   title TEXT, date TEXT, modified TEXT, link TEXT, text TEXT,
+                   PRIMARY KEY(type,id))""")
+    existing = {row[1] for row in db.execute("PRAGMA table_info(items)")}
+    for column in EXTRACTED_COLUMNS:
+        if column not in existing:
+            db.execute(f"ALTER TABLE items ADD COLUMN {column} TEXT")
+    for name, columns in INDEXES.items():
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON items ({columns})")
+    # Append-only log of every insert/update/delete, read by later stages
+    db.execute("""CREATE TABLE IF NOT EXISTS changes
+                  (seq INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT,
+                   type TEXT, id INTEGER, op TEXT, new_hash TEXT, ts TEXT)""")
+    db.execute("""CREATE TABLE IF NOT EXISTS change_cursors
+                  (consumer TEXT PRIMARY KEY, seq INTEGER, updated TEXT)""")
+    # Versions of derived data, e.g. which extractor produced items.text
+    db.execute("""CREATE TABLE IF NOT EXISTS item_meta
+                  (key TEXT PRIMARY KEY, value TEXT)""")
+    db.commit()
+    converted = migrate_items(db)
+    rehash_items(db)
+    reextract_text(db)
+    return converted
+
+def migrate_items(db: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Compress legacy text ``raw`` values and fill the extracted columns.
+
+    Returns:
+        Number of rows converted
+    """
+    converted = 0
+    while True:
+        rows = db.execute("""SELECT type, id, raw FROM items
+                             WHERE typeof(raw) = 'text' LIMIT ?""", (batch_size,)).fetchall()
+        if not rows:
+            return converted
+        with db:
+            db.executemany(
+                """UPDATE items SET raw=?, title=?, date=?, modified=?, link=?, text=?
+                   WHERE type=? AND id=?""",
+                [(pack_raw(rec), *extract_columns(rec), kind, item_id)
+                 for kind, item_id, rec in ((k, i, json.loads(r)) for k, i, r in rows)])
+        converted += len(rows)
+
+def rehash_items(db: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Recompute hashes that weren't made by ``content_hash`` (e.g. legacy sha256).
+
+    Only the stored hash changes, and no change is logged: the content is
+    the same, it is just fingerprinted differently.
+
+    Returns:
+        Number of rows rehashed
+    """
+    rehashed = 0
+    while True:
+        rows = db.execute("""SELECT type, id, raw FROM items
+                             WHERE length(hash) != ? LIMIT ?""",
+                          (HASH_LENGTH, batch_size)).fetchall()
+        if not rows:
+            return rehashed
+        with db:
+            db.executemany("UPDATE items SET hash=? WHERE type=? AND id=?",
+                           [(content_hash(load_raw(raw), kind), kind, item_id)
+                            for kind, item_id, raw in rows])
+        rehashed += len(rows)
+
+def text_version(db: sqlite3.Connection) -> int:
+    """Version of the extractor that produced the stored ``text`` column."""
+    row = db.execute("SELECT value FROM item_meta WHERE key='text_version'").fetchone()
+    return int(row[0]) if row else 0
+
+def reextract_text(db: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Redo ``items.text`` from ``raw`` if it was written by an older extractor.
+
+    Returns:
+        Number of rows re-extracted
+    """
+    if text_version(db) == TEXT_VERSION:
+        return 0
+    done, last = 0, 0
+    while True:
+        rows = db.execute("""SELECT rowid, raw FROM items WHERE rowid > ?
+                             ORDER BY rowid LIMIT ?""", (last, batch_size)).fetchall()
+        if not rows:
+            break
+        with db:
+            db.executemany("UPDATE items SET text=? WHERE rowid=?",
+                           [(item_text(load_raw(raw)), rowid) for rowid, raw in rows])
+        done += len(rows)
+        last = rows[-1][0]
+    with db:
+        db.execute("INSERT OR REPLACE INTO item_meta VALUES ('text_version', ?)",
+                   (str(TEXT_VERSION),))
+    return done
+
+class ItemWriter:
+    """Batched, transactional writer for the items table.
+
+    All existing ``(type, id) -> hash`` pairs are loaded once up front, so
+    deciding whether a record is new, changed or unchanged needs no query.
+    Each call to ``write_page`` applies its inserts and updates with
+    ``executemany`` inside a single transaction, which keeps crash safety
+    at page granularity while paying for one commit per page rather than
+    one per record.
+
+    Every write and removal is also appended to the ``changes`` feed in the
+    same transaction, tagged with ``run_id``.
+    """
+
+    def __init__(self, db: sqlite3.Connection, lock: Optional[threading.Lock] = None,
+                 run_id: Optional[str] = None):
+        self.db = db
+        self.lock = lock or threading.Lock()
+        self.run_id = run_id
+        with self.lock:
+            self.hashes: Dict[Tuple[str, int], str] = {
+                (kind, item_id): hsh
+                for kind, item_id, hsh in db.execute("SELECT type, id, hash FROM items")
+            }
+
+    def write_page(self, kind: str, records: Iterable[Tuple[int, str, dict]]) -> Tuple[List[dict], List[dict]]:
+        """
+        Write one page of records in a single transaction.
+
+        Args:
+            kind: Content type the records belong to
+            records: ``(id, hash, record)`` tuples
+
+        Returns:
+            Tuple of (new records, updated records)
+        """
+        today = dt.date.today().isoformat()
+        new, updated = [], []
+        inserts, updates = [], []
+
+        with self.lock:
+            for item_id, hsh, rec in records:
+                old = self.hashes.get((kind, item_id))
+                if old is None:
+                    new.append(rec)
+                    inserts.append((kind, item_id, hsh, pack_raw(rec), today,
+                                    *extract_columns(rec)))
+                elif old != hsh:
+                    updated.append(rec)
+                    updates.append((hsh, pack_raw(rec), today, *extract_columns(rec),
+                                    kind, item_id))
+
+            if inserts or updates:
+                with self.db:  # one transaction, rolled back on error
+                    self.db.executemany(f"""INSERT OR REPLACE INTO items ({", ".join(ITEM_COLUMNS)})
+                                            VALUES ({", ".join("?" * len(ITEM_COLUMNS))})""", inserts)
+                    self.db.executemany("""UPDATE items SET hash=?, raw=?, updated=?,
+                                           title=?, date=?, modified=?, link=?, text=?
+                                           WHERE type=? AND id=?""", updates)
+                    self._log_changes([(row[0], row[1], INSERT, row[2]) for row in inserts] +
+                                      [(row[-2], row[-1], UPDATE, row[0]) for row in updates])
+                # Only trust the cache once the transaction has committed
+                for row in inserts:
+                    self.hashes[(row[0], row[1])] = row[2]
+                for row in updates:
+                    self.hashes[(row[-2], row[-1])] = row[0]
+
+        return new, updated
+
+    def _log_changes(self, changes: List[Tuple[str, int, str, Optional[str]]]):
+        """Append ``(type, id, op, new_hash)`` rows to the feed; call inside a transaction."""
+        ts = dt.datetime.now().isoformat()
+        self.db.executemany("""INSERT INTO changes (run_id, type, id, op, new_hash, ts)
+                               VALUES (?,?,?,?,?,?)""",
+                            [(self.run_id, *change, ts) for change in changes])
+
+    def _load_seen(self, seen: Iterable[int]):
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen_ids (id INTEGER PRIMARY KEY)")
+        self.db.execute("DELETE FROM seen_ids")
+        self.db.executemany("INSERT OR IGNORE INTO seen_ids VALUES (?)",
+                            ((item_id,) for item_id in seen))
+
+    # Stored items of one kind whose id wasn't seen
+    ANTI_JOIN = """FROM items WHERE type=? AND NOT EXISTS
+                   (SELECT 1 FROM seen_ids s WHERE s.id = items.id)"""
+
+    def missing(self, kind: str, seen: Iterable[int]) -> List[int]:
+        """Ids of stored ``kind`` items not in ``seen``, without deleting anything."""
+        with self.lock:
+            with self.db:
+                self._load_seen(seen)
+                missing = [row[0] for row in
+                           self.db.execute(f"SELECT id {self.ANTI_JOIN}", (kind,))]
+                self.db.execute("DELETE FROM seen_ids")
+        return sorted(missing)
+
+    def remove_missing(self, kind: str, seen: Iterable[int]) -> List[int]:
+        """
+        Delete every stored item of ``kind`` whose id is not in ``seen``.
+
+        The seen ids are bulk-loaded into a temp table and the removed rows
+        are found and deleted with one anti-join, in one transaction.
+
+        Returns:
+            Sorted list of the ids that were deleted
+        """
+        with self.lock:
+            with self.db:
+                self._load_seen(seen)
+                if HAS_RETURNING:
+                    removed = [row[0] for row in
+                               self.db.execute(f"DELETE {self.ANTI_JOIN} RETURNING id", (kind,))]
+                else:
+                    removed = [row[0] for row in
+                               self.db.execute(f"SELECT id {self.ANTI_JOIN}", (kind,))]
+                    self.db.execute(f"DELETE {self.ANTI_JOIN}", (kind,))
+                self.db.execute("DELETE FROM seen_ids")
+                self._log_changes([(kind, item_id, DELETE, None) for item_id in removed])
+            for item_id in removed:
+                self.hashes.pop((kind, item_id), None)
+        return sorted(removed)
+
+class ChangeFeed:
+    """Cursor-based reader over the ``changes`` feed for one consumer.
+
+    A consumer reads what's pending since its cursor, acts on it, and then
+    calls ``ack`` with the last ``seq`` it handled. Until it does, the same
+    changes are handed out again, so a consumer that fails mid-way simply
+    retries on its next run.
+    """
+
+    def __init__(self, db: sqlite3.Connection, consumer: str):
+        self.db = db
+        self.consumer = consumer
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Last acknowledged seq, or None if this consumer has never acked."""
+        row = self.db.execute("SELECT seq FROM change_cursors WHERE consumer=?",
+                              (self.consumer,)).fetchone()
+        return row[0] if row else None
+
+    def head(self) -> int:
+        """Highest seq in the feed (0 if empty)."""
+        return self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def pending(self) -> List[Tuple[int, str, str, int, str, Optional[str], str]]:
+        """``(seq, run_id, type, id, op, new_hash, ts)`` rows after the cursor, oldest first."""
+        return self.db.execute("""SELECT seq, run_id, type, id, op, new_hash, ts FROM changes
+                                  WHERE seq > ? ORDER BY seq""", (self.cursor or 0,)).fetchall()
+
+    def latest(self) -> Tuple[Dict[Tuple[str, int], Tuple[str, Optional[str]]], Optional[int]]:
+        """
+        Net effect of the pending changes.
+
+        Returns:
+            Tuple of ({(type, id): (last op, new_hash)}, highest seq to ack)
+        """
+        net, last_seq = {}, None
+        for seq, _, kind, item_id, op, new_hash, _ in self.pending():
+            net[(kind, item_id)] = (op, new_hash)
+            last_seq = seq
+        return net, last_seq
+
+    def ack(self, seq: Optional[int]):
+        """Move the cursor forward to ``seq``."""
+        if seq is None:
+            return
+        with self.db:
+            self.db.execute("""INSERT INTO change_cursors VALUES (?,?,?)
+                               ON CONFLICT(consumer) DO UPDATE SET
+                                   seq=MAX(seq, excluded.seq), updated=excluded.updated""",
+                            (self.consumer, seq, dt.datetime.now().isoformat()))
+
+def prune_changes(db: sqlite3.Connection, keep: dt.timedelta = dt.timedelta(days=30)) -> int:
+    """Drop feed entries older than ``keep`` that every known consumer has acked."""
+    cutoff = (dt.datetime.now() - keep).isoformat()
+    with db:
+        cur = db.execute("""DELETE FROM changes WHERE ts < ?
+                            AND seq <= COALESCE((SELECT MIN(seq) FROM change_cursors), 0)""",
+                         (cutoff,))
+    return cur.rowcount
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate an items database to the compact storage layout")
+    parser.add_argument("db", nargs="?", default="dme.db", help="Path to the SQLite database")
+    args = parser.parse_args()
+
+    before = os.path.getsize(args.db)
+    db = sqlite3.connect(args.db)
+    converted = ensure_schema(db)
+    db.execute("VACUUM")
+    db.close()
+    after = os.path.getsize(args.db)
+    print(f"Converted {converted} rows; {args.db} is now {after:,} bytes (was {before:,})")
@@ -2,16 +2,34 @@
 import sqlite3
 import json
 import datetime as dt
-import hashlib
 import os
+from boilerplate import boilerplate_path, find_boilerplate, write_boilerplate
+from content_hash import content_hash
+from item_store import ChangeFeed, ensure_schema, item_text, load_raw
+from parallel import DEFAULT_WORKERS, ordered_map
+from taxonomy import item_names, load_names
+from text_extract import TEXT_VERSION
 
-def generate_id(data):
+# Name under which kb_update acks the sync change feed. The build works from
+# stored hashes and doesn't read the feed; acking only lets prune_changes
+# drop entries every build has covered.
+FEED_CONSUMER = "kb_update"
+# The KB, one JSON object per line
+KB_PATH = "master_kb.jsonl"
+
+def generate_id(data, item_type=None):
     """Generate a stable ID for an item"""
-    return hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return content_hash(data, item_type)
+
+def convert_to_kb_format(item_type, item_id, raw_data, names=None, text=None):
+    """Convert a raw database item to KB format
 
-def convert_to_kb_format(item_type, item_id, raw_data):
-    """Convert a raw database item to KB format"""
-    data = json.loads(raw_data)
+    ``names`` is the taxonomy lookup from ``taxonomy.load_names``; when given,
+    category/tag/sport and author names are filled in from it. ``text`` is
+    the item's extracted text as stored by the sync (``items.text``); it is
+    extracted from the raw record when not given.
+    """
+    data = load_raw(raw_data)
     
     # Extract title
     title = ""
@@ -44,87 +62,203 @@ def convert_to_kb_format(item_type, item_id, raw_data):
     
     # Create the KB item
     kb_item = {
-        "id": generate_id(data),
+        "id": generate_id(data, item_type),
         "original_id": item_id,
         "type": item_type,
         "title": title,
         "content": content,
+        "text": text if text is not None else item_text(data),
         "url": url,
         "date": date,
         "categories": categories,
         "sports": sports,
-        "raw": data  # Include the full raw data for completeness
     }
+    if names is not None:
+        kb_item.update(item_names(names, data))
     
     return kb_item
 
-def update_kb():
+def ensure_kb_schema(db):
+    """Tables describing the KB file: where each entry is, and what it was built from."""
+    # Per item: the items.hash its entry was built from, and the byte
+    # offset and length of its line in the KB file
+    db.execute("""CREATE TABLE IF NOT EXISTS kb_index
+                  (type TEXT, id INTEGER, kb_id TEXT, item_hash TEXT,
+                   offset INTEGER, length INTEGER,
+                   PRIMARY KEY(type, id))""")
+    columns = [row[1] for row in db.execute("PRAGMA table_info(kb_index)")]
+    if "item_hash" not in columns:
+        # Older index; with no hashes to match, the next build converts everything
+        db.execute("DROP TABLE kb_index")
+        return ensure_kb_schema(db)
+    db.execute("""CREATE TABLE IF NOT EXISTS kb_state
+                  (key TEXT PRIMARY KEY, value TEXT)""")
+    db.commit()
+
+def read_kb(path=KB_PATH):
+    """Yield KB entries one at a time (a legacy ``.json`` array is loaded whole)."""
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            yield from json.load(f)
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def names_fingerprint(names):
+    """Hash of every resolved name, to tell when carried-over entries would be stale."""
+    return content_hash({taxonomy: sorted(terms.items()) for taxonomy, terms in names.items()})
+
+# Taxonomy names in a conversion worker, set once by _init_worker
+_worker_names = None
+
+def _init_worker(names):
+    global _worker_names
+    _worker_names = names
+
+def _convert_row(row):
+    """Turn one kb_index-joined row into its KB id and line.
+
+    Rows are (type, id, hash, kb_id, offset, length, text, raw). Rows
+    without raw (their entry can be copied) pass through with the id and
+    line set to None.
+    """
+    item_type, item_id, text, raw_data = row[0], row[1], row[6], row[7]
+    if raw_data is None:
+        return row[:6], None, None
+    kb_item = convert_to_kb_format(item_type, item_id, raw_data, _worker_names, text)
+    return row[:6], kb_item["id"], (json.dumps(kb_item, separators=(",", ":")) + "\n").encode()
+
+def copy_range(src, dst, offset, length, chunk_size=1 << 20):
+    """Copy ``length`` bytes at ``offset`` in src to the end of dst."""
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            raise ValueError(f"KB file ended {length} bytes early")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def update_kb(db=None, kb_path=KB_PATH, workers=DEFAULT_WORKERS):
+    """Bring the KB file up to date with dme.db, streaming, and return a reader over it.
+
+    Items are read from a cursor and written to ``kb_path`` as JSON Lines
+    one at a time, so memory use doesn't grow with the site. The previous
+    KB is never loaded: ``kb_index`` in dme.db records, per item, the
+    ``items.hash`` its entry was built from and where its line sits in the
+    file. Rows whose stored hash still matches aren't even read from the
+    database beyond the hash: their lines are copied byte-for-byte from the
+    old file, in runs. Only rows whose hash differs are parsed and converted,
+    in chunks on a pool of ``workers`` processes, keeping the file's order.
+
+    ``db`` lets a caller share an open connection (it is left open);
+    otherwise dme.db is opened and closed here.
+    """
     print(f"[{dt.datetime.now()}] Starting KB update...")
     
     # Connect to the SQLite database
-    db = sqlite3.connect("dme.db")
-    cursor = db.cursor()
+    own_db = db is None
+    if own_db:
+        db = sqlite3.connect("dme.db")
+    ensure_schema(db)
+    ensure_kb_schema(db)
+    feed = ChangeFeed(db, FEED_CONSUMER)
+    # Every change up to here will be reflected in the KB we write
+    last_seq = feed.head()
+    # Every category/tag/sport/author name, read once for the whole build
+    names = load_names(db)
+    fingerprint = names_fingerprint(names)
+    state = dict(db.execute("SELECT key, value FROM kb_state"))
     
-    # Get all items from the database
-    cursor.execute("SELECT type, id, raw FROM items")
-    items = cursor.fetchall()
+    # Old lines can only be reused if the file is the one the index
+    # describes and no name or extracted text they embed has changed since
+    reuse = (os.path.exists(kb_path)
+             and state.get("size") == str(os.path.getsize(kb_path))
+             and state.get("names") == fingerprint
+             and state.get("text_version") == str(TEXT_VERSION))
+    if not reuse:
+        print("Converting every item in the database")
     
-    print(f"Found {len(items)} items in the database")
+    counts = {"new": 0, "updated": 0, "unchanged": 0}
+    counts["removed"] = db.execute("""SELECT COUNT(*) FROM kb_index k WHERE NOT EXISTS
+                                      (SELECT 1 FROM items i WHERE i.type = k.type AND i.id = k.id)""").fetchone()[0]
+    # text and raw come back NULL for rows whose entry can be copied, so
+    # unchanged rows cost a hash comparison and nothing else
+    rows = db.execute("""SELECT i.type, i.id, i.hash, k.kb_id, k.offset, k.length,
+                                CASE WHEN :reuse AND k.item_hash = i.hash THEN NULL ELSE i.text END,
+                                CASE WHEN :reuse AND k.item_hash = i.hash THEN NULL ELSE i.raw END
+                         FROM items i LEFT JOIN kb_index k ON k.type = i.type AND k.id = i.id
+                         ORDER BY i.type, i.id""", {"reuse": int(reuse)})
     
-    # Load existing KB if it exists and has content
-    kb = []
+    new_index = []
+    position = 0
+    pending = None  # [start, end) of old-file bytes still to be copied
+    tmp_path = f"{kb_path}.tmp"
+    old = open(kb_path, "rb") if reuse else None
     try:
-        if os.path.exists("master_kb.json") and os.path.getsize("master_kb.json") > 2:  # More than just '[]'
-            with open("master_kb.json", "r") as f:
-                kb = json.load(f)
-            print(f"Loaded existing KB with {len(kb)} items")
-    except Exception as e:
-        print(f"Error loading existing KB: {e}")
-        print("Starting with an empty KB")
-    
-    # Create a dictionary of existing KB items by original_id for quick lookup
-    existing_items = {f"{item['type']}-{item['original_id']}": item for item in kb if "original_id" in item}
-    
-    # Process each database item
-    new_kb = []
-    new_count = 0
-    updated_count = 0
-    unchanged_count = 0
-    
-    for item_type, item_id, raw_data in items:
-        key = f"{item_type}-{item_id}"
-        kb_item = convert_to_kb_format(item_type, item_id, raw_data)
-        
-        if key not in existing_items:
-            # New item
-            new_kb.append(kb_item)
-            new_count += 1
-        else:
-            # Existing item, check if it changed
-            existing_item = existing_items[key]
-            if existing_item.get("id") != kb_item["id"]:
-                # Item changed, use new version but preserve any additional fields
-                for field in existing_item:
-                    if field not in kb_item and field != "id":
-                        kb_item[field] = existing_item[field]
-                new_kb.append(kb_item)
-                updated_count += 1
-            else:
-                # Item unchanged, keep the existing version
-                new_kb.append(existing_item)
-                unchanged_count += 1
-    
-    # Save the updated KB
-    with open("master_kb.json", "w") as f:
-        json.dump(new_kb, f, indent=2)
+        with open(tmp_path, "wb") as out:
+            converted = ordered_map(_convert_row, rows, workers=workers,
+                                    needs_work=lambda row: row[-1] is not None,
+                                    initializer=_init_worker, initargs=(names,))
+            for (item_type, item_id, item_hash, kb_id, offset, length), new_id, line in converted:
+                if line is None:
+                    # Unchanged; extend the current run of lines to copy
+                    if pending and pending[1] == offset:
+                        pending[1] += length
+                    else:
+                        if pending:
+                            copy_range(old, out, pending[0], pending[1] - pending[0])
+                        pending = [offset, offset + length]
+                    counts["unchanged"] += 1
+                else:
+                    if pending:
+                        copy_range(old, out, pending[0], pending[1] - pending[0])
+                        pending = None
+                    out.write(line)
+                    if kb_id is None:
+                        status = "new"
+                    else:
+                        status = "unchanged" if kb_id == new_id else "updated"
+                    counts[status] += 1
+                    kb_id, length = new_id, len(line)
+                new_index.append((item_type, item_id, kb_id, item_hash, position, length))
+                position += length
+            if pending:
+                copy_range(old, out, pending[0], pending[1] - pending[0])
+    finally:
+        if old:
+            old.close()
+    os.replace(tmp_path, kb_path)
+    
+    # The index, and only then the feed cursor, move once the KB is on disk
+    with db:
+        db.execute("DELETE FROM kb_index")
+        db.executemany("INSERT INTO kb_index VALUES (?,?,?,?,?,?)", new_index)
+        db.executemany("INSERT OR REPLACE INTO kb_state VALUES (?,?)",
+                       [("size", str(position)), ("names", fingerprint),
+                        ("text_version", str(TEXT_VERSION))])
+    feed.ack(last_seq)
+    
+    # Blocks repeated across the site, for the embedding stage to strip;
+    # only looked for again when some item's text may have changed
+    bp_path = boilerplate_path(kb_path)
+    changed = not reuse or counts["new"] or counts["updated"] or counts["removed"]
+    if changed or not os.path.exists(bp_path):
+        report = find_boilerplate(text for (text,) in db.execute("SELECT text FROM items"))
+        write_boilerplate(bp_path, report)
+        print(f"Found {len(report['blocks'])} boilerplate blocks, listed in {bp_path}")
     
     print(f"KB update complete:")
-    print(f"- Total items: {len(new_kb)}")
-    print(f"- New items: {new_count}")
-    print(f"- Updated items: {updated_count}")
-    print(f"- Unchanged items: {unchanged_count}")
+    print(f"- Total items: {len(new_index)}")
+    print(f"- New items: {counts['new']}")
+    print(f"- Updated items: {counts['updated']}")
+    print(f"- Unchanged items: {counts['unchanged']}")
+    print(f"- Removed items: {counts['removed']}")
     
-    db.close()
+    if own_db:
+        db.close()
+    return read_kb(kb_path)
 
 if __name__ == "__main__":
     update_kb() 
\ No newline at end of file
@@ -11,11 +11,14 @@ from dotenv import load_dotenv
 import logging
 import time
 from datetime import datetime
-import hashlib
 from fastapi.responses import JSONResponse
 
 # Import the rate limiter
 from rate_limit import rate_limit_middleware
+from chunking import best_per_item, chunk_text, chunk_hash, embedding_input
+from content_hash import content_hash
+from embed_cache import EmbeddingCache
+from embedder import Embedder
 
 # Configure logging
 logging.basicConfig(
@@ -62,7 +65,11 @@ PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY") or os.getenv("PINECONE_API
 PINECONE_ENVIRONMENT = os.environ.get("PINECONE_ENVIRONMENT") or os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")
 PINECONE_INDEX_NAME = os.environ.get("PINECONE_INDEX_NAME") or os.getenv("PINECONE_INDEX_NAME", "dme-kb")
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL") or os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSION = 1536  # For OpenAI's text-embedding-3-small
 TOP_K = int(os.environ.get("TOP_K") or os.getenv("TOP_K", "5"))
+# Matches fetched per result wanted; pages are several chunk vectors each,
+# and only the best chunk of a page is returned
+CHUNK_OVERFETCH = 4
 VAPI_TOKEN = os.environ.get("VAPI_TOKEN") or os.getenv("VAPI_TOKEN") or os.environ.get("VAPI_SECRET_KEY") or os.getenv("VAPI_SECRET_KEY", "")
 
 # Debug: Print available key info
@@ -97,6 +104,8 @@ app.add_middleware(
 missing_keys = []
 openai_client = None
 pinecone_index = None
+# Opened on first use (see get_embedding_cache)
+embedding_cache = None
 
 if not OPENAI_API_KEY:
     missing_keys.append("OPENAI_API_KEY")
@@ -128,7 +137,7 @@ else:
                 # The error message indicates this is the only supported region for free accounts now
                 pc.create_index(
                     name=PINECONE_INDEX_NAME,
-                    dimension=1536,  # For OpenAI's text-embedding-3-small
+                    dimension=EMBEDDING_DIMENSION,
                     metric='cosine',
                     spec=pinecone.ServerlessSpec(
                         cloud='aws',
@@ -197,32 +206,40 @@ class VapiRequest(BaseModel):
     """Model representing a request from Vapi"""
     message: VapiMessage
 
+def get_embedding_cache():
+    """The embedding cache shared by queries and ingestion"""
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache()
+    return embedding_cache
+
 def get_embedding(text, model=EMBEDDING_MODEL):
-    """Get embedding for text using OpenAI API"""
+    """Get embedding for text, from the cache or the OpenAI API"""
+    logging.info(f"Getting embedding for text of length {len(text)}")
+    return get_embeddings([text], model)[0]
+
+def get_embeddings(texts, model=EMBEDDING_MODEL):
+    """Get embeddings for many texts, batched into as few OpenAI requests as possible
+
+    Texts embedded before (by this server or by embed_upsert.py sharing
+    the cache file) are served from the embedding cache.
+    """
     if not openai_client:
         raise HTTPException(status_code=503, detail="OpenAI client not initialized. Check environment variables.")
     
     start_time = time.time()
-    logging.info(f"Getting embedding for text of length {len(text)}")
-    
-    # Truncate text if it's too long
-    if len(text) > 25000:
-        text = text[:25000]
-    
+    cache = get_embedding_cache()
     try:
-        response = openai_client.embeddings.create(
-            input=text,
-            model=model
-        )
-        embedding = response.data[0].embedding
-        
-        end_time = time.time()
-        logging.info(f"Got embedding in {end_time - start_time:.2f} seconds")
-        
-        return embedding
+        embeddings = Embedder(openai_client, model, EMBEDDING_DIMENSION, cache=cache).embed(texts)
     except Exception as e:
-        logging.error(f"Error getting embedding: {e}")
-        raise HTTPException(status_code=500, detail=f"Error getting embedding: {str(e)}")
+        logging.error(f"Error getting embeddings: {e}")
+        raise HTTPException(status_code=500, detail=f"Error getting embeddings: {str(e)}")
+    if any(embedding is None for embedding in embeddings):
+        raise HTTPException(status_code=400, detail="Content was rejected by the embedding model")
+    
+    logging.info(f"Got {len(embeddings)} embeddings in {time.time() - start_time:.2f} seconds "
+                 f"(cache: {cache.hits} hits, {cache.misses} misses)")
+    return embeddings
 
 def ingest_to_pinecone(item: IngestItem):
     """Ingest an item into Pinecone"""
@@ -233,14 +250,11 @@ def ingest_to_pinecone(item: IngestItem):
     
     # Generate a stable ID
     item_dict = item.dict(exclude_none=True)
-    item_id = hashlib.md5(json.dumps(item_dict, sort_keys=True).encode()).hexdigest()
-    
-    # Get embedding
-    text_for_embedding = f"Title: {item.title}\n\nContent: {item.content}"
-    embedding = get_embedding(text_for_embedding)
+    item_id = content_hash(item_dict)
     
     # Prepare metadata
     metadata = {
+        "item_id": item_id,
         "title": item.title,
         "type": item.type,
         "url": item.url or "",
@@ -251,15 +265,20 @@ def ingest_to_pinecone(item: IngestItem):
     if item.metadata:
         metadata.update(item.metadata)
     
+    # One vector per chunk of the content, embedded together
+    chunks = chunk_text(item.content) or [""]
+    inputs = [embedding_input(item.title, chunk) for chunk in chunks]
+    vectors = []
+    for index, (chunk, text_for_embedding, embedding) in enumerate(zip(chunks, inputs, get_embeddings(inputs))):
+        vectors.append({
+            "id": f"{item_id}-{index}-{chunk_hash(text_for_embedding)}",
+            "values": embedding,
+            "metadata": {**metadata, "chunk_index": index, "text": chunk},
+        })
+    
     # Upsert to Pinecone
     try:
-        pinecone_index.upsert(
-            vectors=[{
-                "id": item_id,
-                "values": embedding,
-                "metadata": metadata
-            }]
-        )
+        pinecone_index.upsert(vectors=vectors)
         logging.info(f"Successfully ingested item {item_id}")
         return {"id": item_id, "status": "success"}
     except Exception as e:
@@ -304,7 +323,8 @@ async def health_check():
             "pinecone": "connected" if pinecone_index else "not configured",
             "openai": "connected" if openai_client else "not configured"
         },
-        "missing_env_vars": missing_keys if missing_keys else []
+        "missing_env_vars": missing_keys if missing_keys else [],
+        "embedding_cache": embedding_cache.stats() if embedding_cache else None
     }
 
 @app.get("/")
@@ -664,14 +684,14 @@ async def search_kb(
     # Search Pinecone
     search_results = pinecone_index.query(
         vector=query_embedding,
-        top_k=top_k,
+        top_k=top_k * CHUNK_OVERFETCH,
         include_metadata=True,
         filter=filter_dict if filter_dict else None
     )
     
-    # Process results
+    # Process results, one per page
     results = []
-    for match in search_results["matches"]:
+    for match in best_per_item(search_results["matches"], top_k):
         results.append({
             "id": match["id"],
             "score": match["score"],
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import threading
+import time
+from typing import Mapping, Optional
+
+class TokenBucket:
+    """Allows ``per_minute`` units a minute, refilled continuously.
+
+    ``acquire(n)`` blocks until n units are available; a request for more
+    than a full bucket waits for a full bucket, so one oversized call
+    can't stall forever.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity,
+                             self.available + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """Take ``amount`` units, waiting as needed; returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.available >= amount:
+                    self.available -= amount
+                    return waited
+                wait = (amount - self.available) * 60 / self.capacity
+            time.sleep(wait)
+            waited += wait
+
+    def update(self, limit: Optional[float] = None, remaining: Optional[float] = None):
+        """Adopt the limit and remaining headroom the server reports."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                self.available = min(self.available, float(remaining))
+
+class RatePacer:
+    """Requests-per-minute and tokens-per-minute buckets for one API.
+
+    ``acquire(tokens)`` waits for room in both before a request is sent.
+    ``observe(headers)`` adapts both to the ``x-ratelimit-*`` headers
+    OpenAI sends with each response, so the configured limits are only a
+    starting point.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.waited = 0.0
+
+    def acquire(self, tokens: int):
+        self.waited += self.requests.acquire(1) + self.tokens.acquire(tokens)
+
+    def observe(self, headers: Mapping[str, str]):
+        def number(name):
+            try:
+                return float(headers[name])
+            except (KeyError, TypeError, ValueError):
+                return None
+        self.requests.update(number("x-ratelimit-limit-requests"),
+                             number("x-ratelimit-remaining-requests"))
+        self.tokens.update(number("x-ratelimit-limit-tokens"),
+                           number("x-ratelimit-remaining-tokens"))
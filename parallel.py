@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# Worker count for CPU-bound stages; 1 keeps everything in-process
+DEFAULT_WORKERS = int(os.getenv("DME_WORKERS", "0")) or os.cpu_count() or 1
+
+def _apply_chunk(fn: Callable[[Any], Any], chunk: List[Any]) -> List[Any]:
+    return [fn(item) for item in chunk]
+
+def ordered_map(fn: Callable[[Any], Any], items: Iterable[Any], workers: int = DEFAULT_WORKERS,
+                chunk_size: int = 16, needs_work: Optional[Callable[[Any], bool]] = None,
+                initializer: Optional[Callable[..., None]] = None, initargs: tuple = ()) -> Iterator[Any]:
+    """Like ``map(fn, items)``, fanned out over a process pool.
+
+    Items are sent to workers in chunks of ``chunk_size`` and results come
+    back in input order. At most two chunks per worker are in flight, so
+    memory stays bounded however long ``items`` is, and ``items`` can be a
+    lazy stream such as a database cursor.
+
+    ``needs_work`` lets cheap items skip the pool: a chunk in which no item
+    needs work is mapped in this process. The pool itself is only started
+    for the first chunk that does, so a run with nothing to do never pays
+    for it. ``fn`` must be picklable (a module-level function), and
+    ``initializer(*initargs)`` runs once in each worker, and once here.
+    """
+    if initializer:
+        initializer(*initargs)
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+
+    items = iter(items)
+    pool = None
+    in_flight = deque()
+    try:
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                break
+            if needs_work and not any(needs_work(item) for item in chunk):
+                in_flight.append(_apply_chunk(fn, chunk))
+            else:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                               initargs=initargs)
+                in_flight.append(pool.submit(_apply_chunk, fn, chunk))
+            # Hand back whatever is finished at the head, and block once the window is full
+            while in_flight and (len(in_flight) > workers * 2 or isinstance(in_flight[0], list)
+                                 or in_flight[0].done()):
+                head = in_flight.popleft()
+                yield from (head if isinstance(head, list) else head.result())
+        while in_flight:
+            head = in_flight.popleft()
+            yield from (head if isinstance(head, list) else head.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Run sync -> KB -> embed in one process.
+
+The stages share one SQLite connection and one HTTP client, the embedding
+stage's OpenAI/Pinecone/Typesense clients are created once, and the KB
+entries kb_update produces are streamed straight into the embedding stage
+one at a time.
+
+Usage:
+    python pipeline.py [--stages sync,kb,embed] [--db dme.db]
+"""
+import argparse
+import datetime as dt
+import time
+
+STAGES = ["sync", "kb", "embed"]
+
+def run_pipeline(stages=STAGES, db_path="dme.db"):
+    """Run the given stages in order and return {stage: seconds}.
+
+    Raises:
+        RuntimeError: if the sync stage ran but didn't complete
+    """
+    # Imported here so a run without the embed stage needs no API keys or
+    # vector store packages
+    import dme_sync
+    import kb_update
+    from http_client import HttpClient
+
+    db = dme_sync.open_db(db_path)
+    timings = {}
+    kb_items = None
+    try:
+        if "sync" in stages:
+            start = time.perf_counter()
+            status, _ = dme_sync.run(db=db, http=HttpClient(max_per_host=dme_sync.MAX_CONCURRENCY))
+            timings["sync"] = time.perf_counter() - start
+            if status != "completed":
+                # Its checkpoints are kept; the next run resumes instead
+                raise RuntimeError(f"Sync run {status}, not building the KB from it")
+
+        if "kb" in stages:
+            start = time.perf_counter()
+            kb_items = kb_update.update_kb(db=db)
+            timings["kb"] = time.perf_counter() - start
+
+        if "embed" in stages:
+            import embed_upsert
+            start = time.perf_counter()
+            embed_upsert.process_kb_items(kb_items)
+            timings["embed"] = time.perf_counter() - start
+    finally:
+        # Closing checkpoints the WAL back into dme.db
+        db.close()
+
+    for stage, seconds in timings.items():
+        print(f"[{dt.datetime.now()}] {stage}: {seconds:.1f}s")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sync, KB and embedding stages in one process")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="Comma-separated stages to run, in order (default: sync,kb,embed)")
+    parser.add_argument("--db", default="dme.db", help="Path to the SQLite database")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    run_pipeline(stages, args.db)
+
+if __name__ == "__main__":
+    main()
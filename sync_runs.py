@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import datetime as dt
+import json
+import sqlite3
+import threading
+import uuid
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+# Checkpoint states for one content type within a run
+CRAWLING = "crawling"  # pages are being fetched; last_page is the last one stored
+CRAWLED = "crawled"    # every page has been seen; removals haven't run yet
+DONE = "done"          # removals have run
+# Runs (with their reports and checkpoints) kept in the database
+KEEP_RUNS = 30
+
+def ensure_schema(db: sqlite3.Connection):
+    db.execute("""CREATE TABLE IF NOT EXISTS sync_runs
+                  (run_id TEXT PRIMARY KEY, started TEXT, finished TEXT, status TEXT,
+                   report JSON)""")
+    columns = {row[1] for row in db.execute("PRAGMA table_info(sync_runs)")}
+    if "report" not in columns:
+        db.execute("ALTER TABLE sync_runs ADD COLUMN report JSON")
+    db.execute("""CREATE TABLE IF NOT EXISTS sync_checkpoints
+                  (run_id TEXT, type TEXT, last_page INTEGER, status TEXT, updated TEXT,
+                   PRIMARY KEY(run_id, type))""")
+    db.execute("""CREATE TABLE IF NOT EXISTS sync_seen
+                  (run_id TEXT, type TEXT, id INTEGER,
+                   PRIMARY KEY(run_id, type, id))""")
+    db.commit()
+
+class SyncRun:
+    """Durable progress for one dme_sync run.
+
+    Records, per content type, the last page whose records were written and
+    the ids seen so far. A run that is interrupted can then be picked up by
+    the next invocation: finished kinds are skipped, unfinished ones resume
+    after their last stored page with their seen ids intact, and removals
+    only ever run once a kind's crawl has completed.
+
+    Unfinished runs older than ``max_age`` are abandoned rather than
+    resumed, so a failure never leaves the next nightly run skipping work.
+    """
+
+    def __init__(self, db: sqlite3.Connection, lock: Optional[threading.Lock] = None,
+                 resume: bool = True, max_age: dt.timedelta = dt.timedelta(hours=12)):
+        self.db = db
+        self.lock = lock or threading.Lock()
+        now = dt.datetime.now()
+
+        with self.lock:
+            ensure_schema(db)
+            row = db.execute("""SELECT run_id, started FROM sync_runs
+                                WHERE status != 'completed' AND status != 'abandoned'
+                                ORDER BY started DESC LIMIT 1""").fetchone()
+            with db:
+                if row and resume and now - dt.datetime.fromisoformat(row[1]) < max_age:
+                    self.run_id, self.resumed = row[0], True
+                    db.execute("UPDATE sync_runs SET status='running' WHERE run_id=?",
+                               (self.run_id,))
+                else:
+                    db.execute("""UPDATE sync_runs SET status='abandoned'
+                                  WHERE status != 'completed'""")
+                    db.execute("DELETE FROM sync_seen")
+                    self.run_id, self.resumed = uuid.uuid4().hex[:12], False
+                    db.execute("INSERT INTO sync_runs VALUES (?,?,NULL,'running',NULL)",
+                               (self.run_id, now.isoformat()))
+
+    def state(self, kind: str) -> Tuple[Optional[str], int]:
+        """Checkpoint status and last stored page for a kind (``(None, 0)`` if not started)."""
+        with self.lock:
+            row = self.db.execute("""SELECT status, last_page FROM sync_checkpoints
+                                     WHERE run_id=? AND type=?""", (self.run_id, kind)).fetchone()
+        return (row[0], row[1] or 0) if row else (None, 0)
+
+    def seen(self, kind: str) -> Set[int]:
+        with self.lock:
+            return {row[0] for row in self.db.execute(
+                "SELECT id FROM sync_seen WHERE run_id=? AND type=?", (self.run_id, kind))}
+
+    def page_done(self, kind: str, page: Optional[int], ids: Iterable[int]):
+        """Record a stored page (``page=None`` just adds seen ids)."""
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR IGNORE INTO sync_seen VALUES (?,?,?)",
+                                ((self.run_id, kind, item_id) for item_id in ids))
+            if page is not None:
+                self._set(kind, CRAWLING, page)
+
+    def set_status(self, kind: str, status: str):
+        with self.lock, self.db:
+            self._set(kind, status)
+
+    def _set(self, kind: str, status: str, page: Optional[int] = None):
+        self.db.execute("""INSERT INTO sync_checkpoints VALUES (?,?,?,?,?)
+                           ON CONFLICT(run_id, type) DO UPDATE SET
+                               status=excluded.status,
+                               last_page=COALESCE(excluded.last_page, last_page),
+                               updated=excluded.updated""",
+                        (self.run_id, kind, page, status, dt.datetime.now().isoformat()))
+
+    def finish(self, kinds: Iterable[str], report: Optional[Dict[str, Any]] = None) -> str:
+        """Close the run: completed if every kind is done, failed otherwise.
+
+        ``report`` (the crawl metrics) is kept with the run, so timings can be
+        compared across runs straight from dme.db.
+        """
+        kinds = list(kinds)
+        done = [kind for kind in kinds if self.state(kind)[0] == DONE]
+        status = "completed" if len(done) == len(kinds) else "failed"
+        with self.lock, self.db:
+            self.db.execute("UPDATE sync_runs SET finished=?, status=?, report=? WHERE run_id=?",
+                            (dt.datetime.now().isoformat(), status,
+                             json.dumps(report) if report is not None else None, self.run_id))
+            if status == "completed":
+                # Seen sets are only needed to resume; don't ship them in dme.db
+                self.db.execute("DELETE FROM sync_seen WHERE run_id=?", (self.run_id,))
+        return status
+
+def prune_runs(db: sqlite3.Connection, keep: int = KEEP_RUNS) -> int:
+    """Drop all but the ``keep`` most recently started runs, with their checkpoints."""
+    with db:
+        old = [row[0] for row in db.execute(
+            "SELECT run_id FROM sync_runs ORDER BY started DESC LIMIT -1 OFFSET ?", (keep,))]
+        for table in ("sync_seen", "sync_checkpoints", "sync_runs"):
+            db.executemany(f"DELETE FROM {table} WHERE run_id=?", ((run_id,) for run_id in old))
+    return len(old)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import datetime as dt
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Lookup tables fetched by dme_sync, by taxonomy name -> REST route
+TAXONOMIES = {
+    "categories": "wp/v2/categories",
+    "tags": "wp/v2/tags",
+    "sports": "wp/v2/sports",
+    "users": "wp/v2/users",
+}
+# Only what's needed to turn an id into something readable
+TERM_FIELDS = ["id", "name", "slug", "parent"]
+
+# KB field -> (record field, taxonomy) for the names attached to each item
+NAME_FIELDS = {
+    "category_names": ("categories", "categories"),
+    "tag_names": ("tags", "tags"),
+    "sport_names": ("sports", "sports"),
+}
+
+Names = Dict[str, Dict[int, str]]
+
+def ensure_schema(db: sqlite3.Connection):
+    db.execute("""CREATE TABLE IF NOT EXISTS terms
+                  (taxonomy TEXT, id INTEGER, name TEXT, slug TEXT, parent INTEGER,
+                   hash TEXT, updated TEXT,
+                   PRIMARY KEY(taxonomy, id))""")
+    db.commit()
+
+def store_terms(db: sqlite3.Connection, taxonomy: str,
+                terms: Iterable[Tuple[int, str, Dict[str, Any]]],
+                listed: Optional[Iterable[int]] = None) -> Tuple[int, int]:
+    """Upsert (id, hash, record) terms for a taxonomy in one transaction.
+
+    Rows whose hash hasn't changed are left alone. With ``listed`` (every id
+    the API returned, including ones on unchanged pages) terms that are no
+    longer listed are deleted; an empty listing deletes nothing, since that
+    more likely means the route is missing than that every term went away.
+
+    Returns:
+        Tuple of (terms added or changed, terms deleted)
+    """
+    ensure_schema(db)
+    terms = list(terms)
+    today = dt.date.today().isoformat()
+    with db:
+        known = dict(db.execute("SELECT id, hash FROM terms WHERE taxonomy=?", (taxonomy,)))
+        changed = [(taxonomy, tid, rec.get("name", ""), rec.get("slug", ""), rec.get("parent"),
+                    hsh, today)
+                   for tid, hsh, rec in terms if known.get(tid) != hsh]
+        db.executemany("INSERT OR REPLACE INTO terms VALUES (?,?,?,?,?,?,?)", changed)
+
+        removed = []
+        listed = set(listed or ())
+        if listed:
+            removed = [tid for tid in known if tid not in listed]
+            db.executemany("DELETE FROM terms WHERE taxonomy=? AND id=?",
+                           ((taxonomy, tid) for tid in removed))
+    return len(changed), len(removed)
+
+def load_names(db: sqlite3.Connection) -> Names:
+    """Every stored term as {taxonomy: {id: name}}, read in one query."""
+    ensure_schema(db)
+    names: Names = {taxonomy: {} for taxonomy in TAXONOMIES}
+    for taxonomy, tid, name in db.execute("SELECT taxonomy, id, name FROM terms"):
+        names.setdefault(taxonomy, {})[tid] = name
+    return names
+
+def resolve(names: Names, taxonomy: str, values: Any) -> List[str]:
+    """Names for a list of term ids.
+
+    The events API already embeds terms as objects, so those keep their own
+    name; ids we have no name for are skipped.
+    """
+    if not isinstance(values, list):
+        return []
+    lookup = names.get(taxonomy, {})
+    resolved = []
+    for value in values:
+        if isinstance(value, dict):
+            name = value.get("name")
+        else:
+            name = lookup.get(value)
+        if name:
+            resolved.append(name)
+    return resolved
+
+def item_names(names: Names, record: Dict[str, Any]) -> Dict[str, Any]:
+    """The readable taxonomy and author fields for one WordPress record."""
+    fields = {field: resolve(names, taxonomy, record.get(key))
+              for field, (key, taxonomy) in NAME_FIELDS.items()}
+    author = record.get("author")
+    fields["author"] = names.get("users", {}).get(author, "") if isinstance(author, int) else ""
+    return fields
+
+def term_ids(values: Any) -> List[int]:
+    """Ids for a list of terms, whether given as ids or as the events API's objects."""
+    if not isinstance(values, list):
+        return []
+    ids = []
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get("id")
+        if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+            ids.append(int(value))
+    return ids
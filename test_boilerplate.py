@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+from boilerplate import (find_boilerplate, fingerprint, load_boilerplate, strip_boilerplate,
+                         write_boilerplate)
+
+FOOTER = "## Contact Us\nCall 941-555-0100 to schedule a visit.\n- Apply Now"
+
+def page(n):
+    return f"# Program {n}\nWhat makes program {n} different.\n{FOOTER}"
+
+class BoilerplateTest(unittest.TestCase):
+    """Tests for site-wide boilerplate detection"""
+
+    def test_blocks_repeated_across_items_are_found(self):
+        texts = [page(n) for n in range(8)] + ["# About\nOur story."] * 2
+        report = find_boilerplate(texts, share=0.5, min_items=3)
+
+        self.assertEqual(report["items"], 10)
+        self.assertEqual({block["text"] for block in report["blocks"]},
+                         {"## Contact Us", "Call 941-555-0100 to schedule a visit.", "- Apply Now"})
+        self.assertEqual(report["blocks"][0]["items"], 8)
+
+    def test_small_corpus_needs_min_items(self):
+        report = find_boilerplate([page(1), page(2)], share=0.1, min_items=5)
+        self.assertEqual(report["blocks"], [])
+
+    def test_markers_and_case_are_ignored(self):
+        self.assertEqual(fingerprint("- Apply  Now"), fingerprint("## apply now"))
+        self.assertIsNone(fingerprint("  "))
+
+    def test_strip_drops_blocks_and_headings_left_empty(self):
+        fps = {fingerprint("Call 941-555-0100 to schedule a visit."), fingerprint("Apply Now")}
+        text = page(1) + "\n## Schedule\n### Mornings\nIce at 7am."
+        self.assertEqual(strip_boilerplate(text, fps),
+                         "# Program 1\nWhat makes program 1 different.\n"
+                         "## Schedule\n### Mornings\nIce at 7am.")
+        self.assertEqual(strip_boilerplate("Nothing shared", fps), "Nothing shared")
+
+    def test_report_round_trips(self):
+        report = find_boilerplate([page(n) for n in range(5)], share=0.5, min_items=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "kb.boilerplate.json")
+            self.assertEqual(load_boilerplate(path), set())
+            write_boilerplate(path, report)
+            self.assertEqual(load_boilerplate(path),
+                             {block["fingerprint"] for block in report["blocks"]})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import unittest
+
+from chunking import best_per_item, chunk_item, chunk_text, count_tokens
+
+def paragraphs(start, stop):
+    return [f"Paragraph {i} covers skating drills and off-ice conditioning." for i in range(start, stop)]
+
+class ChunkTextTest(unittest.TestCase):
+    """Tests for token-bounded, heading-aware chunking"""
+
+    def test_chunks_stay_under_the_limit_and_overlap(self):
+        text = "\n".join(["## Hockey"] + paragraphs(0, 30))
+        chunks = chunk_text(text, max_tokens=80, overlap=20)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(count_tokens(chunk) <= 80 for chunk in chunks))
+        for before, after in zip(chunks, chunks[1:]):
+            # Continuations repeat the heading and the previous chunk's last line
+            self.assertTrue(after.startswith("## Hockey\n"))
+            self.assertIn(before.splitlines()[-1], after)
+
+    def test_headings_start_a_chunk_once_the_current_one_is_substantial(self):
+        text = "\n".join(["# Camps", "Short intro.", "## Dates", "June and July."]
+                         + ["## Hockey"] + paragraphs(0, 6) + ["## Golf", "Range sessions."])
+        chunks = chunk_text(text, max_tokens=200, overlap=0)
+
+        # The small opening sections are kept together; Golf starts fresh
+        self.assertTrue(chunks[0].startswith("# Camps\nShort intro.\n## Dates"))
+        self.assertEqual(chunks[-1], "## Golf\nRange sessions.")
+
+    def test_long_lines_are_cut(self):
+        chunks = chunk_text("word " * 500, max_tokens=100, overlap=10)
+        self.assertTrue(all(count_tokens(chunk) <= 100 for chunk in chunks))
+        self.assertGreaterEqual(len(chunks), 5)
+
+class ChunkItemTest(unittest.TestCase):
+    """Tests for chunk ids"""
+
+    item = {"id": "abc", "type": "pages", "original_id": 12, "title": "Hockey"}
+
+    def test_editing_one_paragraph_keeps_the_other_ids(self):
+        lines = paragraphs(0, 30)
+        before = chunk_item(self.item, "\n".join(lines), max_tokens=80, overlap=0)
+        lines[-1] = "An edited closing paragraph."
+        after = chunk_item(self.item, "\n".join(lines), max_tokens=80, overlap=0)
+
+        self.assertEqual([c["id"] for c in before[:-1]], [c["id"] for c in after[:-1]])
+        self.assertNotEqual(before[-1]["id"], after[-1]["id"])
+        self.assertTrue(after[0]["id"].startswith("pages-12-0-"))
+        self.assertTrue(after[0]["input"].startswith("Title: Hockey\n\n"))
+
+    def test_empty_text_still_gets_one_chunk(self):
+        chunks = chunk_item(self.item, "")
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["text"], "")
+
+class BestPerItemTest(unittest.TestCase):
+    """Tests for collapsing chunk matches to one per item"""
+
+    def test_keeps_the_best_chunk_of_each_item(self):
+        matches = [{"id": "posts-1-0-a", "score": 0.9, "metadata": {"item_id": "A"}},
+                   {"id": "posts-1-2-b", "score": 0.8, "metadata": {"item_id": "A"}},
+                   {"id": "abc-0-ff", "score": 0.7, "metadata": {}},
+                   {"id": "pages-2-0-c", "score": 0.6, "metadata": {"item_id": "B"}},
+                   {"id": "pages-3-0-d", "score": 0.5, "metadata": {"item_id": "C"}}]
+        self.assertEqual([m["id"] for m in best_per_item(matches, 3)],
+                         ["posts-1-0-a", "abc-0-ff", "pages-2-0-c"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import unittest
+
+from content_hash import HASH_LENGTH, canonical, content_hash, normalize_html
+
+class ContentHashTest(unittest.TestCase):
+    """Tests for canonical, volatile-field-aware content hashing"""
+
+    def test_html_noise_is_normalized_away(self):
+        before = ('<p>Camp  starts\n soon</p>\n<img src="a.jpg" srcset="a-300.jpg 300w" sizes="100vw">'
+                  '<script nonce="abc123">var s = {"nonce":"f00"};</script>'
+                  '<link href="/style.css?ver=6.4.1">')
+        after = ('<p>Camp starts soon</p><img src="a.jpg" srcset="a-1024.jpg 1024w">'
+                 '<script nonce="zzz999">var s = {"nonce":"b4r"};</script>'
+                 '<link href="/style.css?ver=6.5">')
+        self.assertEqual(normalize_html(before), normalize_html(after))
+        self.assertNotEqual(normalize_html('<img src="a.jpg">'), normalize_html('<img src="b.jpg">'))
+
+    def test_only_counted_fields_affect_the_hash(self):
+        post = {"id": 1, "title": {"rendered": "Camp"}, "content": {"rendered": "<p>x</p>"},
+                "modified_gmt": "2024-01-01T00:00:00"}
+        touched = dict(post, modified_gmt="2024-02-01T00:00:00")
+        edited = dict(post, content={"rendered": "<p>y</p>"})
+        self.assertEqual(content_hash(post, "posts"), content_hash(touched, "posts"))
+        self.assertNotEqual(content_hash(post, "posts"), content_hash(edited, "posts"))
+        self.assertEqual(len(content_hash(post, "posts")), HASH_LENGTH)
+
+    def test_event_pricing_counts(self):
+        event = {"id": 5, "title": "Showcase", "extracted_pricing": ["costs $500"]}
+        repriced = dict(event, extracted_pricing=["costs $600"])
+        self.assertNotEqual(content_hash(event, "events"), content_hash(repriced, "events"))
+
+    def test_untyped_records_skip_volatile_fields_and_key_order(self):
+        a = {"title": "x", "url": "u", "_links": {"self": 1}}
+        b = {"url": "u", "title": "x", "_links": {"self": 2}}
+        self.assertEqual(canonical(a), canonical(b))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import json
+import os
+import tempfile
+import unittest
+
+from crawl_metrics import CrawlMetrics, route_of
+
+class CrawlMetricsTest(unittest.TestCase):
+    """Tests for the crawl run report"""
+
+    def setUp(self):
+        self.metrics = CrawlMetrics(run_id="abc")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_routes_group_api_and_site_urls(self):
+        self.assertEqual(route_of("https://x.com/wp-json/wp/v2/posts?page=3"), "wp/v2/posts")
+        self.assertEqual(route_of("https://x.com/wp-json/tribe/events/v1/events/42"),
+                         "tribe/events/v1/events/{id}")
+        self.assertEqual(route_of("https://x.com/event/summer-camp/"), "/event/")
+
+    def test_report_aggregates_requests_and_item_counts(self):
+        self.metrics.observe_request("https://x.com/wp-json/wp/v2/posts?page=1", 200, 0.5, 1000)
+        self.metrics.observe_request("https://x.com/wp-json/wp/v2/posts?page=2", 304, 0.1, 0)
+        self.metrics.kind_started("posts")
+        self.metrics.count("posts", "new", 2)
+        self.metrics.count("posts", "unchanged", 8)
+        self.metrics.count("posts", "removed")
+        self.metrics.kind_finished("posts")
+
+        report = self.metrics.report()
+        posts = report["routes"]["wp/v2/posts"]
+        self.assertEqual(posts["requests"], 2)
+        self.assertEqual(posts["bytes"], 1000)
+        self.assertEqual(posts["statuses"], {"200": 1, "304": 1})
+        self.assertEqual(posts["max_seconds"], 0.5)
+        kind = report["kinds"]["posts"]
+        self.assertEqual((kind["new"], kind["updated"], kind["unchanged"], kind["removed"]),
+                         (2, 0, 8, 1))
+        self.assertEqual(kind["records"], 10)
+        self.assertEqual(report["slowest"][0]["seconds"], 0.5)
+
+    def test_writes_json_and_prometheus_files(self):
+        self.metrics.observe_request("https://x.com/wp-json/wp/v2/pages?page=1", 200, 0.2, 10)
+        self.metrics.count("pages", "updated", 3)
+
+        path = os.path.join(self.tmp.name, "out", "report.json")
+        self.metrics.write_json(path)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(report["run_id"], "abc")
+        self.assertEqual(len(report["all_requests"]), 1)
+
+        prom = os.path.join(self.tmp.name, "dme_sync.prom")
+        self.metrics.write_prometheus(prom)
+        with open(prom) as f:
+            text = f.read()
+        self.assertIn('dme_sync_items{kind="pages",outcome="updated"} 3', text)
+        self.assertIn('dme_sync_requests{route="wp/v2/pages"} 1', text)
+        self.assertFalse(os.path.exists(prom + ".tmp"))
+
+if __name__ == "__main__":
+    unittest.main()
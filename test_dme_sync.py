@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import dme_sync
+from sync_runs import DONE, SyncRun
+
+class FakeResponse:
+    def __init__(self, url, status=200, body=None, headers=None, text=None):
+        self.url = url
+        self.status_code = status
+        self.ok = status < 400
+        self.headers = headers or {}
+        self.text = text if text is not None else json.dumps(body)
+        self.content = self.text.encode()
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"status {self.status_code}")
+
+class FakeWordPress:
+    """Posts behind the WordPress REST API, with ETags and modified_after.
+
+    ``delay`` maps page numbers to seconds to hold their response for, and
+    ``fail`` maps a URL fragment to the status to answer it with.
+    """
+
+    def __init__(self, posts):
+        self.posts = {post["id"]: post for post in posts}
+        self.requests = []
+        self.delay = {}
+        self.fail = {}
+        self.observers = []
+        self.lock = threading.Lock()
+
+    def stats(self):
+        return {}
+
+    def get(self, url, headers=None, timeout=15):
+        headers = headers or {}
+        with self.lock:
+            self.requests.append((url, headers))
+        for fragment, status in self.fail.items():
+            if fragment in url:
+                return FakeResponse(url, status, {"code": "rest_invalid_param"})
+        query = {key: values[0] for key, values in parse_qs(urlparse(url).query).items()}
+        posts = sorted(self.posts.values(), key=lambda post: post["id"])
+        if "modified_after" in query:
+            posts = [post for post in posts if post["modified_gmt"] > query["modified_after"]]
+        if "include" in query:
+            wanted = {int(i) for i in query["include"].split(",")}
+            posts = [post for post in posts if post["id"] in wanted]
+        fields = query.get("_fields", "").split(",")
+        per_page, page = int(query["per_page"]), int(query.get("page", 1))
+        pages = max(1, -(-len(posts) // per_page))
+        if page > pages:
+            return FakeResponse(url, 400, {"code": "rest_post_invalid_page_number"})
+        body = [{k: v for k, v in post.items() if k in fields or fields == [""]}
+                for post in posts[(page - 1) * per_page:page * per_page]]
+        etag = f'"{hash(json.dumps(body))}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(url, 304, headers={"ETag": etag})
+        time.sleep(self.delay.get(page, 0))
+        return FakeResponse(url, 200, body, {"X-WP-TotalPages": str(pages), "ETag": etag})
+
+class FakeEvents:
+    """One page of the events API, plus each event's own page with its price."""
+
+    def __init__(self, prices):
+        self.prices = prices  # event id -> price shown on its page
+        self.observers = []
+
+    def stats(self):
+        return {}
+
+    def get(self, url, headers=None, timeout=15):
+        headers = headers or {}
+        if "tribe/events" in url:
+            body = {"events": [{"id": event_id, "title": f"Camp {event_id}",
+                                "url": f"https://x/event/{event_id}/"} for event_id in self.prices],
+                    "total_pages": 1}
+            etag = '"listing"'
+        else:
+            event_id = int(url.rstrip("/").rsplit("/", 1)[1])
+            body = f"<p>3-Week | Boarder: ${self.prices[event_id]}</p>"
+            etag = f'"{event_id}-{self.prices[event_id]}"'
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(url, 304, headers={"ETag": etag}, text="")
+        if isinstance(body, str):
+            return FakeResponse(url, 200, headers={"ETag": etag}, text=body)
+        return FakeResponse(url, 200, body, {"ETag": etag})
+
+def post(post_id, modified="2026-10-01T00:00:00", **extra):
+    return dict({"id": post_id, "title": {"rendered": f"Post {post_id}"},
+                 "content": {"rendered": f"<p>Body {post_id}</p>"},
+                 "modified_gmt": modified, "status": "publish"}, **extra)
+
+class DmeSyncTest(unittest.TestCase):
+    """Tests for the crawl: pagination, incremental mode, removals and pricing"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.db = dme_sync.open_db(os.path.join(tmp.name, "dme.db"))
+        self.addCleanup(self.db.close)
+        self.wp = FakeWordPress([post(i) for i in range(1, 6)])
+        for patch in (mock.patch.object(dme_sync, "PER_PAGE", 2),
+                      mock.patch.object(dme_sync, "SINKS", [])):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.setup_sync()
+
+    def setup_sync(self):
+        dme_sync.setup(self.db, http=self.wp)
+        self.addCleanup(dme_sync.FETCH_POOL.shutdown)
+        self.addCleanup(dme_sync.PRICING_POOL.shutdown)
+
+    def sync_posts(self, incremental=False):
+        self.wp.requests = []
+        run = SyncRun(self.db, dme_sync.DB_LOCK)
+        with mock.patch.object(dme_sync, "INCREMENTAL", incremental):
+            removed = dme_sync.sync_one("posts", "wp/v2/posts", run)
+        status = run.state("posts")[0]
+        run.finish(["posts"])
+        return status, removed
+
+    def stored(self):
+        return dict(self.db.execute("SELECT id, hash FROM items WHERE type='posts'"))
+
+    def test_pages_are_fetched_concurrently_but_yielded_in_order(self):
+        self.wp.delay = {2: 0.2}
+        pages = [page for page, _ in dme_sync.crawl("wp/v2/posts")]
+        self.assertEqual(pages, [1, 2, 3])
+        # Page 3 was requested without waiting for the slow page 2
+        requested = [parse_qs(urlparse(url).query)["page"][0] for url, _ in self.wp.requests]
+        self.assertEqual(requested[0], "1")
+        self.assertEqual(sorted(requested[1:]), ["2", "3"])
+
+    def test_records_are_projected_before_hashing(self):
+        self.wp.posts[1]["yoast_head"] = "<meta>"
+        self.wp.posts[1]["_links"] = {"self": []}
+        status, _ = self.sync_posts()
+        self.assertIn("_fields=" + ",".join(dme_sync.FIELDS["wp/v2/posts"]), self.wp.requests[0][0])
+
+        raw = dme_sync.WRITER.hashes[("posts", 1)]
+        projected = dme_sync.project(self.wp.posts[1], "wp/v2/posts")
+        self.assertNotIn("yoast_head", projected)
+        self.assertEqual(raw, dme_sync.digest(projected, "posts"))
+        self.assertEqual(status, DONE)
+
+    def test_rejected_first_page_is_not_the_end_of_the_listing(self):
+        self.sync_posts()
+        self.wp.fail = {"page=1": 400}
+        status, removed = self.sync_posts()
+        self.assertEqual(removed, [])
+        self.assertNotEqual(status, DONE)
+        self.assertEqual(len(self.stored()), 5)
+        with self.assertRaises(dme_sync.FetchError):
+            dme_sync.grab_page(f"{dme_sync.BASE}/wp/v2/posts?per_page=2&page=1")
+
+    def test_incremental_run_lists_ids_and_reuses_unchanged_pages(self):
+        self.sync_posts(incremental=True)
+        self.assertEqual(dme_sync.high_water("posts"), "2026-10-01T00:00:00")
+
+        # Second run: nothing modified, id listing fetched and remembered
+        self.sync_posts(incremental=True)
+        self.assertEqual(len(self.stored()), 5)
+
+        # Third run: every id page is a 304, and its cached ids count as seen
+        self.wp.posts[2]["modified_gmt"] = "2026-10-03T00:00:00"
+        self.wp.posts[2]["title"] = {"rendered": "Edited"}
+        _, removed = self.sync_posts(incremental=True)
+        id_requests = [headers for url, headers in self.wp.requests if "_fields=id&" in url]
+        self.assertTrue(id_requests and all("If-None-Match" in h for h in id_requests))
+        self.assertEqual(removed, [])
+        self.assertEqual(len(self.stored()), 5)
+        self.assertEqual(dme_sync.high_water("posts"), "2026-10-03T00:00:00")
+        self.assertEqual(self.db.execute(
+            "SELECT title FROM items WHERE type='posts' AND id=2").fetchone()[0], "Edited")
+
+    def test_incremental_removals_come_from_the_id_listing(self):
+        self.sync_posts(incremental=True)
+        del self.wp.posts[4]
+        _, removed = self.sync_posts(incremental=True)
+        self.assertEqual(removed, [4])
+        self.assertEqual(sorted(self.stored()), [1, 2, 3, 5])
+
+    def test_high_water_mark_is_only_saved_once_the_kind_is_done(self):
+        self.sync_posts(incremental=True)
+        self.wp.posts[3]["modified_gmt"] = "2026-10-05T00:00:00"
+        self.wp.fail = {"_fields=id&": 500}
+        status, removed = self.sync_posts(incremental=True)
+        self.assertEqual(removed, [])
+        self.assertNotEqual(status, DONE)
+        self.assertEqual(dme_sync.high_water("posts"), "2026-10-01T00:00:00")
+        self.assertEqual(len(self.stored()), 5)
+
+    def test_terms_of_pages_before_a_failure_are_kept(self):
+        with mock.patch.object(dme_sync, "TAXONOMIES", {"categories": "wp/v2/categories"}):
+            self.wp.fail = {"&page=3": 500}
+            dme_sync.sync_terms()
+            self.wp.fail = {}
+            dme_sync.sync_terms()
+        terms = [row[0] for row in self.db.execute(
+            "SELECT id FROM terms WHERE taxonomy='categories' ORDER BY id")]
+        self.assertEqual(terms, [1, 2, 3, 4, 5])
+
+    def test_failed_run_is_reported_as_failed(self):
+        self.wp.fail = {"wp/v2/pages": 500}
+        messages = []
+        with mock.patch.object(dme_sync, "SINKS", [messages.append]), \
+             mock.patch.object(dme_sync, "REPORT_PATH", os.path.join(self.tmp, "report.json")):
+            status, removed = dme_sync.run(self.db, http=self.wp)
+        self.assertEqual(status, "failed")
+        self.assertEqual(removed["pages"], [])
+        self.assertNotIn("[INFO] All syncs completed successfully", messages)
+
+    def test_event_pricing_is_reused_for_unchanged_pages(self):
+        html = "<p>3-Week | Boarder: $4,500</p>"
+        responses = [FakeResponse("u", 200, headers={"ETag": '"a"'}, text=html),
+                     FakeResponse("u", 304, headers={"ETag": '"a"'}, text=""),
+                     FakeResponse("u", 200, headers={"ETag": '"b"'}, text=html)]
+        with mock.patch.object(self.wp, "get", side_effect=responses) as get:
+            self.assertEqual(dme_sync.extract_event_pricing("https://x/event/a/"),
+                             ["3-Week | Boarder: $4,500"])
+            with mock.patch.object(dme_sync, "BeautifulSoup") as soup:
+                # 304, then a new ETag with the same body: neither is parsed
+                self.assertEqual(dme_sync.extract_event_pricing("https://x/event/a/"),
+                                 ["3-Week | Boarder: $4,500"])
+                self.assertEqual(dme_sync.extract_event_pricing("https://x/event/a/"),
+                                 ["3-Week | Boarder: $4,500"])
+                soup.assert_not_called()
+        self.assertEqual(get.call_args_list[1].kwargs["headers"], {"If-None-Match": '"a"'})
+        etag = self.db.execute("SELECT etag FROM event_pricing").fetchone()[0]
+        self.assertEqual(etag, '"b"')
+
+    def test_pricing_changes_are_found_behind_an_unchanged_listing(self):
+        events = FakeEvents({1: "4,500", 2: "3,000"})
+        dme_sync.setup(self.db, http=events)
+        self.addCleanup(dme_sync.FETCH_POOL.shutdown)
+        self.addCleanup(dme_sync.PRICING_POOL.shutdown)
+
+        def sync_events():
+            run = SyncRun(self.db, dme_sync.DB_LOCK)
+            with mock.patch.object(dme_sync, "INCREMENTAL", True):
+                dme_sync.sync_events(run)
+            run.finish(["events"])
+
+        def pricing(event_id):
+            raw = self.db.execute("SELECT raw FROM items WHERE type='events' AND id=?",
+                                  (event_id,)).fetchone()[0]
+            return dme_sync.load_raw(raw)["extracted_pricing"]
+
+        sync_events()
+        self.assertEqual(pricing(1), ["3-Week | Boarder: $4,500"])
+        events.prices[1] = "6,000"
+        sync_events()
+        self.assertEqual(pricing(1), ["3-Week | Boarder: $6,000"])
+        self.assertEqual(pricing(2), ["3-Week | Boarder: $3,000"])
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM items WHERE type='events'").fetchone()[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from embed_cache import EmbeddingCache
+from embedder import Embedder
+
+def fake_create(input, model):
+    return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(text)), 0.5])
+                                 for i, text in enumerate(input)])
+
+class EmbeddingCacheTest(unittest.TestCase):
+    """Tests for the persistent embedding cache"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "cache.db")
+        self.cache = EmbeddingCache(self.path, max_entries=10)
+        self.addCleanup(self.cache.close)
+
+    def test_vectors_are_keyed_by_model_dims_and_text(self):
+        self.cache.put_many("m", 2, ["a", "b"], [[1.0, 2.0], None])
+        self.assertEqual(self.cache.get_many("m", 2, ["a", "b"]), [[1.0, 2.0], None])
+        self.assertEqual(self.cache.get_many("other", 2, ["a"]), [None])
+        self.assertEqual(self.cache.get_many("m", 3, ["a"]), [None])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+
+    def test_cache_survives_reopening(self):
+        self.cache.put_many("m", 2, ["a"], [[1.0, 2.0]])
+        reopened = EmbeddingCache(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get_many("m", 2, ["a"]), [[1.0, 2.0]])
+        self.assertEqual(reopened.stats()["entries"], 1)
+
+    def test_least_recently_used_are_evicted(self):
+        with mock.patch("embed_cache.time.time", side_effect=range(100)):
+            for i in range(10):
+                self.cache.put_many("m", 1, [f"t{i}"], [[float(i)]])
+            self.cache.get_many("m", 1, ["t0"])  # keeps t0 fresh
+            self.cache.put_many("m", 1, ["new"], [[1.0]])
+
+        self.assertEqual(self.cache.stats()["entries"], 9)
+        self.assertEqual(self.cache.get_many("m", 1, ["t0", "t1", "t2", "new"]),
+                         [[0.0], None, None, [1.0]])
+
+    def test_embedder_only_sends_texts_it_has_not_seen(self):
+        client = mock.Mock()
+        client.embeddings.create.side_effect = fake_create
+        embedder = Embedder(client, "m", 2, cache=self.cache)
+
+        first = embedder.embed(["a", "bb"])
+        second = embedder.embed(["bb", "ccc", "a"])
+
+        self.assertEqual(second, [first[1], [3.0, 0.5], first[0]])
+        self.assertEqual([call.kwargs["input"] for call in client.embeddings.create.call_args_list],
+                         [["a", "bb"], ["ccc"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import openai
+
+from embedder import Embedder
+
+def fake_create(input, model):
+    if any("reject" in text for text in input):
+        request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+        raise openai.BadRequestError("rejected", response=httpx.Response(400, request=request), body=None)
+    # Served out of order, as the API is free to do
+    data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+    return SimpleNamespace(data=list(reversed(data)))
+
+class EmbedderTest(unittest.TestCase):
+    """Tests for batched embedding requests"""
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.embeddings.create.side_effect = fake_create
+
+    def test_texts_are_packed_into_few_requests_in_order(self):
+        texts = [f"text {'x' * i}" for i in range(10)]
+        vectors = Embedder(self.client, "m", max_inputs=4).embed(texts)
+
+        self.assertEqual(vectors, [[float(len(text))] for text in texts])
+        self.assertEqual(self.client.embeddings.create.call_count, 3)
+
+    def test_token_limit_starts_a_new_request(self):
+        embedder = Embedder(self.client, "m", max_tokens=10)
+        batches = list(embedder.batches(["one two three four five six"] * 3))
+        self.assertEqual([len(batch) for batch in batches], [1, 1, 1])
+
+    def test_rejected_input_is_isolated(self):
+        texts = ["a", "b", "please reject", "d"]
+        with mock.patch("builtins.print"):
+            vectors = Embedder(self.client, "m").embed(texts)
+
+        self.assertEqual(vectors, [[1.0], [1.0], None, [1.0]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import mock
+
+import requests
+
+from http_client import FetchError, HttpClient
+
+def make_response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = b"{}"
+    return response
+
+class HttpClientTest(unittest.TestCase):
+    """Tests for retry, backoff and counters in the crawler HTTP client"""
+
+    def setUp(self):
+        self.client = HttpClient(max_per_host=2, max_retries=3, backoff_base=0.01)
+        sleep = mock.patch("http_client.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_retries_transient_errors_then_succeeds(self):
+        responses = [make_response(503), make_response(502), make_response(200)]
+        with mock.patch.object(self.client.session, "get", side_effect=responses) as get:
+            response = self.client.get("https://example.com/a")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get.call_count, 3)
+        stats = self.client.stats()["example.com"]
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_honors_retry_after(self):
+        responses = [make_response(429, {"Retry-After": "7"}), make_response(200)]
+        with mock.patch.object(self.client.session, "get", side_effect=responses):
+            self.client.get("https://example.com/a")
+
+        waits = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertIn(7.0, waits)
+
+    def test_raises_fetch_error_when_retries_run_out(self):
+        with mock.patch.object(self.client.session, "get", return_value=make_response(500)):
+            with self.assertRaises(FetchError) as ctx:
+                self.client.get("https://example.com/a")
+
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertEqual(self.client.stats()["example.com"]["failures"], 1)
+
+    def test_connection_errors_are_retried(self):
+        side_effect = [requests.ConnectionError("reset"), make_response(200)]
+        with mock.patch.object(self.client.session, "get", side_effect=side_effect):
+            self.assertEqual(self.client.get("https://example.com/a").status_code, 200)
+
+    def test_client_errors_are_returned_not_retried(self):
+        with mock.patch.object(self.client.session, "get", return_value=make_response(400)) as get:
+            response = self.client.get("https://example.com/a?page=9")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get.call_count, 1)
+
+    def test_observers_see_every_attempt(self):
+        seen = []
+        self.client.observers.append(lambda *args: seen.append(args))
+        responses = [make_response(503), make_response(200)]
+        with mock.patch.object(self.client.session, "get", side_effect=responses):
+            self.client.get("https://example.com/a")
+
+        self.assertEqual([(url, status, nbytes) for url, status, _, nbytes in seen],
+                         [("https://example.com/a", 503, 2), ("https://example.com/a", 200, 2)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import embed_upsert
+from embed_cache import EmbeddingCache
+from index_manifest import IndexManifest, delete_stale, reconcile, vector_hash
+
+class FakeIndex:
+    """The parts of a Pinecone index the manifest uses, in memory"""
+
+    def __init__(self):
+        self.vectors = {}
+        self.upserted = []
+        self.deleted = []
+
+    def upsert(self, vectors):
+        self.upserted += [v["id"] for v in vectors]
+        self.vectors.update((v["id"], v) for v in vectors)
+
+    def delete(self, ids):
+        self.deleted += ids
+        for vector_id in ids:
+            self.vectors.pop(vector_id, None)
+
+    def list(self):
+        ids = sorted(self.vectors)
+        for i in range(0, len(ids), 2):
+            yield ids[i:i + 2]
+
+    def fetch(self, ids):
+        # Numbers come back as floats, as they do from Pinecone
+        return SimpleNamespace(vectors={
+            vector_id: SimpleNamespace(metadata={k: float(v) if isinstance(v, int) else v
+                                                 for k, v in self.vectors[vector_id]["metadata"].items()})
+            for vector_id in ids})
+
+    def describe_index_stats(self):
+        return SimpleNamespace(total_vector_count=len(self.vectors))
+
+def fake_create(input, model):
+    return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0, 0.0]) for i in range(len(input))])
+
+def kb_item(item_id, text):
+    return {"id": f"kb{item_id}", "original_id": item_id, "type": "posts",
+            "title": f"Post {item_id}", "text": text}
+
+class IndexManifestTest(unittest.TestCase):
+    """Tests for delta upserts and deletes against the index manifest"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.manifest = IndexManifest("dme-kb", os.path.join(tmp.name, "manifest.db"))
+        self.index = FakeIndex()
+        client = mock.Mock()
+        client.embeddings.with_raw_response.create.side_effect = lambda **kwargs: SimpleNamespace(
+            headers={}, parse=lambda: fake_create(**kwargs))
+        clients = {"openai": client, "typesense": None, "manifest": self.manifest,
+                   "embed_cache": EmbeddingCache(os.path.join(tmp.name, "cache.db"))}
+        for patch in (mock.patch.dict(embed_upsert._clients, clients),
+                      mock.patch.object(embed_upsert, "ensure_pinecone_index", return_value=self.index),
+                      mock.patch.object(embed_upsert.time, "sleep")):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_embed(self, items):
+        self.index.upserted = []
+        with redirect_stdout(StringIO()):
+            embed_upsert.process_kb_items(items, boilerplate=set())
+
+    def test_only_changes_are_upserted_and_removals_deleted(self):
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two"), kb_item(3, "three")])
+        self.assertEqual(len(self.index.upserted), 3)
+
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two, edited")])
+        self.assertEqual(len(self.index.upserted), 1)
+        self.assertTrue(self.index.upserted[0].startswith("posts-2-0-"))
+        # Post 3 is gone, and so is post 2's old chunk
+        self.assertEqual(len(self.index.deleted), 2)
+        self.assertEqual(set(self.manifest.hashes()), set(self.index.vectors))
+
+    def test_missing_manifest_is_rebuilt_from_the_index(self):
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two"), kb_item(3, "three")])
+        self.manifest.clear()
+
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two"), kb_item(3, "three")])
+        self.assertEqual(self.index.upserted, [])
+
+    def test_reconcile_and_delete_stale(self):
+        metadata = {"type": "posts", "original_id": 4, "title": "t", "text": "x"}
+        a, b, c = "posts-4-0-aa", "posts-4-1-bb", "posts-4-2-cc"
+        self.index.upsert([{"id": a, "metadata": metadata}, {"id": b, "metadata": metadata},
+                           {"id": c, "metadata": metadata}])
+
+        self.assertEqual(reconcile(self.index, self.manifest), 3)
+        self.assertEqual(self.manifest.hashes()[a], vector_hash(metadata))
+        self.assertEqual(delete_stale(self.index, self.manifest, {b}), 2)
+        self.assertEqual(set(self.index.vectors), {b})
+        self.assertEqual(len(self.manifest), 1)
+
+    def test_vectors_from_other_writers_are_left_alone(self):
+        # As main.py /ingest writes them: <content hash>-<chunk index>-<hash>
+        ingested = {"id": "abc123-0-ff", "metadata": {"item_id": "abc123", "type": "posts",
+                                                     "title": "Ingested", "text": "x"}}
+        self.index.upsert([ingested])
+
+        self.run_embed([kb_item(1, "one")])
+        self.assertIn("abc123-0-ff", self.index.vectors)
+        self.assertNotIn("abc123-0-ff", self.manifest.hashes())
+
+        # Even if an older manifest recorded it
+        self.manifest.record([ingested])
+        self.run_embed([kb_item(1, "one")])
+        self.assertIn("abc123-0-ff", self.index.vectors)
+
+    def test_whole_page_vectors_from_before_chunking_are_deleted_once(self):
+        legacy_kb = {"id": "0" * 31 + "a", "metadata": {"original_id": 1, "type": "posts",
+                                                      "title": "Post 1", "url": "", "date": ""}}
+        legacy_ingest = {"id": "0" * 31 + "b", "metadata": {"type": "posts", "title": "Ingested",
+                                                          "url": "", "date": ""}}
+        self.index.upsert([legacy_kb, legacy_ingest])
+
+        self.run_embed([kb_item(1, "one")])
+        self.assertNotIn(legacy_kb["id"], self.index.vectors)
+        self.assertIn(legacy_ingest["id"], self.index.vectors)
+        self.assertIsNotNone(self.manifest.get_state("legacy_purged"))
+
+        # Only looked for once
+        with mock.patch.object(self.index, "fetch") as fetch:
+            self.run_embed([kb_item(1, "one")])
+        fetch.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
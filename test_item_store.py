@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import json
+import sqlite3
+import unittest
+
+from content_hash import content_hash
+from item_store import ChangeFeed, ItemWriter, configure, ensure_schema, load_raw, text_version
+from text_extract import TEXT_VERSION
+
+class ItemWriterTest(unittest.TestCase):
+    """Tests for the batched items table writer"""
+
+    def setUp(self):
+        self.db = configure(sqlite3.connect(":memory:"))
+        ensure_schema(self.db)
+        self.db.execute("INSERT INTO items (type, id, hash, raw) VALUES ('posts', 1, 'h1', '{}')")
+        self.db.execute("INSERT INTO items (type, id, hash, raw) VALUES ('posts', 2, 'h2', '{}')")
+        self.db.commit()
+
+    def test_classifies_new_updated_and_unchanged(self):
+        writer = ItemWriter(self.db)
+        page = [
+            (1, "h1", {"id": 1}),         # unchanged
+            (2, "h2-new", {"id": 2}),     # updated
+            (3, "h3", {"id": 3}),         # new
+        ]
+        new, updated = writer.write_page("posts", page)
+
+        self.assertEqual([rec["id"] for rec in new], [3])
+        self.assertEqual([rec["id"] for rec in updated], [2])
+
+        rows = dict(self.db.execute("SELECT id, hash FROM items WHERE type='posts'"))
+        self.assertEqual(rows, {1: "h1", 2: "h2-new", 3: "h3"})
+        raw = self.db.execute("SELECT raw FROM items WHERE id=3").fetchone()[0]
+        self.assertIsInstance(raw, bytes)
+        self.assertEqual(load_raw(raw), {"id": 3})
+
+    def test_second_write_of_same_page_is_a_no_op(self):
+        writer = ItemWriter(self.db)
+        page = [(3, "h3", {"id": 3})]
+        writer.write_page("posts", page)
+        self.assertEqual(writer.write_page("posts", page), ([], []))
+
+    def test_kinds_are_tracked_separately(self):
+        writer = ItemWriter(self.db)
+        new, _ = writer.write_page("pages", [(1, "h1", {"id": 1})])
+        self.assertEqual(len(new), 1)
+
+    def test_failed_page_is_rolled_back(self):
+        writer = ItemWriter(self.db)
+        # A non-serializable record fails mid-page; nothing should be written
+        page = [(4, "h4", {"id": 4}), (5, "h5", {"id": object()})]
+        with self.assertRaises(TypeError):
+            writer.write_page("posts", page)
+        count = self.db.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        self.assertEqual(count, 2)
+        self.assertNotIn(("posts", 4), writer.hashes)
+
+    def test_remove_missing_deletes_unseen_ids_of_one_kind(self):
+        self.db.execute("INSERT INTO items (type, id, hash, raw) VALUES ('pages', 9, 'h9', '{}')")
+        self.db.commit()
+        writer = ItemWriter(self.db)
+
+        removed = writer.remove_missing("posts", {2, 42})
+
+        self.assertEqual(removed, [1])
+        remaining = sorted(self.db.execute("SELECT type, id FROM items"))
+        self.assertEqual(remaining, [("pages", 9), ("posts", 2)])
+        self.assertNotIn(("posts", 1), writer.hashes)
+
+    def test_remove_missing_with_everything_seen(self):
+        writer = ItemWriter(self.db)
+        self.assertEqual(writer.remove_missing("posts", [1, 2]), [])
+        self.assertEqual(writer.remove_missing("posts", [1, 2]), [])
+
+    def test_extracted_columns_are_written(self):
+        writer = ItemWriter(self.db)
+        rec = {"id": 7, "title": {"rendered": "Camp &amp; Clinic"},
+               "content": {"rendered": "<p>Spring <b>camp</b></p>"},
+               "link": "https://dmeacademy.com/camp/", "date": "2024-03-01T00:00:00",
+               "modified_gmt": "2024-03-02T00:00:00"}
+        writer.write_page("posts", [(7, "h7", rec)])
+
+        row = self.db.execute("""SELECT title, date, modified, link, text
+                                 FROM items WHERE id=7""").fetchone()
+        self.assertEqual(row, ("Camp &amp; Clinic", "2024-03-01T00:00:00",
+                               "2024-03-02T00:00:00", "https://dmeacademy.com/camp/",
+                               "Spring camp"))
+
+class ChangeFeedTest(unittest.TestCase):
+    """Tests for the change feed written alongside the items table"""
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        ensure_schema(self.db)
+        self.writer = ItemWriter(self.db, run_id="run-1")
+
+    def test_writes_and_removals_are_logged(self):
+        self.writer.write_page("posts", [(1, "a", {"id": 1}), (2, "b", {"id": 2})])
+        self.writer.write_page("posts", [(1, "a2", {"id": 1})])
+        self.writer.remove_missing("posts", {1})
+
+        rows = self.db.execute("SELECT run_id, type, id, op, new_hash FROM changes ORDER BY seq").fetchall()
+        self.assertEqual(rows, [
+            ("run-1", "posts", 1, "insert", "a"),
+            ("run-1", "posts", 2, "insert", "b"),
+            ("run-1", "posts", 1, "update", "a2"),
+            ("run-1", "posts", 2, "delete", None),
+        ])
+
+    def test_consumer_sees_net_changes_until_it_acks(self):
+        feed = ChangeFeed(self.db, "kb")
+        self.assertIsNone(feed.cursor)
+        self.writer.write_page("posts", [(1, "a", {"id": 1})])
+        self.writer.write_page("posts", [(1, "a2", {"id": 1})])
+
+        changes, last_seq = feed.latest()
+        self.assertEqual(changes, {("posts", 1): ("update", "a2")})
+        self.assertEqual(feed.latest(), (changes, last_seq))
+
+        feed.ack(last_seq)
+        self.assertEqual(feed.cursor, last_seq)
+        self.assertEqual(feed.latest(), ({}, None))
+
+        self.writer.remove_missing("posts", set())
+        self.assertEqual(feed.latest()[0], {("posts", 1): ("delete", None)})
+        # Other consumers keep their own position
+        self.assertEqual(len(ChangeFeed(self.db, "embed").pending()), 3)
+
+class MigrationTest(unittest.TestCase):
+    """Tests for converting a legacy items table to the compact layout"""
+
+    def test_legacy_rows_are_compressed_and_columns_filled(self):
+        db = sqlite3.connect(":memory:")
+        db.execute("""CREATE TABLE items
+                      (type TEXT, id INTEGER, hash TEXT,
+                       raw JSON, updated TEXT,
+                       PRIMARY KEY(type,id))""")
+        rec = {"id": 1, "title": "Showcase", "url": "https://dmeacademy.com/event/1/",
+               "description": "<p>Saturday</p>", "modified_utc": "2024-05-01 10:00:00"}
+        db.execute("INSERT INTO items VALUES ('events', 1, 'h', ?, '2024-01-01')",
+                   (json.dumps(rec),))
+        db.commit()
+
+        self.assertEqual(ensure_schema(db), 1)
+        self.assertEqual(ensure_schema(db), 0)
+
+        raw, title, link, modified, text = db.execute(
+            "SELECT raw, title, link, modified, text FROM items").fetchone()
+        self.assertEqual(load_raw(raw), rec)
+        self.assertEqual((title, link, modified, text),
+                         ("Showcase", "https://dmeacademy.com/event/1/",
+                          "2024-05-01 10:00:00", "Saturday"))
+
+    def test_legacy_hashes_are_recomputed_without_logging_changes(self):
+        db = sqlite3.connect(":memory:")
+        ensure_schema(db)
+        rec = {"id": 1, "title": {"rendered": "Camp"}, "content": {"rendered": "<p>x</p>"}}
+        db.execute("INSERT INTO items (type, id, hash, raw) VALUES ('posts', 1, ?, ?)",
+                   ("0" * 64, json.dumps(rec)))
+        db.commit()
+
+        ensure_schema(db)
+        self.assertEqual(db.execute("SELECT hash FROM items").fetchone()[0],
+                         content_hash(rec, "posts"))
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM changes").fetchone()[0], 0)
+
+    def test_text_from_an_older_extractor_is_redone_once(self):
+        db = sqlite3.connect(":memory:")
+        ensure_schema(db)
+        rec = {"id": 1, "title": {"rendered": "Camp"},
+               "content": {"rendered": "<h2>Dates</h2><ul><li>June</li></ul>"}}
+        db.execute("INSERT INTO items (type, id, hash, raw, text) VALUES ('posts', 1, ?, ?, 'Dates June')",
+                   (content_hash(rec, "posts"), json.dumps(rec)))
+        db.execute("UPDATE item_meta SET value='0' WHERE key='text_version'")
+        db.commit()
+
+        ensure_schema(db)
+        self.assertEqual(db.execute("SELECT text FROM items").fetchone()[0], "## Dates\n- June")
+        self.assertEqual(text_version(db), TEXT_VERSION)
+
+if __name__ == "__main__":
+    unittest.main()
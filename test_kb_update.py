@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from content_hash import content_hash
+from item_store import ItemWriter, ensure_schema
+import kb_update
+from kb_update import read_kb, update_kb
+from taxonomy import store_terms
+
+def post(item_id, body="text"):
+    rec = {"id": item_id, "title": {"rendered": f"Post {item_id}"},
+           "content": {"rendered": f"<p>{body}</p>"}, "categories": [1]}
+    return item_id, content_hash(rec, "posts"), rec
+
+class UpdateKbTest(unittest.TestCase):
+    """Tests for the streaming KB build"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.kb_path = os.path.join(tmp.name, "kb.jsonl")
+        self.db = sqlite3.connect(":memory:")
+        ensure_schema(self.db)
+        store_terms(self.db, "categories", [(1, "h", {"id": 1, "name": "Hockey"})])
+        self.writer = ItemWriter(self.db)
+        self.writer.write_page("posts", [post(1), post(2), post(3)])
+
+    def build(self):
+        with redirect_stdout(StringIO()):
+            return list(update_kb(self.db, self.kb_path, workers=1))
+
+    def lines(self):
+        with open(self.kb_path, "rb") as f:
+            return f.read().splitlines()
+
+    def test_full_build_writes_one_line_per_item(self):
+        items = self.build()
+        self.assertEqual([item["original_id"] for item in items], [1, 2, 3])
+        self.assertEqual(items[0]["category_names"], ["Hockey"])
+        self.assertNotIn("raw", items[0])
+        self.assertEqual(items[0]["text"], "text")
+        self.assertEqual(len(self.lines()), 3)
+        self.assertTrue(os.path.exists(os.path.join(os.path.dirname(self.kb_path),
+                                                    "kb.boilerplate.json")))
+
+    def test_delta_build_copies_untouched_lines_and_applies_changes(self):
+        self.build()
+        before = self.lines()
+
+        self.writer.write_page("posts", [post(2, "edited"), post(4)])
+        self.writer.remove_missing("posts", {2, 3, 4})
+        items = self.build()
+
+        self.assertEqual([item["original_id"] for item in items], [2, 3, 4])
+        self.assertEqual(items[0]["content"], "<p>edited</p>")
+        # Post 3 was carried over byte-for-byte
+        self.assertEqual(self.lines()[1], before[2])
+        self.assertEqual(list(read_kb(self.kb_path)), items)
+
+    def test_only_rows_with_a_new_hash_are_converted(self):
+        self.build()
+        self.writer.write_page("posts", [post(3, "edited")])
+
+        convert = mock.Mock(wraps=kb_update.convert_to_kb_format)
+        with mock.patch.object(kb_update, "convert_to_kb_format", convert):
+            items = self.build()
+        self.assertEqual([call.args[1] for call in convert.call_args_list], [3])
+        self.assertEqual(items[2]["content"], "<p>edited</p>")
+
+        with mock.patch.object(kb_update, "convert_to_kb_format", convert):
+            self.build()
+        self.assertEqual(convert.call_count, 1)
+
+    def test_mismatched_file_is_rebuilt(self):
+        self.build()
+        with open(self.kb_path, "ab") as f:
+            f.write(b"garbage\n")
+        items = self.build()
+        self.assertEqual(len(items), 3)
+
+    def test_process_pool_writes_the_same_file(self):
+        self.build()
+        serial = self.lines()
+        os.remove(self.kb_path)
+        with redirect_stdout(StringIO()):
+            list(update_kb(self.db, self.kb_path, workers=2))
+        self.assertEqual(self.lines(), serial)
+
+    def test_renamed_terms_force_a_full_rebuild(self):
+        self.build()
+        store_terms(self.db, "categories", [(1, "h2", {"id": 1, "name": "Ice Hockey"})])
+        items = self.build()
+        self.assertEqual({tuple(item["category_names"]) for item in items}, {("Ice Hockey",)})
+
+    def test_new_text_version_forces_a_full_rebuild(self):
+        self.build()
+        self.db.execute("UPDATE items SET text = 'redone' WHERE id = 2")
+        self.db.execute("UPDATE kb_state SET value = '0' WHERE key = 'text_version'")
+        items = self.build()
+        self.assertEqual(items[1]["text"], "redone")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from embedder import Embedder
+from pacing import RatePacer, TokenBucket
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TokenBucketTest(unittest.TestCase):
+    """Tests for requests/tokens per minute pacing"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for name in ("monotonic", "sleep"):
+            patch = mock.patch(f"pacing.time.{name}", getattr(self.clock, name))
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_bucket_waits_for_refill(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(bucket.acquire(60), 0)
+        self.assertAlmostEqual(bucket.acquire(30), 30.0)
+        self.assertAlmostEqual(self.clock.now, 30.0)
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        bucket = TokenBucket(per_minute=10)
+        bucket.acquire(10)
+        self.assertAlmostEqual(bucket.acquire(1000), 60.0)
+
+    def test_headers_adjust_the_limits(self):
+        pacer = RatePacer(requests_per_minute=100, tokens_per_minute=1000)
+        pacer.observe({"x-ratelimit-limit-tokens": "600", "x-ratelimit-remaining-tokens": "0",
+                       "x-ratelimit-remaining-requests": "junk"})
+        self.assertEqual(pacer.tokens.capacity, 600)
+        pacer.acquire(300)
+        # 300 tokens at 600/min, after the server said none were left
+        self.assertAlmostEqual(pacer.waited, 30.0)
+
+    def test_embedder_paces_each_request(self):
+        client = mock.Mock()
+        client.embeddings.with_raw_response.create.side_effect = lambda input, model: SimpleNamespace(
+            headers={"x-ratelimit-limit-requests": "1"},
+            parse=lambda: SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[0.0])
+                                                for i in range(len(input))]))
+        pacer = RatePacer(requests_per_minute=100, tokens_per_minute=10_000)
+        embedder = Embedder(client, "m", pacer=pacer, max_inputs=1)
+
+        self.assertEqual(embedder.embed(["a", "b", "c"]), [[0.0]] * 3)
+        # After the first response, one request a minute: the second goes
+        # straight away, the third waits for the bucket to refill
+        self.assertAlmostEqual(self.clock.now, 60.0)
+
+if __name__ == "__main__":
+    unittest.main()
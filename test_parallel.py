@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+import unittest
+from unittest import mock
+
+import parallel
+from parallel import ordered_map
+
+def square(n):
+    return n * n
+
+class OrderedMapTest(unittest.TestCase):
+    """Tests for the order-preserving process pool map"""
+
+    def test_results_keep_input_order(self):
+        for workers in (1, 3):
+            self.assertEqual(list(ordered_map(square, iter(range(100)), workers=workers, chunk_size=7)),
+                             [n * n for n in range(100)])
+
+    def test_chunks_without_work_never_start_the_pool(self):
+        with mock.patch.object(parallel, "ProcessPoolExecutor") as pool:
+            results = list(ordered_map(square, range(10), workers=4, chunk_size=3,
+                                       needs_work=lambda n: False))
+        self.assertEqual(results, [n * n for n in range(10)])
+        pool.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import dme_sync
+import embed_upsert
+import kb_update
+from pipeline import run_pipeline
+
+class PipelineTest(unittest.TestCase):
+    """Tests for running the stages in one process"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = os.path.join(tmp.name, "dme.db")
+
+    def test_stages_share_the_connection_and_hand_items_over_in_memory(self):
+        items = [{"id": "a", "original_id": 1, "type": "posts"}]
+        with mock.patch.object(dme_sync, "run", return_value=("completed", {})) as sync, \
+             mock.patch.object(kb_update, "update_kb", return_value=items) as kb, \
+             mock.patch.object(embed_upsert, "process_kb_items") as embed:
+            timings = run_pipeline(db_path=self.db_path)
+
+        db = sync.call_args.kwargs["db"]
+        self.assertIsInstance(db, sqlite3.Connection)
+        self.assertIs(kb.call_args.kwargs["db"], db)
+        embed.assert_called_once_with(items)
+        self.assertEqual(list(timings), ["sync", "kb", "embed"])
+
+    def test_failed_sync_stops_the_pipeline(self):
+        with mock.patch.object(dme_sync, "run", return_value=("failed", {})), \
+             mock.patch.object(kb_update, "update_kb") as kb:
+            with self.assertRaises(RuntimeError):
+                run_pipeline(db_path=self.db_path)
+        kb.assert_not_called()
+
+    def test_embed_alone_reads_the_kb_file(self):
+        with mock.patch.object(embed_upsert, "process_kb_items") as embed:
+            run_pipeline(["embed"], db_path=self.db_path)
+        embed.assert_called_once_with(None)
+
+if __name__ == "__main__":
+    unittest.main()
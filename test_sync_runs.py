@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import datetime as dt
+import json
+import sqlite3
+import unittest
+
+from sync_runs import CRAWLED, DONE, SyncRun, prune_runs
+
+class SyncRunTest(unittest.TestCase):
+    """Tests for resumable sync checkpoints"""
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+
+    def test_new_run_has_no_progress(self):
+        run = SyncRun(self.db)
+        self.assertFalse(run.resumed)
+        self.assertEqual(run.state("posts"), (None, 0))
+        self.assertEqual(run.seen("posts"), set())
+
+    def test_interrupted_run_is_resumed_with_its_progress(self):
+        first = SyncRun(self.db)
+        first.page_done("posts", 1, [1, 2])
+        first.page_done("posts", 2, [3])
+        first.page_done("pages", 1, [9])
+        first.set_status("pages", CRAWLED)
+        first.set_status("pages", DONE)
+        self.assertEqual(first.finish(["posts", "pages"]), "failed")
+
+        second = SyncRun(self.db)
+        self.assertTrue(second.resumed)
+        self.assertEqual(second.run_id, first.run_id)
+        self.assertEqual(second.state("posts"), ("crawling", 2))
+        self.assertEqual(second.seen("posts"), {1, 2, 3})
+        self.assertEqual(second.state("pages"), (DONE, 1))
+
+    def test_completed_run_is_not_resumed_and_drops_seen_ids(self):
+        first = SyncRun(self.db)
+        first.page_done("posts", 1, [1])
+        first.set_status("posts", DONE)
+        self.assertEqual(first.finish(["posts"], report={"wall_seconds": 1.5}), "completed")
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM sync_seen").fetchone()[0], 0)
+        report = self.db.execute("SELECT report FROM sync_runs").fetchone()[0]
+        self.assertEqual(json.loads(report), {"wall_seconds": 1.5})
+
+        second = SyncRun(self.db)
+        self.assertFalse(second.resumed)
+        self.assertNotEqual(second.run_id, first.run_id)
+
+    def test_stale_or_disabled_resume_starts_fresh(self):
+        first = SyncRun(self.db)
+        first.page_done("posts", 3, [1])
+
+        fresh = SyncRun(self.db, resume=False)
+        self.assertFalse(fresh.resumed)
+        self.assertEqual(fresh.state("posts"), (None, 0))
+
+        self.db.execute("UPDATE sync_runs SET started=?",
+                        ((dt.datetime.now() - dt.timedelta(days=2)).isoformat(),))
+        self.assertFalse(SyncRun(self.db).resumed)
+        status = dict(self.db.execute("SELECT run_id, status FROM sync_runs"))
+        self.assertEqual(status[first.run_id], "abandoned")
+
+    def test_prune_keeps_the_latest_runs(self):
+        runs = []
+        for day in range(4):
+            run = SyncRun(self.db)
+            run.page_done("posts", 1, [day])
+            run.set_status("posts", DONE)
+            run.finish(["posts"], report={"day": day})
+            self.db.execute("UPDATE sync_runs SET started=? WHERE run_id=?",
+                            (f"2026-10-0{day + 1}T00:00:00", run.run_id))
+            runs.append(run.run_id)
+
+        self.assertEqual(prune_runs(self.db, keep=2), 2)
+        self.assertEqual({row[0] for row in self.db.execute("SELECT run_id FROM sync_runs")},
+                         set(runs[2:]))
+        self.assertEqual({row[0] for row in self.db.execute("SELECT run_id FROM sync_checkpoints")},
+                         set(runs[2:]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import sqlite3
+import unittest
+
+from taxonomy import item_names, load_names, store_terms
+
+def term(tid, name, hsh=None):
+    return tid, hsh or f"h-{name}", {"id": tid, "name": name, "slug": name.lower()}
+
+class TaxonomyTest(unittest.TestCase):
+    """Tests for the taxonomy/author lookup tables"""
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+
+    def test_store_skips_unchanged_and_drops_unlisted_terms(self):
+        self.assertEqual(store_terms(self.db, "categories", [term(1, "Hockey"), term(2, "News")],
+                                     listed=[1, 2]), (2, 0))
+        # 1 unchanged, 2 renamed, 3 gone from the listing
+        store_terms(self.db, "categories", [term(3, "Old")])
+        changed = store_terms(self.db, "categories", [term(1, "Hockey"), term(2, "Updates")],
+                              listed=[1, 2])
+        self.assertEqual(changed, (1, 1))
+        self.assertEqual(load_names(self.db)["categories"], {1: "Hockey", 2: "Updates"})
+
+    def test_empty_listing_keeps_stored_terms(self):
+        store_terms(self.db, "sports", [term(5, "Soccer")], listed=[5])
+        self.assertEqual(store_terms(self.db, "sports", [], listed=[]), (0, 0))
+        self.assertEqual(load_names(self.db)["sports"], {5: "Soccer"})
+
+    def test_item_names_resolve_ids_and_embedded_terms(self):
+        store_terms(self.db, "categories", [term(1, "Hockey")])
+        store_terms(self.db, "users", [term(7, "Coach")])
+        names = load_names(self.db)
+
+        post = item_names(names, {"categories": [1, 99], "author": 7, "tags": []})
+        self.assertEqual(post["category_names"], ["Hockey"])
+        self.assertEqual(post["author"], "Coach")
+        self.assertEqual(post["sport_names"], [])
+
+        event = item_names(names, {"categories": [{"id": 4, "name": "Camps"}]})
+        self.assertEqual(event["category_names"], ["Camps"])
+        self.assertEqual(event["author"], "")
+
+if __name__ == "__main__":
+    unittest.main()
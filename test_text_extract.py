@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import unittest
+
+from text_extract import extract_text
+
+class ExtractTextTest(unittest.TestCase):
+    """Tests for structured text extraction from rendered HTML"""
+
+    def test_headings_and_paragraphs_are_separate_lines(self):
+        html = "<h2>Boarding</h2><p>Students live on&nbsp;campus.</p><p>Meals &amp; laundry</p>"
+        self.assertEqual(extract_text(html),
+                         "## Boarding\nStudents live on campus.\nMeals & laundry")
+
+    def test_lists_keep_their_markers_and_nesting(self):
+        html = "<ul><li>Hockey<ol><li>AM ice</li><li>PM gym</li></ol></li><li>Golf</li></ul>"
+        self.assertEqual(extract_text(html),
+                         "- Hockey\n  1. AM ice\n  2. PM gym\n- Golf")
+
+    def test_table_rows_join_cells(self):
+        html = ("<table><tr><th>Plan</th><th>Price</th></tr>"
+                "<tr><td>Day</td><td>$1,000</td></tr></table>")
+        self.assertEqual(extract_text(html), "Plan | Price\nDay | $1,000")
+
+    def test_blocks_inside_cells_stay_on_the_row(self):
+        html = ("<table><tr><td><p>Price</p></td><td><p>$100</p><br/><div>per week</div></td></tr>"
+                "<tr><td><ul><li>Meals</li><li>Laundry</li></ul></td><td>Included</td></tr></table>")
+        self.assertEqual(extract_text(html), "Price | $100 per week\nMeals Laundry | Included")
+
+    def test_scripts_styles_and_shortcodes_are_dropped(self):
+        html = ('[et_pb_section fb_built="1"]<style>.a{color:red}</style>'
+                '<p>Visible</p><script>var nonce = "x";</script>[/et_pb_section]')
+        self.assertEqual(extract_text(html), "Visible")
+
+    def test_empty_input(self):
+        self.assertEqual(extract_text(None), "")
+        self.assertEqual(extract_text(""), "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import embed_upsert
+from embed_cache import EmbeddingCache
+from embedder import Embedder
+from index_manifest import IndexManifest
+from test_index_manifest import FakeIndex, fake_create, kb_item
+
+# Python types of the Typesense field types the KB schema uses
+FIELD_TYPES = {"string": str, "int32": int, "float": (int, float)}
+
+def field_error(field, document):
+    """Why Typesense would reject a document's value for a schema field, if it would."""
+    if field["name"] not in document:
+        return None if field.get("optional") or field["name"] == "id" else f"{field['name']} missing"
+    value, kind = document[field["name"]], field["type"]
+    if kind.endswith("[]"):
+        if isinstance(value, list) and all(isinstance(v, FIELD_TYPES[kind[:-2]]) for v in value):
+            return None
+    elif isinstance(value, FIELD_TYPES[kind]):
+        return None
+    return f"{field['name']} must be {kind}, got {value!r}"
+
+class FakeTypesense:
+    """Collections, documents and aliases of a Typesense server, in memory.
+
+    Imports are checked against the collection's schema; ``failing`` makes
+    every import fail.
+    """
+
+    def __init__(self):
+        self.data = {}  # collection name -> {doc id: doc}
+        self.schemas = {}
+        self.alias_map = {}
+        self.imports = []
+        self.failing = False
+        typesense = self
+
+        class Collections:
+            create = staticmethod(self.create)
+            retrieve = staticmethod(self.list_collections)
+
+            def __getitem__(self, name):
+                return typesense.collection(name)
+
+        class Aliases:
+            def upsert(self, name, mapping):
+                typesense.alias_map[name] = mapping["collection_name"]
+
+            def __getitem__(self, name):
+                return SimpleNamespace(retrieve=lambda: typesense.alias(name))
+
+        self.collections = Collections()
+        self.aliases = Aliases()
+
+    def create(self, schema):
+        self.data[schema["name"]] = {}
+        self.schemas[schema["name"]] = schema.get("fields", [])
+
+    def list_collections(self):
+        return [{"name": name} for name in self.data]
+
+    def alias(self, name):
+        if name not in self.alias_map:
+            raise KeyError(name)
+        return {"name": name, "collection_name": self.alias_map[name]}
+
+    def collection(self, name):
+        name = self.alias_map.get(name, name)
+        docs = self.data[name] if name in self.data else None
+
+        def import_(documents, params):
+            self.imports.append((name, len(documents), params["action"]))
+            results = []
+            for doc in documents:
+                errors = [error for error in (field_error(f, doc) for f in self.schemas[name]) if error]
+                if self.failing:
+                    errors.append("server error")
+                if not errors:
+                    docs[doc["id"]] = doc
+                results.append({"success": not errors, "error": "; ".join(errors)} if errors
+                               else {"success": True})
+            return results
+
+        def delete_docs(params):
+            ids = params["filter_by"][len("id:["):-1].replace("`", "").split(",")
+            for doc_id in ids:
+                docs.pop(doc_id, None)
+
+        def delete():
+            if name not in self.data:
+                raise KeyError(name)
+            del self.data[name]
+
+        return SimpleNamespace(delete=delete,
+                               documents=SimpleNamespace(import_=import_, delete=delete_docs))
+
+    def live(self):
+        return self.data[self.alias_map["dme-kb"]]
+
+class TypesenseReindexTest(unittest.TestCase):
+    """Tests for the blue/green Typesense reindex and incremental mode"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.typesense = FakeTypesense()
+        client = mock.Mock()
+        client.embeddings.with_raw_response.create.side_effect = lambda **kwargs: SimpleNamespace(
+            headers={}, parse=lambda: fake_create(**kwargs))
+        clients = {"openai": client, "typesense": self.typesense,
+                   "manifest": IndexManifest("dme-kb", os.path.join(tmp.name, "manifest.db")),
+                   "embed_cache": EmbeddingCache(os.path.join(tmp.name, "cache.db"))}
+        for patch in (mock.patch.dict(embed_upsert._clients, clients),
+                      mock.patch.object(embed_upsert, "ensure_pinecone_index", return_value=FakeIndex()),
+                      mock.patch.object(embed_upsert, "TYPESENSE_COLLECTION", "dme-kb")):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_embed(self, items, mode="reindex", when="20261016030000"):
+        with mock.patch.object(embed_upsert, "datetime") as clock, redirect_stdout(StringIO()):
+            clock.now.return_value.strftime.return_value = when
+            embed_upsert.process_kb_items(items, boilerplate=set(), typesense_mode=mode)
+
+    def test_reindex_swaps_the_alias_and_drops_the_old_collection(self):
+        # A collection from before aliases
+        self.typesense.create({"name": "dme-kb"})
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two")], when="1")
+        self.assertEqual(self.typesense.alias_map["dme-kb"], "dme-kb_1")
+        self.assertEqual(set(self.typesense.data), {"dme-kb_1"})
+
+        self.run_embed([kb_item(1, "one")], when="2")
+        self.assertEqual(set(self.typesense.data), {"dme-kb_2"})
+        self.assertEqual(len(self.typesense.live()), 1)
+        self.assertTrue(all(action == "upsert" for _, _, action in self.typesense.imports))
+
+    def test_failed_import_keeps_the_live_collection(self):
+        self.run_embed([kb_item(1, "one")], when="1")
+        self.typesense.failing = True
+        self.run_embed([kb_item(1, "one, edited")], when="2")
+        self.assertEqual(self.typesense.alias_map["dme-kb"], "dme-kb_1")
+        self.assertEqual(set(self.typesense.data), {"dme-kb_1"})
+
+    def test_incremental_only_touches_changes(self):
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two"), kb_item(3, "three")], when="1")
+        self.typesense.imports = []
+
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two, edited")], mode="incremental")
+        self.assertEqual(self.typesense.imports, [("dme-kb_1", 1, "upsert")])
+        self.assertEqual(sorted(doc["original_id"] for doc in self.typesense.live().values()), [1, 2])
+
+    def test_event_terms_are_imported_as_ids(self):
+        event = dict(kb_item(1, "camp"), type="events",
+                     categories=[{"id": 3, "name": "Camps", "slug": "camps"}], sports=[5])
+        self.run_embed([event], when="1")
+        self.assertEqual(self.typesense.alias_map["dme-kb"], "dme-kb_1")
+        doc, = self.typesense.live().values()
+        self.assertEqual((doc["categories"], doc["sports"]), ([3], [5]))
+
+    def test_chunks_not_embedded_keep_the_live_collection(self):
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two")], when="1")
+        embed = Embedder.embed
+
+        def reject_two(embedder, texts):
+            return [None if "two" in text else vector for text, vector in zip(texts, embed(embedder, texts))]
+
+        with mock.patch.object(Embedder, "embed", reject_two):
+            self.run_embed([kb_item(1, "one"), kb_item(2, "two, edited")], when="2")
+        self.assertEqual(self.typesense.alias_map["dme-kb"], "dme-kb_1")
+        self.assertEqual(set(self.typesense.data), {"dme-kb_1"})
+
+    def test_incremental_failures_are_retried(self):
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two")], when="1")
+        self.typesense.failing = True
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two, edited")], mode="incremental")
+
+        self.typesense.failing = False
+        self.typesense.imports = []
+        self.run_embed([kb_item(1, "one"), kb_item(2, "two, edited")], mode="incremental")
+        self.assertEqual(self.typesense.imports, [("dme-kb_1", 1, "upsert")])
+        texts = sorted(doc["clean_content"] for doc in self.typesense.live().values())
+        self.assertEqual(texts, ["one", "two, edited"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import re
+from html.parser import HTMLParser
+
+# Bump when extract_text's output changes, so stored text gets re-extracted
+TEXT_VERSION = 2
+
+# Elements whose content is never visible text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "object",
+             "head", "title", "canvas", "map"}
+# Elements that start a new line of text
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "header", "footer", "aside", "nav",
+              "blockquote", "pre", "figure", "figcaption", "form", "fieldset", "address",
+              "dl", "dt", "dd", "ul", "ol", "table", "thead", "tbody", "tfoot", "caption",
+              "details", "summary", "hr", "br"}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+# Page-builder and plugin shortcodes left in rendered content, e.g.
+# [et_pb_section fb_built="1"] ... [/et_pb_section]; the text between stays
+SHORTCODE_RE = re.compile(
+    r"\[/?(?:et_pb_|vc_|fusion_|av_|su_|elementor|caption|gallery|embed|audio|video|"
+    r"contact-form|wpforms|rev_slider|smartslider|tribe_)[^\[\]]*\]", re.I)
+INLINE_SPACE_RE = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text as lines, marking headings, list items and table rows."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.current = []
+        self.prefix = ""  # heading/list marker for the current line
+        self.skip = 0
+        self.lists = []  # per open list: next number for <ol>, None for <ul>
+        self.cells = None  # cells of the table row being read
+
+    def newline(self):
+        line = INLINE_SPACE_RE.sub(" ", "".join(self.current)).strip()
+        if line:
+            self.lines.append(self.prefix + line)
+        self.current = []
+        self.prefix = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif self.skip:
+            return
+        elif self.in_cell(tag):
+            self.current.append(" ")
+        elif tag in HEADINGS:
+            self.newline()
+            self.prefix = "#" * HEADINGS[tag] + " "
+        elif tag in ("ul", "ol"):
+            self.newline()
+            self.lists.append(1 if tag == "ol" else None)
+        elif tag == "li":
+            self.newline()
+            indent = "  " * max(0, len(self.lists) - 1)
+            if self.lists and self.lists[-1] is not None:
+                self.prefix = f"{indent}{self.lists[-1]}. "
+                self.lists[-1] += 1
+            else:
+                self.prefix = f"{indent}- "
+        elif tag == "tr":
+            self.newline()
+            self.cells = []
+        elif tag in ("td", "th"):
+            if self.cells is not None:
+                self.newline_cell()
+        elif tag in BLOCK_TAGS:
+            self.newline()
+
+    def in_cell(self, tag):
+        """Whether tag would break a line inside a table row, where it only separates words."""
+        return self.cells is not None and tag not in ("tr", "td", "th") and (
+            tag in BLOCK_TAGS or tag in HEADINGS or tag == "li")
+
+    def newline_cell(self):
+        """Close the cell being read, if any, onto the current row."""
+        cell = INLINE_SPACE_RE.sub(" ", "".join(self.current)).strip()
+        if self.current or cell:
+            self.cells.append(cell)
+        self.current = []
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif self.skip:
+            return
+        elif self.in_cell(tag):
+            self.current.append(" ")
+        elif tag in ("ul", "ol"):
+            self.newline()
+            if self.lists:
+                self.lists.pop()
+        elif tag in ("td", "th"):
+            if self.cells is not None:
+                self.newline_cell()
+        elif tag == "tr":
+            if self.cells is not None:
+                if self.current:
+                    self.newline_cell()
+                row = " | ".join(self.cells).strip(" |")
+                if row:
+                    self.lines.append(row)
+                self.cells = None
+        elif tag in HEADINGS or tag == "li" or tag in BLOCK_TAGS:
+            self.newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ("br", "hr") and not self.skip:
+            if self.cells is not None:
+                self.current.append(" ")
+            else:
+                self.newline()
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.current.append(data.replace("\n", " "))
+
+    def text(self):
+        self.newline()
+        return "\n".join(self.lines)
+
+def extract_text(html_text):
+    """Visible text of rendered HTML, one block per line.
+
+    Headings come out as ``# Title`` (one ``#`` per level), list items as
+    ``- item`` or ``1. item``, and table rows as cells joined with `` | ``.
+    Scripts, styles and other invisible elements are dropped, as are
+    page-builder shortcodes.
+    """
+    if not html_text:
+        return ""
+    parser = _TextExtractor()
+    parser.feed(SHORTCODE_RE.sub(" ", html_text))
+    parser.close()
+    return parser.text()